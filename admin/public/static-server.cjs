@@ -6,6 +6,7 @@ const url = require("url");
 // 配置
 const port = 3001;
 const dataDir = "E:/DeskTop/python_intelligent_computed/collect/data";
+const contentTypes = { ".png": "image/png", ".jpg": "image/jpeg", ".webp": "image/webp" };
 
 // 创建服务器
 http
@@ -17,11 +18,12 @@ http
       res.end("Not found");
       return;
     }
-    // 只允许 .png 文件
+    // 只允许图片文件(PNG 原图、JPEG/WebP 缩略图和预览图)
     const filePath = path.join(dataDir, parsedUrl.pathname.replace("/data/", ""));
-    if (!filePath.endsWith(".png")) {
+    const contentType = contentTypes[path.extname(filePath).toLowerCase()];
+    if (!contentType) {
       res.statusCode = 403;
-      res.end("Forbidden: Only PNG images are allowed");
+      res.end("Forbidden: Only images are allowed");
       return;
     }
     // 防止路径穿越
@@ -37,7 +39,7 @@ http
         return;
       }
       // 读取并返回文件
-      res.setHeader("Content-Type", "image/png");
+      res.setHeader("Content-Type", contentType);
       const readStream = fs.createReadStream(filePath);
       readStream.pipe(res);
     });
@@ -0,0 +1,84 @@
+import React, { useRef, useEffect, useState } from "react";
+import * as THREE from "three";
+import { loadOctree, OctreeRequestError } from "./octree.ts";
+
+// /capture 返回时保存任务可能还没完成(采集索引里还没有这一条, 接口返回 404), 先等待再重试
+const PENDING_RETRIES = 30;
+const PENDING_DELAY = 500;
+
+// 查看已保存的点云: 先显示八叉树根节点(粗略), 再逐层加载子节点细化
+const CaptureViewer: React.FC<{ address: string; timestamp: string }> = ({ address, timestamp }) => {
+  const mountRef = useRef<HTMLDivElement>(null);
+  const [status, setStatus] = useState("加载中...");
+
+  useEffect(() => {
+    let width = mountRef.current?.clientWidth || 0;
+    let height = mountRef.current?.clientHeight || 0;
+    const scene = new THREE.Scene();
+    const camera = new THREE.PerspectiveCamera(75, width / height, 0.01, 100);
+    camera.position.set(0, 0, -0.5);
+    camera.lookAt(0, 0, 2);
+
+    const renderer = new THREE.WebGLRenderer({ antialias: true });
+    renderer.setSize(width, height);
+    mountRef.current!.appendChild(renderer.domElement);
+
+    const material = new THREE.PointsMaterial({ size: 0.005, vertexColors: true });
+    const geometries: THREE.BufferGeometry[] = [];
+
+    let frame = 0;
+    const animate = () => {
+      frame = requestAnimationFrame(animate);
+      renderer.render(scene, camera);
+    };
+    animate();
+
+    // 每个节点一个 Points, 父子节点的点不重复, 直接叠加即可
+    const controller = new AbortController();
+    let retryTimer: ReturnType<typeof setTimeout>;
+    const load = (retry: number) => {
+      loadOctree(
+        `${address}:3000/captures/${timestamp}/octree`,
+        tile => {
+          setStatus("");
+          const geometry = new THREE.BufferGeometry();
+          geometry.setAttribute("position", new THREE.BufferAttribute(tile.positions, 3));
+          geometry.setAttribute("color", new THREE.BufferAttribute(tile.colors, 3));
+          geometries.push(geometry);
+          scene.add(new THREE.Points(geometry, material));
+        },
+        { signal: controller.signal }
+      ).catch(error => {
+        if (controller.signal.aborted) return;
+        if (error instanceof OctreeRequestError && error.status === 404 && retry > 0 && !geometries.length) {
+          setStatus("点云保存中...");
+          retryTimer = setTimeout(() => load(retry - 1), PENDING_DELAY);
+          return;
+        }
+        setStatus(`加载失败: ${error.message}`);
+      });
+    };
+    load(PENDING_RETRIES);
+
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+      cancelAnimationFrame(frame);
+      geometries.forEach(geometry => geometry.dispose());
+      material.dispose();
+      renderer.dispose();
+      mountRef.current?.removeChild(renderer.domElement);
+    };
+  }, [address, timestamp]);
+
+  return (
+    <div
+      ref={mountRef}
+      style={{ position: "relative", width: "70vw", height: "70vh", background: "#181818", zIndex: 999999 }}
+    >
+      {status && <div style={{ position: "absolute", top: 12, left: 12, color: "#ccc" }}>{status}</div>}
+    </div>
+  );
+};
+
+export default CaptureViewer;
@@ -1,7 +1,8 @@
 import React, { useRef, useEffect } from "react";
 import * as THREE from "three";
+import { DepthStreamDecoder, WS_QUERY } from "./decode.ts";
 
-const WS_URL = "ws://localhost:3000/ws/depth";
+const WS_URL = `ws://localhost:3000/ws/depth?${WS_QUERY}`;
 
 const Viewer: React.FC = () => {
   const mountRef = useRef<HTMLDivElement>(null);
@@ -40,9 +41,23 @@ const Viewer: React.FC = () => {
     // WebSocket 数据处理
     const ws = new WebSocket(WS_URL);
     ws.binaryType = "arraybuffer";
+    const decoder = new DepthStreamDecoder();
+    // 解压是异步的, 按到达顺序串行应用增量
+    let queue = Promise.resolve();
+    let resyncPending = false;
     ws.onmessage = event => {
-      const buffer = event.data as ArrayBuffer;
-      const arr = new Float32Array(buffer); // [x, y, z, ...]
+      queue = queue.then(() => handleMessage(event.data as ArrayBuffer));
+    };
+    const handleMessage = async (buffer: ArrayBuffer) => {
+      const decoded = await decoder.apply(buffer);
+      if (!decoded) {
+        // 增量对不上(丢帧/还没有关键帧), 请求一次关键帧
+        if (!resyncPending && ws.readyState === WebSocket.OPEN) ws.send("resync");
+        resyncPending = true;
+        return;
+      }
+      resyncPending = false;
+      const arr = decoded.points; // [x, y, z, ...]
       const n = arr.length / 3;
       // 取所有z
       let minZ = Infinity,
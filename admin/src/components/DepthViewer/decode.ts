@@ -0,0 +1,103 @@
+// /ws/depth 消息解码, 格式定义见 server/modules/point_cloud_wire.py
+export const WS_QUERY = "format=delta&compress=deflate&max_points=80000";
+
+const FLAG_DEFLATE = 0x01;
+const KIND_POINTS = 0;
+const KIND_KEYFRAME = 1;
+const KIND_DELTA = 2;
+const HEADER_SIZE = 16;
+const KEYFRAME_HEADER_SIZE = 20;
+const DELTA_HEADER_SIZE = 8;
+
+export interface DecodedPointCloud {
+  seq: number;
+  points: Float32Array; // [x, y, z, ...] 米
+}
+
+async function inflate(payload: ArrayBuffer, flags: number): Promise<ArrayBuffer> {
+  if (!(flags & FLAG_DEFLATE)) return payload;
+  const stream = new Blob([payload]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return await new Response(stream).arrayBuffer();
+}
+
+// q16 点云消息
+export async function decodePointCloud(buffer: ArrayBuffer): Promise<DecodedPointCloud> {
+  const view = new DataView(buffer);
+  const flags = view.getUint8(3);
+  const seq = view.getUint32(4, true);
+  const count = view.getUint32(8, true);
+  const scale = view.getFloat32(12, true);
+  const payload = await inflate(buffer.slice(HEADER_SIZE), flags);
+  const q = new Int16Array(payload, 0, count * 3);
+  const points = new Float32Array(count * 3);
+  for (let i = 0; i < q.length; i++) {
+    points[i] = q[i] * scale;
+  }
+  return { seq, points };
+}
+
+// 深度关键帧 + 增量, 客户端保存深度图并自行反投影
+export class DepthStreamDecoder {
+  private depth: Uint16Array | null = null;
+  private width = 0;
+  private height = 0;
+  private intrinsics = [0, 0, 0, 0]; // fx fy cx cy
+  private scale = 0.001;
+  private seq = 0;
+
+  // 返回 null 表示增量无法应用(丢帧或还没收到关键帧), 调用方应发送 "resync"
+  async apply(buffer: ArrayBuffer): Promise<DecodedPointCloud | null> {
+    const view = new DataView(buffer);
+    const flags = view.getUint8(3);
+    const kind = (flags >> 1) & 0x03;
+    const seq = view.getUint32(4, true);
+    const count = view.getUint32(8, true);
+    this.scale = view.getFloat32(12, true);
+
+    if (kind === KIND_POINTS) return decodePointCloud(buffer);
+    if (kind === KIND_KEYFRAME) {
+      this.width = view.getUint16(HEADER_SIZE, true);
+      this.height = view.getUint16(HEADER_SIZE + 2, true);
+      for (let i = 0; i < 4; i++) this.intrinsics[i] = view.getFloat32(HEADER_SIZE + 4 + i * 4, true);
+      const payload = await inflate(buffer.slice(HEADER_SIZE + KEYFRAME_HEADER_SIZE), flags);
+      this.depth = new Uint16Array(payload.slice(0, count * 2));
+    } else if (kind === KIND_DELTA) {
+      const baseSeq = view.getUint32(HEADER_SIZE, true);
+      const runCount = view.getUint32(HEADER_SIZE + 4, true);
+      if (!this.depth || baseSeq !== this.seq) return null;
+      const payload = await inflate(buffer.slice(HEADER_SIZE + DELTA_HEADER_SIZE), flags);
+      const starts = new Uint32Array(payload, 0, runCount);
+      const lengths = new Uint32Array(payload, runCount * 4, runCount);
+      const values = new Uint16Array(payload, runCount * 8, count);
+      let offset = 0;
+      for (let r = 0; r < runCount; r++) {
+        this.depth.set(values.subarray(offset, offset + lengths[r]), starts[r]);
+        offset += lengths[r];
+      }
+    } else {
+      return null;
+    }
+    this.seq = seq;
+    return { seq, points: this.unproject() };
+  }
+
+  private unproject(): Float32Array {
+    const depth = this.depth!;
+    const [fx, fy, cx, cy] = this.intrinsics;
+    let valid = 0;
+    for (let i = 0; i < depth.length; i++) if (depth[i] > 0) valid++;
+    const points = new Float32Array(valid * 3);
+    let j = 0;
+    for (let v = 0; v < this.height; v++) {
+      for (let u = 0; u < this.width; u++) {
+        const d = depth[v * this.width + u];
+        if (d === 0) continue;
+        const z = d * this.scale;
+        points[j++] = ((u - cx) * z) / fx;
+        points[j++] = ((v - cy) * z) / fy;
+        points[j++] = z;
+      }
+    }
+    return points;
+  }
+}
@@ -3,8 +3,13 @@ import type { FC } from "react";
 import { Button, Modal } from "antd";
 import type { ButtonProps } from "antd";
 import Viewer from "./Viewer.tsx";
+import CaptureViewer from "./CaptureViewer.tsx";
 
-const DepthViewer: FC<{ bottonProps: ButtonProps & { className?: string } }> = props => {
+// 不传 capture 时查看实时点云, 传入时查看该次保存的点云(八叉树逐级加载)
+const DepthViewer: FC<{
+  bottonProps: ButtonProps & { className?: string };
+  capture?: { address: string; timestamp: string };
+}> = props => {
   const [isModalOpen, setIsModalOpen] = useState(false);
 
   const handleOk = () => {
@@ -13,10 +18,10 @@ const DepthViewer: FC<{ bottonProps: ButtonProps & { className?: string } }> = p
   return (
     <>
       <Button type="primary" onClick={() => setIsModalOpen(true)} {...props.bottonProps}>
-        查看点云
+        {props.capture ? "查看保存点云" : "查看点云"}
       </Button>
       <Modal
-        title="深度图预览"
+        title={props.capture ? `保存点云 ${props.capture.timestamp}` : "深度图预览"}
         open={isModalOpen}
         style={{
           top: 50,
@@ -30,7 +35,7 @@ const DepthViewer: FC<{ bottonProps: ButtonProps & { className?: string } }> = p
           </Button>,
         ]}
       >
-        <Viewer />
+        {props.capture ? <CaptureViewer {...props.capture} /> : <Viewer />}
       </Modal>
     </>
   );
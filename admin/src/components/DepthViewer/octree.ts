@@ -0,0 +1,87 @@
+// 保存点云的八叉树 LOD 分块加载, 格式定义见 server/modules/octree.py
+const TILE_HEADER_SIZE = 24;
+const QUANT_MAX = 65535;
+
+export interface OctreeNode {
+  offset: number;
+  length: number;
+  count: number;
+  min: [number, number, number];
+  size: number;
+  children: number[];
+}
+
+export interface OctreeIndex {
+  point_count: number;
+  max_points: number;
+  min: [number, number, number];
+  size: number;
+  nodes: Record<string, OctreeNode>;
+}
+
+export interface OctreeTile {
+  id: string;
+  positions: Float32Array; // [x, y, z, ...] 米
+  colors: Float32Array; // [r, g, b, ...] 0~1
+}
+
+export function decodeTile(id: string, buffer: ArrayBuffer): OctreeTile {
+  const view = new DataView(buffer);
+  const count = view.getUint32(4, true);
+  const minX = view.getFloat32(8, true);
+  const minY = view.getFloat32(12, true);
+  const minZ = view.getFloat32(16, true);
+  const scale = view.getFloat32(20, true) / QUANT_MAX;
+  const q = new Uint16Array(buffer, TILE_HEADER_SIZE, count * 3);
+  const rgb = new Uint8Array(buffer, TILE_HEADER_SIZE + count * 6, count * 3);
+  const positions = new Float32Array(count * 3);
+  const colors = new Float32Array(count * 3);
+  for (let i = 0; i < count; i++) {
+    positions[i * 3] = minX + q[i * 3] * scale;
+    positions[i * 3 + 1] = minY + q[i * 3 + 1] * scale;
+    positions[i * 3 + 2] = minZ + q[i * 3 + 2] * scale;
+    colors[i * 3] = rgb[i * 3] / 255;
+    colors[i * 3 + 1] = rgb[i * 3 + 1] / 255;
+    colors[i * 3 + 2] = rgb[i * 3 + 2] / 255;
+  }
+  return { id, positions, colors };
+}
+
+export class OctreeRequestError extends Error {
+  status: number;
+  constructor(url: string, status: number) {
+    super(`${url}: HTTP ${status}`);
+    this.status = status;
+  }
+}
+
+async function fetchOk(url: string, signal?: AbortSignal): Promise<Response> {
+  const res = await fetch(url, { signal });
+  if (!res.ok) throw new OctreeRequestError(url, res.status);
+  return res;
+}
+
+// 按层级从粗到细加载节点, 每个节点到达后立即回调; 超过点数预算或被取消时停止
+export async function loadOctree(
+  baseUrl: string,
+  onTile: (tile: OctreeTile, index: OctreeIndex) => void,
+  options: { maxPoints?: number; signal?: AbortSignal } = {}
+): Promise<OctreeIndex> {
+  const { maxPoints = Infinity, signal } = options;
+  const index: OctreeIndex = await fetchOk(baseUrl, signal).then(res => res.json());
+  let level = ["r"];
+  let loaded = 0;
+  while (level.length && loaded < maxPoints) {
+    const next: string[] = [];
+    await Promise.all(
+      level.map(async id => {
+        const buffer = await fetchOk(`${baseUrl}/${id}`, signal).then(res => res.arrayBuffer());
+        loaded += index.nodes[id].count;
+        onTile(decodeTile(id, buffer), index);
+        next.push(...index.nodes[id].children.map(child => id + child));
+      })
+    );
+    level = next;
+  }
+  return index;
+}
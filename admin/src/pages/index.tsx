@@ -8,6 +8,8 @@ import RecordButton from "@/components/RecordButton.tsx";
 export interface RootObject {
   status: string;
   timestamp: string;
+  thumbnail: string;
+  preview_image: string;
   rgb_image: string;
   depth_image: string;
   ply_file: string;
@@ -48,6 +50,28 @@ function Index() {
     }
   );
 
+  // 先显示缩略图, 后台写好中等预览图后替换; 点击放大时加载无损 PNG
+  const [resultImage, setResultImage] = useState<string>();
+  useEffect(() => {
+    if (!data) return;
+    setResultImage(data.thumbnail);
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout>;
+    const load = (retry: number) => {
+      const img = new window.Image();
+      img.onload = () => !cancelled && setResultImage(data.preview_image);
+      img.onerror = () => {
+        if (!cancelled && retry > 0) timer = setTimeout(() => load(retry - 1), 200);
+      };
+      img.src = data.preview_image;
+    };
+    load(25);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [data]);
+
   // 今日个数
   let {
     data: count,
@@ -139,6 +163,12 @@ function Index() {
             点云保存
           </Button>
           <PointCloudViewer bottonProps={{ className: "ml-4" }} />
+          {data && (
+            <PointCloudViewer
+              bottonProps={{ className: "ml-4" }}
+              capture={{ address, timestamp: data.timestamp }}
+            />
+          )}
           <RecordButton address={address} />
         </div>
       </div>
@@ -161,8 +191,8 @@ function Index() {
               <div className="absolute top-0 left-0 text-red-600 z-10 p-2">RGB结果</div>
               <Image
                 width={700}
-                src={data.rgb_image}
-                preview={{ maskClassName: "11", mask: <></> }}
+                src={resultImage}
+                preview={{ src: data.rgb_image, maskClassName: "11", mask: <></> }}
               />
             </div>
           </div>
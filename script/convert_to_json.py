@@ -0,0 +1,260 @@
+'''
+统一的点云 → JSON 批量转换入口
+支持 ply / pcd / npy 任意组合, 每个采集文件夹在独立进程中处理
+增量清单(manifest)记录输入文件的大小、修改时间和哈希, 重复运行只处理有变化的文件夹
+
+python convert_to_json.py ./data --inputs ply,pcd,npy --layout columnar
+'''
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import traceback
+import concurrent.futures
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.save.to_json import write_point_cloud_json, JSON_LAYOUTS  # noqa: E402
+from modules.save.to_npy import load_capture_npy, COLOR_SUFFIX, META_SUFFIX  # noqa: E402
+from modules.save.to_mesh import MESH_SUFFIX  # noqa: E402
+
+INPUT_KINDS = ("ply", "pcd", "npy")
+MANIFEST_NAME = ".json_manifest.json"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def debug_log(msg):
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[{timestamp}] {msg}")
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def input_kind(filename):
+    if filename.endswith((COLOR_SUFFIX, META_SUFFIX)):
+        return None  # 颜色平面和内参随深度一起读取
+    stem, ext = os.path.splitext(filename)
+    if stem.endswith(MESH_SUFFIX):
+        return None  # merge.py 生成的网格不是采集点云
+    ext = ext.lstrip(".").lower()
+    return ext if ext in INPUT_KINDS else None
+
+
+def tracked_kind(filename):
+    '''
+    文件会影响哪种类型的输出: 除主输入外, _color.npy 和 _capture.json 也是 npy 的输入
+    '''
+    if filename.endswith((COLOR_SUFFIX, META_SUFFIX)):
+        return "npy"
+    return input_kind(filename)
+
+
+def load_ply_or_pcd(path):
+    import open3d as o3d  # 只有 ply/pcd 需要 open3d
+    pcd = o3d.io.read_point_cloud(path)
+    points = np.asarray(pcd.points)
+    colors = (np.asarray(pcd.colors) * 255).astype(np.uint8)
+    return points, colors
+
+
+def load_npy(path):
+    from modules.generate_point_cloud import generate_point_cloud
+
+    # 新格式只映射深度和颜色平面, 旧版 pickle 文件自动兼容
+    depth, color_image, meta = load_capture_npy(path)
+    k = meta["intrinsics"]
+    return generate_point_cloud(depth, k["fx"], k["fy"], k["cx"], k["cy"], color_image)
+
+
+LOADERS = {"ply": load_ply_or_pcd, "pcd": load_ply_or_pcd, "npy": load_npy}
+
+
+def scan_inputs(folder, kind):
+    '''返回该类型的 {文件名: {"size", "mtime"}}, 包括随深度读取的颜色和内参文件'''
+    inputs = {}
+    for name in sorted(os.listdir(folder)):
+        if tracked_kind(name) != kind:
+            continue
+        st = os.stat(os.path.join(folder, name))
+        inputs[name] = {"size": st.st_size, "mtime": st.st_mtime_ns}
+    return inputs
+
+
+def output_path(folder, kind):
+    folder_name = os.path.basename(os.path.normpath(folder))
+    return os.path.join(folder, f"{folder_name}_{kind}.json")
+
+
+def unchanged_inputs(folder, inputs, previous):
+    '''
+    与上次清单比较, 大小和修改时间一致直接视为未变化; 不一致时再比较哈希
+    返回 (是否未变化, 带哈希的新输入记录)
+    '''
+    prev_inputs = previous.get("inputs", {}) if previous else {}
+    same = previous is not None and set(prev_inputs) == set(inputs)
+    result = {}
+    for name, info in inputs.items():
+        prev = prev_inputs.get(name)
+        if prev and prev["size"] == info["size"] and prev["mtime"] == info["mtime"]:
+            result[name] = dict(info, sha1=prev["sha1"])
+            continue
+        result[name] = dict(info, sha1=file_sha1(os.path.join(folder, name)))
+        if not prev or prev["sha1"] != result[name]["sha1"]:
+            same = False
+    return same, result
+
+
+def convert_folder(folder, kinds, layout, previous, force=False):
+    '''
+    在子进程中执行: 读取文件夹内各类型输入, 每种类型合并输出一个 {文件夹名}_{类型}.json
+    清单按类型分别记录, 只重新转换有变化的类型
+    返回 (folder, {类型: 清单条目}, 点数, 成功文件数, 失败文件数, 是否全部跳过)
+    '''
+    t_start = time.time()
+    previous = previous or {}
+    entries = {}
+    converted = []
+    point_count = success_count = failure_count = 0
+    for kind in kinds:
+        inputs = scan_inputs(folder, kind)
+        names = [name for name in inputs if input_kind(name) == kind]
+        if not names:
+            continue
+        prev = previous.get(kind)
+        same, inputs = unchanged_inputs(folder, inputs, prev)
+        path = output_path(folder, kind)
+        entry = {"inputs": inputs, "layout": layout, "output": os.path.basename(path)}
+        if not force and same and prev.get("layout") == layout and os.path.exists(path):
+            entries[kind] = entry
+            continue
+
+        converted.append(kind)
+        parts = []
+        kind_failures = 0
+        for name in names:
+            file_path = os.path.join(folder, name)
+            try:
+                points, colors = LOADERS[kind](file_path)
+                parts.append((points, colors))
+                point_count += points.shape[0]
+                success_count += 1
+            except Exception as e:
+                debug_log(f"[错误] 处理文件 {file_path} 出错: {e}")
+                traceback.print_exc()
+                kind_failures += 1
+        if parts:
+            with open(path, "w") as jf:
+                write_point_cloud_json(jf, parts, layout=layout)
+        if not kind_failures:
+            entries[kind] = entry  # 有失败时不写入清单, 下次重试
+        failure_count += kind_failures
+    if not converted:
+        return folder, entries, 0, 0, 0, True
+    debug_log(f"[{'/'.join(k.upper() for k in converted)} → JSON] {folder} 完成，{point_count} 点，用时 {time.time() - t_start:.3f} 秒")
+    return folder, entries, point_count, success_count, failure_count, False
+
+
+def load_manifest(root_folder, name=MANIFEST_NAME):
+    path = os.path.join(root_folder, name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        debug_log(f"[警告] 清单文件损坏, 将全部重新转换: {path}")
+        return {}
+
+
+def save_manifest(root_folder, manifest, name=MANIFEST_NAME):
+    path = os.path.join(root_folder, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def find_folders(root_folder, kinds):
+    for dirpath, _, filenames in os.walk(root_folder):
+        if any(input_kind(f) in kinds for f in filenames):
+            yield dirpath
+
+
+def process_all_subfolders(root_folder, kinds=INPUT_KINDS, layout="columnar", workers=None, force=False):
+    kinds = tuple(k for k in INPUT_KINDS if k in kinds)
+    if not os.path.isdir(root_folder):
+        debug_log(f"[错误] 目录不存在: {root_folder}")
+        return 0, 0
+    previous_manifest = load_manifest(root_folder)
+    # 清单为 {文件夹: {类型: 条目}}; 本次没有处理的类型原样保留, 只去掉已不存在的文件夹
+    manifest = {key: {k: v for k, v in entry.items() if k in INPUT_KINDS}
+                for key, entry in previous_manifest.items()
+                if os.path.isdir(os.path.join(root_folder, key))}
+    folders = list(find_folders(root_folder, kinds))
+    overall_start = time.time()
+
+    total_points = total_success = total_failure = converted = skipped = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for folder in folders:
+            key = os.path.relpath(folder, root_folder).replace("\\", "/")
+            futures[executor.submit(convert_folder, folder, kinds, layout, manifest.get(key), force)] = key
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            folder_entry = manifest.setdefault(key, {})
+            for kind in kinds:
+                folder_entry.pop(kind, None)
+            try:
+                folder, entries, points, success, failure, was_skipped = future.result()
+            except Exception as e:
+                debug_log(f"[错误] 子进程异常: {e}")
+                total_failure += 1
+                continue
+            folder_entry.update(entries)
+            if was_skipped:
+                skipped += 1
+                continue
+            converted += 1
+            total_points += points
+            total_success += success
+            total_failure += failure
+
+    manifest = {key: entry for key, entry in manifest.items() if entry}
+    save_manifest(root_folder, manifest)
+    elapsed = max(time.time() - overall_start, 1e-9)
+    debug_log(f"=== 统计结果 ===")
+    debug_log(f"转换文件夹数: {converted}，跳过(未变化): {skipped}")
+    debug_log(f"总成功文件数: {total_success}")
+    debug_log(f"总失败文件数: {total_failure}")
+    debug_log(f"总耗时: {elapsed:.2f} 秒")
+    debug_log(f"吞吐: {total_points / elapsed:.0f} 点/秒，{converted / elapsed:.2f} 文件夹/秒")
+    return total_success, total_failure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ply/pcd/npy 批量转换为JSON")
+    parser.add_argument("root", nargs="?", default="./data", help="数据根目录(OUTPUT_DIR 或其中某一天)")
+    parser.add_argument("--inputs", default=",".join(INPUT_KINDS), help="输入类型, 逗号分隔: ply,pcd,npy")
+    parser.add_argument("--layout", default="columnar", choices=JSON_LAYOUTS, help="JSON布局, rows 为旧版逐点对象数组")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认CPU核心数")
+    parser.add_argument("--force", action="store_true", help="忽略清单, 全部重新转换")
+    args = parser.parse_args()
+
+    kinds = [k.strip().lower() for k in args.inputs.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in INPUT_KINDS]
+    if unknown:
+        parser.error(f"不支持的输入类型: {', '.join(unknown)}")
+    process_all_subfolders(args.root, kinds, args.layout, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''
+把无损深度录制(.kdepth)中的帧导出为点云 PLY 或原始采集 NPY
+只解压需要的帧, 不需要从头解码整个文件
+
+python export_depth_recording.py xxx.kdepth --frames 0 100 200
+python export_depth_recording.py xxx.kdepth --every 30 --format npy
+'''
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.depth_recording import DepthRecordingReader  # noqa: E402
+from modules.generate_point_cloud import generate_point_cloud  # noqa: E402
+from modules.save.to_ply import save_point_cloud_ply  # noqa: E402
+from modules.save.to_npy import save_point_cloud_npy  # noqa: E402
+
+
+def debug_log(msg):
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[{timestamp}] {msg}")
+
+
+def export_frames(path, frames, out_dir, fmt):
+    reader = DepthRecordingReader(path)
+    k = reader.meta.get("intrinsics") or {
+        "fx": 600.0, "fy": 600.0, "cx": reader.width / 2.0, "cy": reader.height / 2.0}
+    os.makedirs(out_dir, exist_ok=True)
+    debug_log(f"{path}: 共 {len(reader)} 帧，{reader.width}x{reader.height}，压缩 {reader.codec}")
+    if reader.dropped or reader.meta.get("error"):
+        debug_log(f"[警告] 录制时丢弃了 {reader.dropped} 帧，帧之间有缺口: {reader.meta.get('error')}")
+    try:
+        for n in frames:
+            depth_image, device_ts, host_time = reader.frame(n)
+            name = f"frame_{n:06d}"
+            if fmt == "npy":
+                save_point_cloud_npy(out_dir, name, depth_image, None, intrinsics=k, device_timestamp_usec=device_ts)
+            else:
+                points, colors = generate_point_cloud(depth_image, k["fx"], k["fy"], k["cx"], k["cy"])
+                save_point_cloud_ply(os.path.join(out_dir, f"{name}.ply"), points, colors)
+            debug_log(f"[导出] 第 {n} 帧，设备时间戳 {device_ts}")
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出无损深度录制中的帧")
+    parser.add_argument("path", help=".kdepth 文件")
+    parser.add_argument("--frames", type=int, nargs="*", help="要导出的帧号")
+    parser.add_argument("--every", type=int, default=None, help="每隔多少帧导出一帧")
+    parser.add_argument("--format", choices=["ply", "npy"], default="ply")
+    parser.add_argument("--out", default=None, help="输出目录, 默认与录制文件同名")
+    args = parser.parse_args()
+
+    with DepthRecordingReader(args.path) as reader:
+        total = len(reader)
+    if args.frames:
+        selected = [n for n in args.frames if 0 <= n < total]
+    else:
+        selected = range(0, total, args.every or 1)
+    out_dir = args.out or os.path.splitext(args.path)[0]
+    export_frames(args.path, selected, out_dir, args.format)
@@ -1,58 +1,81 @@
 '''
-根据ply pcd npy将数据合并为一个JSON文件
-数据包括RGB XYZ NXNYNZ faces数据
+根据 ply / pcd / npy 重建三角网格(Poisson), 每个采集文件夹在独立进程中处理
+输出 {文件夹名}_mesh.ply(二进制) / .glb / .json(列式), 格式见 server/modules/save/to_mesh.py
+增量清单(manifest)记录输入文件和参数, 重复运行只处理有变化的文件夹
+每个文件夹分阶段计时: 加载、滤波、法向量、Poisson、导出
+
+python merge.py ./data --formats ply,glb --depth 8
 '''
 
 import os
+import sys
+import time
+import argparse
+import traceback
+import concurrent.futures
 import numpy as np
 import open3d as o3d
-import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.save.to_npy import load_capture_npy, DEPTH_SUFFIX, COLOR_SUFFIX  # noqa: E402
+from modules.save.to_mesh import save_mesh, MESH_FORMATS, MESH_SUFFIX  # noqa: E402
+from modules.point_cloud_filter import filter_profile, filter_depth, filter_points  # noqa: E402
+from convert_to_json import debug_log, unchanged_inputs, load_manifest, save_manifest  # noqa: E402
+
+FILTERS = filter_profile("offline")  # 离群点过滤和体素降采样, 见 server/config.py POINT_FILTERS
+MANIFEST_NAME = ".mesh_manifest.json"
+STAGES = ("load", "filter", "normals", "poisson", "export")
+
+
+def source_files(folder):
+    '''
+    按 ply > pcd > npy 的优先级选择输入, 返回 (类型, [文件名]); 没有输入时返回 (None, [])
+    '''
+    basename = os.path.basename(os.path.normpath(folder))
+    for kind, name in (("ply", f"{basename}.ply"), ("pcd", f"{basename}.pcd"), ("npy", basename + DEPTH_SUFFIX)):
+        if os.path.exists(os.path.join(folder, name)):
+            names = [name]
+            if kind == "npy" and os.path.exists(os.path.join(folder, basename + COLOR_SUFFIX)):
+                names.append(basename + COLOR_SUFFIX)
+            return kind, names
+    return None, []
 
-def load_point_cloud(folder):
+
+def load_point_cloud(folder, kind, names):
     """
-    尝试加载 a.ply, a.pcd, 或 a_depth.npy，并返回Open3D点云
+    加载 a.ply, a.pcd, 或 a_depth.npy，并返回Open3D点云
     """
-    basename = os.path.basename(folder.rstrip("/\\"))
-    ply_file = os.path.join(folder, f"{basename}.ply")
-    pcd_file = os.path.join(folder, f"{basename}.pcd")
-    npy_file = os.path.join(folder, f"{basename}_depth.npy")
-
-    if os.path.exists(ply_file):
-        print(f"加载PLY文件: {ply_file}")
-        pcd = o3d.io.read_point_cloud(ply_file)
-    elif os.path.exists(pcd_file):
-        print(f"加载PCD文件: {pcd_file}")
-        pcd = o3d.io.read_point_cloud(pcd_file)
-    elif os.path.exists(npy_file):
-        print(f"加载NPY文件: {npy_file}")
-        npy_data = np.load(npy_file, allow_pickle=True).item()
-        depth = npy_data.get("depth")
-        color = npy_data.get("color")
-        if depth is None:
-            raise ValueError(f"{npy_file} 中未找到depth数据")
-
-        height, width = depth.shape
-        fx, fy = 600.0, 600.0
-        cx, cy = width / 2.0, height / 2.0
-        xx, yy = np.meshgrid(np.arange(width), np.arange(height))
-        valid = (depth > 0)
-        z = depth[valid] / 1000.0
-        x = (xx[valid] - cx) * z / fx
-        y = (yy[valid] - cy) * z / fy
-        points = np.vstack((x, y, z)).T
-
-        if color is not None:
-            colors = color[yy[valid], xx[valid], :][:, :3] / 255.0
-        else:
-            colors = np.zeros((points.shape[0], 3))
-
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(points)
+    path = os.path.join(folder, names[0])
+    if kind in ("ply", "pcd"):
+        return o3d.io.read_point_cloud(path)
+
+    depth, color, meta = load_capture_npy(path)
+    depth = filter_depth(depth, FILTERS)  # 离群点只能在有序深度图上过滤
+    k = meta["intrinsics"]
+    fx, fy, cx, cy = k["fx"], k["fy"], k["cx"], k["cy"]
+    height, width = depth.shape
+    xx, yy = np.meshgrid(np.arange(width), np.arange(height))
+    valid = (depth > 0)
+    z = depth[valid] / 1000.0
+    x = (xx[valid] - cx) * z / fx
+    y = (yy[valid] - cy) * z / fy
+    points = np.vstack((x, y, z)).T
+
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    if color is not None:
+        pcd.colors = o3d.utility.Vector3dVector(color[yy[valid], xx[valid], :][:, :3] / 255.0)
+    return pcd
+
+
+def downsample(pcd):
+    if FILTERS["voxel_size"] <= 0:
+        return pcd
+    colors = np.asarray(pcd.colors) if pcd.has_colors() else None
+    points, colors = filter_points(np.asarray(pcd.points), colors, FILTERS)
+    pcd.points = o3d.utility.Vector3dVector(points)
+    if colors is not None:
         pcd.colors = o3d.utility.Vector3dVector(colors)
-    else:
-        print(f"未找到ply/pcd/npy文件: {folder}")
-        return None
     return pcd
 
 
@@ -69,76 +92,133 @@ def poisson_mesh(pcd, depth=8):
     return mesh
 
 
-def save_json(points, colors, normals, faces, output_file):
-    """
-    保存点、颜色、法向量、三角面片到JSON
-    """
-    data = {
-        "points": [],
-        "faces": []
-    }
-    for i in range(points.shape[0]):
-        point = {
-            "x": float(points[i, 0]),
-            "y": float(points[i, 1]),
-            "z": float(points[i, 2]),
-            "r": int(colors[i, 0]*255),
-            "g": int(colors[i, 1]*255),
-            "b": int(colors[i, 2]*255),
-            "nx": float(normals[i, 0]),
-            "ny": float(normals[i, 1]),
-            "nz": float(normals[i, 2])
-        }
-        data["points"].append(point)
-
-    for tri in faces:
-        data["faces"].append([int(idx) for idx in tri])
-
-    with open(output_file, "w") as f:
-        json.dump(data, f, indent=2)
-    print(f"已保存JSON: {output_file}")
-
-
-def process_folder(folder):
-    pcd = load_point_cloud(folder)
-    if pcd is None:
-        return
-
-    print("估计法向量...")
+def output_path(folder, fmt):
+    basename = os.path.basename(os.path.normpath(folder))
+    return os.path.join(folder, f"{basename}{MESH_SUFFIX}.{fmt}")
+
+
+def process_folder(folder, formats, depth, previous, force=False):
+    '''
+    在子进程中执行: 加载点云 → 滤波 → 法向量 → Poisson → 导出各格式
+    返回 (folder, 清单条目, 顶点数, 面数, 各阶段耗时, 是否跳过)
+    '''
+    kind, names = source_files(folder)
+    inputs = {}
+    for name in names:
+        st = os.stat(os.path.join(folder, name))
+        inputs[name] = {"size": st.st_size, "mtime": st.st_mtime_ns}
+    same, inputs = unchanged_inputs(folder, inputs, previous)
+    params = {"formats": list(formats), "depth": depth, "filters": FILTERS}
+    outputs = [output_path(folder, fmt) for fmt in formats]
+    entry = {"inputs": inputs, "params": params, "outputs": [os.path.basename(p) for p in outputs]}
+    if not force and same and previous.get("params") == params and all(os.path.exists(p) for p in outputs):
+        return folder, entry, 0, 0, {}, True
+
+    timings = {}
+    t_stage = time.time()
+
+    def lap(stage):
+        nonlocal t_stage
+        now = time.time()
+        timings[stage] = now - t_stage
+        t_stage = now
+
+    pcd = load_point_cloud(folder, kind, names)
+    lap("load")
+    count = len(pcd.points)
+    pcd = downsample(pcd)
+    lap("filter")
     pcd = estimate_normals(pcd)
-
-    # 转换为三角网格
-    print("尝试生成网格...")
-    mesh = poisson_mesh(pcd)
+    lap("normals")
+    mesh = poisson_mesh(pcd, depth)
     mesh.compute_vertex_normals()
+    lap("poisson")
 
-    # 提取points, colors, normals
-    points = np.asarray(mesh.vertices)
+    vertices = np.asarray(mesh.vertices)
     normals = np.asarray(mesh.vertex_normals)
-    try:
-        colors = np.asarray(pcd.colors)
-        if colors.shape[0] != points.shape[0]:
-            # 如果点云和网格点数对不上，就用黑色
-            colors = np.zeros((points.shape[0], 3))
-    except:
-        colors = np.zeros((points.shape[0], 3))
-
-    # faces
     faces = np.asarray(mesh.triangles)
-
-    # 保存
-    basename = os.path.basename(folder.rstrip("/\\"))
-    output_file = os.path.join(folder, f"{basename}_summary.json")
-    save_json(points, colors, normals, faces, output_file)
-
-
-def recursive_process(root_folder):
-    for dirpath, dirnames, filenames in os.walk(root_folder):
-        if any(fname.endswith(('.ply', '.pcd', '.npy')) for fname in filenames):
-            print(f"处理文件夹: {dirpath}")
-            process_folder(dirpath)
+    if mesh.has_vertex_colors():
+        # 点云有颜色时 Poisson 会插值出顶点颜色
+        colors = np.clip(np.rint(np.asarray(mesh.vertex_colors) * 255), 0, 255).astype(np.uint8)
+    else:
+        colors = np.zeros((vertices.shape[0], 3), dtype=np.uint8)
+    for fmt, path in zip(formats, outputs):
+        save_mesh(path, fmt, vertices, normals, colors, faces)
+    lap("export")
+
+    stages = "，".join(f"{stage} {timings[stage]:.3f}" for stage in STAGES)
+    debug_log(f"[{kind.upper()} → 网格] {folder} 完成，{count} 点 → {vertices.shape[0]} 顶点 "
+              f"{faces.shape[0]} 面，{stages} 秒")
+    return folder, entry, int(vertices.shape[0]), int(faces.shape[0]), timings, False
+
+
+def find_folders(root_folder):
+    for dirpath, _, _ in os.walk(root_folder):
+        if source_files(dirpath)[0] is not None:
+            yield dirpath
+
+
+def recursive_process(root_folder, formats=("ply",), depth=8, workers=None, force=False):
+    if not os.path.isdir(root_folder):
+        debug_log(f"[错误] 目录不存在: {root_folder}")
+        return 0, 0
+    previous_manifest = load_manifest(root_folder, MANIFEST_NAME)
+    manifest = {}  # 只保留本次仍存在的文件夹
+    folders = list(find_folders(root_folder))
+    overall_start = time.time()
+
+    totals = dict.fromkeys(STAGES, 0.0)
+    total_vertices = total_faces = processed = skipped = failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for folder in folders:
+            key = os.path.relpath(folder, root_folder).replace("\\", "/")
+            futures[executor.submit(process_folder, folder, formats, depth, previous_manifest.get(key), force)] = folder
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                folder, entry, vertices, faces, timings, was_skipped = future.result()
+            except Exception as e:
+                # 失败的文件夹不写入清单, 下次重试
+                debug_log(f"[错误] 处理文件夹 {futures[future]} 出错: {e}")
+                traceback.print_exc()
+                failed += 1
+                continue
+            manifest[os.path.relpath(folder, root_folder).replace("\\", "/")] = entry
+            if was_skipped:
+                skipped += 1
+                continue
+            processed += 1
+            total_vertices += vertices
+            total_faces += faces
+            for stage, seconds in timings.items():
+                totals[stage] += seconds
+
+    save_manifest(root_folder, manifest, MANIFEST_NAME)
+    elapsed = max(time.time() - overall_start, 1e-9)
+    debug_log(f"=== 统计结果 ===")
+    debug_log(f"处理文件夹数: {processed}，跳过(未变化): {skipped}，失败: {failed}")
+    debug_log(f"总顶点数: {total_vertices}，总面数: {total_faces}")
+    # 各阶段为所有进程耗时之和, 并行时会大于总耗时
+    debug_log("各阶段累计: " + "，".join(f"{stage} {totals[stage]:.2f}" for stage in STAGES) + " 秒")
+    debug_log(f"总耗时: {elapsed:.2f} 秒，{processed / elapsed:.2f} 文件夹/秒")
+    return processed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ply/pcd/npy 批量重建三角网格")
+    parser.add_argument("root", nargs="?", default="./data", help="数据根目录(OUTPUT_DIR 或其中某一天)")
+    parser.add_argument("--formats", default="ply", help=f"输出格式, 逗号分隔: {','.join(MESH_FORMATS)}")
+    parser.add_argument("--depth", type=int, default=8, help="Poisson 八叉树深度")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认CPU核心数")
+    parser.add_argument("--force", action="store_true", help="忽略清单, 全部重新生成")
+    args = parser.parse_args()
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in MESH_FORMATS]
+    if unknown or not formats:
+        parser.error(f"不支持的输出格式: {', '.join(unknown) or '(空)'}")
+    recursive_process(args.root, tuple(dict.fromkeys(formats)), args.depth, args.workers, args.force)
 
 
 if __name__ == "__main__":
-    root_folder = "./data/2025-06-07"  # 这里写上你的数据根目录
-    recursive_process(root_folder)
+    main()
@@ -0,0 +1,62 @@
+'''
+将旧版 pickle 字典 *_depth.npy 批量迁移为新的原始采集格式
+(*_depth.npy + *_color.npy + *_capture.json), 已迁移的文件自动跳过
+
+python migrate_npy.py ./data
+'''
+
+import os
+import sys
+import time
+import argparse
+import traceback
+import concurrent.futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.save.to_npy import migrate_legacy_npy, DEPTH_SUFFIX  # noqa: E402
+
+
+def debug_log(msg):
+    timestamp = time.strftime('%H:%M:%S')
+    print(f"[{timestamp}] {msg}")
+
+
+def migrate_file(path):
+    try:
+        return path, migrate_legacy_npy(path), None
+    except Exception as e:
+        traceback.print_exc()
+        return path, False, str(e)
+
+
+def find_depth_files(root_folder):
+    for dirpath, _, filenames in os.walk(root_folder):
+        for name in filenames:
+            if name.endswith(DEPTH_SUFFIX):
+                yield os.path.join(dirpath, name)
+
+
+def migrate_all(root_folder, workers=None):
+    overall_start = time.time()
+    migrated = skipped = failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, done, error in executor.map(migrate_file, find_depth_files(root_folder)):
+            if error:
+                debug_log(f"[错误] 迁移 {path} 失败: {error}")
+                failed += 1
+            elif done:
+                debug_log(f"[迁移] {path}")
+                migrated += 1
+            else:
+                skipped += 1
+    debug_log(f"=== 统计结果 ===")
+    debug_log(f"迁移: {migrated}，已是新格式: {skipped}，失败: {failed}")
+    debug_log(f"总耗时: {time.time() - overall_start:.2f} 秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="旧版NPY迁移为可内存映射的原始采集格式")
+    parser.add_argument("root", nargs="?", default="./data", help="数据根目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认CPU核心数")
+    args = parser.parse_args()
+    migrate_all(args.root, args.workers)
@@ -1,9 +1,13 @@
+import os
+import sys
 import argparse
-import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('TkAgg')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.save.to_npy import load_capture_npy  # noqa: E402
+
 # ========== 参数解析部分 ==========
 parser = argparse.ArgumentParser(description='npy文件读取与展示')
 parser.add_argument('--path', type=str, help='npy文件路径')
@@ -18,35 +22,11 @@ else:
     print(f"使用输入路径: {file_path}")
 
 # ========== 读取与展示部分 ==========
-arr = np.load(file_path, allow_pickle=True)
-
-# 处理多种格式
-if isinstance(arr, dict):
-    data = arr
-elif isinstance(arr, np.ndarray) and arr.dtype == 'O' and arr.size == 1:
-    # 典型的np.save(dict)方式
-    data = arr.item()
-elif isinstance(arr, np.ndarray) and arr.ndim >= 2:
-    # 纯数组格式
-    data = None
-    depth = arr
-    print("本npy文件为数组格式，shape:", depth.shape, "dtype:", depth.dtype)
-    plt.imshow(depth, cmap='gray')
-    plt.title("Depth (array直接存储)")
-    plt.colorbar()
-    plt.show()
-else:
-    print("无法识别的数据结构！")
-    data = None
-
-if data is not None:
-    print("keys:", data.keys())
-    depth = data.get("depth")
-    if depth is not None:
-        print("depth shape:", depth.shape, "dtype:", depth.dtype)
-        plt.imshow(depth, cmap='gray')
-        plt.title("Depth")
-        plt.colorbar()
-        plt.show()
-    else:
-        print("未找到'depth'键")
+# 新格式只映射深度平面(不读颜色), 旧版 pickle 字典文件自动兼容
+depth, _, meta = load_capture_npy(file_path, mmap_mode='r', with_color=False)
+print("格式版本:", meta.get("version"), "内参:", meta.get("intrinsics"))
+print("depth shape:", depth.shape, "dtype:", depth.dtype)
+plt.imshow(depth, cmap='gray')
+plt.title("Depth")
+plt.colorbar()
+plt.show()
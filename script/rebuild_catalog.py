@@ -0,0 +1,31 @@
+'''
+重建采集索引(OUTPUT_DIR 下的 SQLite 采集目录)
+多进程并行扫描全部 YYYY-MM-DD/{timestamp} 目录: 文件大小、PLY 点数、深度范围
+已记录的保存耗时保留, 其余字段以磁盘上的文件为准
+
+python rebuild_catalog.py
+python rebuild_catalog.py --output-dir D:\data --workers 8
+'''
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from modules.catalog import CaptureCatalog, CATALOG_FILENAME  # noqa: E402
+from config import OUTPUT_DIR, CATALOG_PATH  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并行重建采集索引")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="采集数据根目录, 默认 config.OUTPUT_DIR")
+    parser.add_argument("--workers", type=int, default=None, help="进程数, 默认 CPU 核心数")
+    args = parser.parse_args()
+
+    db_path = CATALOG_PATH if args.output_dir == OUTPUT_DIR else os.path.join(args.output_dir, CATALOG_FILENAME)
+    catalog = CaptureCatalog(args.output_dir, db_path)
+    try:
+        catalog.rebuild(args.workers)
+        print(f"索引: {db_path}，共 {catalog.total_count()} 条")
+    finally:
+        catalog.close()
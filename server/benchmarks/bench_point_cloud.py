@@ -0,0 +1,94 @@
+'''
+点云生成基准测试: 旧版 meshgrid 实现 vs 射线表缓存实现 vs 推流实际路径(FrameCache, 每次都是新帧)
+合成 NFOV_UNBINNED(640x576) 深度帧 + 1080P BGRA 彩色帧
+在 server 目录下运行: python -m benchmarks.bench_point_cloud
+'''
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+
+import modules.log
+from modules.generate_point_cloud import generate_point_cloud
+from modules.frame_bus import FramePacket
+from modules.frame_source import SourceCapture
+from modules.frame_cache import FrameCache
+
+modules.log.DEBUG_MODE = False  # 关闭每帧的计时打印
+
+FX, FY = 600.0, 600.0
+DEPTH_SIZE = (576, 640)  # NFOV_UNBINNED
+COLOR_SIZE = (1080, 1920)  # RES_1080P
+
+
+def legacy_generate_point_cloud(depth_image, fx, fy, cx, cy, color_image=None):
+    # 原实现, 仅作对照
+    height, width = depth_image.shape
+    xx, yy = np.meshgrid(np.arange(width), np.arange(height))
+    valid = (depth_image > 0)
+    z = depth_image[valid] / 1000.0
+    x = (xx[valid] - cx) * z / fx
+    y = (yy[valid] - cy) * z / fy
+    points = np.vstack((x, y, z)).T
+    if color_image is not None:
+        colors = color_image[yy[valid], xx[valid], :]
+    else:
+        colors = np.zeros((points.shape[0], 3), dtype=np.uint8)
+    return points, colors
+
+
+def synthetic_frames(count, invalid_ratio=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        depth = rng.integers(300, 4000, DEPTH_SIZE, dtype=np.uint16)
+        depth[rng.random(DEPTH_SIZE) < invalid_ratio] = 0
+        color = rng.integers(0, 256, COLOR_SIZE + (4,), dtype=np.uint8)
+        frames.append((depth, color))
+    return frames
+
+
+def measure(name, fn, frames, repeat):
+    fn(*frames[0])  # 预热(射线表/缓冲区)
+    t_start = time.perf_counter()
+    for i in range(repeat):
+        fn(*frames[i % len(frames)])
+    per_frame = (time.perf_counter() - t_start) / repeat
+
+    tracemalloc.start()
+    fn(*frames[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} {per_frame * 1000:8.2f} ms/帧  {1 / per_frame:7.1f} 帧/秒  峰值分配 {peak / 1024 / 1024:7.2f} MB")
+    return per_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="点云生成基准测试")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=4)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.frames)
+    cx, cy = DEPTH_SIZE[1] / 2.0, DEPTH_SIZE[0] / 2.0
+    cache = FrameCache(FX, FY)  # 不滤波, 与 generate_point_cloud 对比同样的工作量
+    seqs = iter(range(1, 1 << 62))
+
+    def stream(depth, color, step=1):
+        # 与 /ws/depth 相同: 新帧第一次请求时反投影, 取色在访问 colors 时进行
+        packet = FramePacket(next(seqs), SourceCapture(color, depth, 0), 0, time.time())
+        entry = cache.point_cloud(packet, step)
+        return entry.points, entry.colors
+
+    legacy = measure("legacy (meshgrid/float64)",
+                     lambda d, c: legacy_generate_point_cloud(d, FX, FY, cx, cy, c), frames, args.repeat)
+    cached = measure("generate_point_cloud",
+                     lambda d, c: generate_point_cloud(d, FX, FY, cx, cy, c), frames, args.repeat)
+    streamed = measure("FrameCache.point_cloud", stream, frames, args.repeat)
+    measure("FrameCache.point_cloud step=2", lambda d, c: stream(d, c, 2), frames, args.repeat)
+    print(f"加速比: generate_point_cloud {legacy / cached:.2f}x, FrameCache.point_cloud {legacy / streamed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
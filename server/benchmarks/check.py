@@ -0,0 +1,220 @@
+'''
+编码/解码往返校验, 与基准测试放在一起: 优化编码路径后先确认输出仍能被原样解回
+覆盖: 深度增量(threshold=0 无损)、q16 量化、.kdepth 录制(索引截断/缺失、末帧不完整)、
+PCD 的 LZF 字面量兜底、八叉树分块
+
+在 server 目录下运行:
+python -m benchmarks.check
+python -m benchmarks.run --check     # 同上, 有失败时退出码为 1
+'''
+
+import os
+import sys
+import struct
+import tempfile
+import traceback
+import numpy as np
+
+import modules.log
+from modules.frame_bus import FramePacket
+from modules.frame_source import SourceCapture, synthetic_frame
+from modules.point_cloud_wire import DepthDeltaEncoder, DepthDeltaDecoder, encode_points, decode_points, Q16_SCALE
+from modules.depth_recording import DepthRecordingWriter, DepthRecordingReader, INDEX_SUFFIX, INDEX_ENTRY, CODECS
+from modules.depth_recording import lzf as depth_lzf
+from modules.save.to_pcd import lzf, lzf_literal_compress, lzf_compress, save_point_cloud_pcd
+from modules.octree import build_octree, pack_tile, TILE_HEADER, TILE_MAGIC, QUANT_MAX, ROOT_ID
+
+modules.log.DEBUG_MODE = False
+
+DEPTH_SIZE = (640, 576)  # NFOV_UNBINNED, (宽, 高)
+FX, FY = 600.0, 600.0
+
+
+class CheckSkipped(Exception):
+    pass
+
+
+def expect(condition, message):
+    # 不用 assert, python -O 下也要生效
+    if not condition:
+        raise AssertionError(message)
+
+
+def depth_sequence(count, seed=0):
+    '''
+    合成深度序列: 前景球移动、叠加噪声、随机一块区域失效再恢复, 覆盖增量的各种情况
+    '''
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        _, depth = synthetic_frame(DEPTH_SIZE, (16, 16), phase=i * 0.2)
+        valid = depth > 0
+        noise = rng.integers(-3, 4, depth.shape)
+        depth[valid] = np.clip(depth[valid].astype(np.int32) + noise[valid], 1, 65535).astype(np.uint16)
+        if i % 3 == 1:
+            y, x = rng.integers(0, 400), rng.integers(0, 500)
+            depth[y:y + 80, x:x + 80] = 0
+        frames.append(depth)
+    return frames
+
+
+def check_delta_lossless():
+    frames = depth_sequence(12)
+    for compress in ("none", "deflate"):
+        for max_points in (0, 50000):  # 50000 点时关键帧抽样步长 > 1
+            encoder = DepthDeltaEncoder(FX, FY, threshold=0, keyframe_interval=5, compress=compress)
+            decoder = DepthDeltaDecoder()
+            for seq, depth in enumerate(frames, 1):
+                expect(decoder.apply(encoder.encode(depth, seq, max_points)), f"seq {seq} base_seq 不一致")
+                expected = depth[::encoder._step, ::encoder._step]
+                expect(np.array_equal(decoder.depth, expected),
+                       f"compress={compress} max_points={max_points} seq {seq}: 解码结果与输入不一致")
+    # 丢掉一条增量后, 下一条必须被拒绝(客户端据此请求 resync)
+    encoder = DepthDeltaEncoder(FX, FY, threshold=0, keyframe_interval=30)
+    decoder = DepthDeltaDecoder()
+    decoder.apply(encoder.encode(frames[0], 1))
+    encoder.encode(frames[1], 2)
+    expect(not decoder.apply(encoder.encode(frames[2], 3)), "丢帧后增量没有被拒绝")
+
+
+def check_q16_points():
+    rng = np.random.default_rng(1)
+    points = rng.uniform(-5, 5, (10000, 3)).astype(np.float32)
+    for compress in ("none", "deflate"):
+        seq, decoded = decode_points(encode_points(points, 7, "q16", compress))
+        expect(seq == 7 and decoded.shape == points.shape, f"compress={compress}: 头部解析错误")
+        error = float(np.abs(decoded - points).max())
+        expect(error <= Q16_SCALE / 2 + 1e-6, f"compress={compress}: 量化误差 {error:.6f} 超过半个单位")
+
+
+def _record(path, frames, codec):
+    writer = DepthRecordingWriter(path, DEPTH_SIZE[0], DEPTH_SIZE[1], codec=codec)
+    for seq, depth in enumerate(frames, 1):
+        writer.write_packet(FramePacket(seq, SourceCapture(None, depth, seq * 33333), seq * 33333, 1000.0 + seq))
+    writer.set_dropped(3, "队列溢出")
+    writer.release()
+
+
+def _expect_frames(path, frames, count, label):
+    with DepthRecordingReader(path) as reader:
+        expect(len(reader) == count, f"{label}: 读到 {len(reader)} 帧, 应为 {count}")
+        expect(reader.dropped == 3, f"{label}: 文件头丢帧数为 {reader.dropped}")
+        for n in range(count):
+            depth, device_ts, host_time = reader.frame(n)
+            expect(np.array_equal(depth, frames[n]), f"{label}: 第 {n} 帧与输入不一致")
+            expect(device_ts == (n + 1) * 33333 and host_time == 1000.0 + n + 1, f"{label}: 第 {n} 帧时间戳错误")
+
+
+def check_depth_recording():
+    frames = depth_sequence(8)
+    codecs = [codec for codec in CODECS if codec != "lzf" or depth_lzf is not None]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in codecs:
+            path = os.path.join(tmp_dir, f"check_{codec}.kdepth")
+            _record(path, frames, codec)
+            _expect_frames(path, frames, len(frames), codec)
+
+            # 异常退出: 索引只写到一半(最后一条也不完整), 读取端从数据文件补齐
+            index_path = path + INDEX_SUFFIX
+            with open(index_path, "r+b") as f:
+                f.truncate(3 * INDEX_ENTRY.size + 5)
+            _expect_frames(path, frames, len(frames), f"{codec} 索引截断")
+
+            # 索引缺失 + 最后一帧只写了一半
+            os.remove(index_path)
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 10)
+            _expect_frames(path, frames, len(frames) - 1, f"{codec} 无索引且末帧不完整")
+    if len(codecs) < len(CODECS):
+        raise CheckSkipped("zlib 已校验; 未安装 python-lzf, 跳过 lzf")
+
+
+def check_lzf_fallback():
+    if lzf is None:
+        raise CheckSkipped("未安装 python-lzf, 无法用参考实现解压")
+    rng = np.random.default_rng(2)
+    for size in (1, 31, 32, 33, 64, 1000, 100003):
+        data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+        encoded = lzf_literal_compress(data)
+        expect(len(encoded) == size + (size + 31) // 32, f"{size} 字节: 字面量编码长度错误")
+        expect(lzf.decompress(encoded, size) == data, f"{size} 字节: lzf.decompress 结果不一致")
+        # 随机数据不可压缩, lzf_compress 走兜底
+        expect(lzf.decompress(lzf_compress(data), size) == data, f"{size} 字节: lzf_compress 结果不一致")
+
+    # binary_compressed PCD 整体读回
+    points = rng.uniform(-2, 2, (5000, 3)).astype(np.float32)
+    colors = rng.integers(0, 256, (5000, 3), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "check.pcd")
+        save_point_cloud_pcd(path, points, colors, fmt="binary_compressed")
+        with open(path, "rb") as f:
+            raw = f.read()
+    body = raw[raw.index(b"DATA binary_compressed\n") + len(b"DATA binary_compressed\n"):]
+    compressed_size, size = struct.unpack_from("<II", body)
+    fields = np.frombuffer(lzf.decompress(body[8:8 + compressed_size], size), dtype="<u4").reshape(4, -1)
+    expect(np.array_equal(fields[:3].view("<f4").T, points), "PCD binary_compressed 坐标不一致")
+
+
+def check_octree():
+    rng = np.random.default_rng(3)
+    count = 50000
+    points = rng.normal(0, 1, (count, 3)).astype(np.float32)
+    # 用颜色编码原始下标, 解码后按颜色找回对应的原始点
+    ids = np.arange(count, dtype=np.uint32)
+    colors = np.stack((ids & 0xFF, (ids >> 8) & 0xFF, (ids >> 16) & 0xFF), axis=1).astype(np.uint8)
+    index, data = build_octree(points, colors, max_points=2000)
+    nodes = index["nodes"]
+    expect(index["point_count"] == count, "索引点数错误")
+    seen = np.zeros(count, dtype=bool)
+    for node_id, node in nodes.items():
+        payload = data[node["offset"]:node["offset"] + node["length"]]
+        tile = pack_tile(node, payload)
+        magic, n, *lo, size = TILE_HEADER.unpack_from(tile)
+        expect(magic == TILE_MAGIC and n == node["count"], f"节点 {node_id}: 分块头错误")
+        body = tile[TILE_HEADER.size:]
+        q = np.frombuffer(body, dtype="<u2", count=n * 3).reshape(n, 3)
+        rgb = np.frombuffer(body, dtype=np.uint8, offset=n * 6).reshape(n, 3).astype(np.uint32)
+        decoded = np.asarray(lo, dtype=np.float64) + q / QUANT_MAX * size
+        original = rgb[:, 0] | (rgb[:, 1] << 8) | (rgb[:, 2] << 16)
+        expect(not seen[original].any(), f"节点 {node_id}: 点重复出现在多个节点")
+        seen[original] = True
+        # 量化误差半个单位, 加上分块头 f32 包围盒的舍入
+        tolerance = size / QUANT_MAX / 2 + 1e-5
+        error = float(np.abs(decoded - points[original]).max()) if n else 0.0
+        expect(error <= tolerance, f"节点 {node_id}: 误差 {error:.6g} 超过 {tolerance:.6g}")
+        for child in node["children"]:
+            expect(f"{node_id}{child}" in nodes, f"节点 {node_id}: 子节点 {child} 不存在")
+    expect(seen.all(), f"有 {int(count - seen.sum())} 个点不在任何节点中")
+    expect(nodes[ROOT_ID]["count"] == 2000, "根节点点数应等于 max_points")
+
+
+CHECKS = [
+    ("delta_threshold0_lossless", check_delta_lossless),
+    ("q16_quantization", check_q16_points),
+    ("kdepth_roundtrip", check_depth_recording),
+    ("pcd_lzf_fallback", check_lzf_fallback),
+    ("octree_tiles", check_octree),
+]
+
+
+def run_checks():
+    '''
+    逐项运行, 返回失败的项目名列表
+    '''
+    failed = []
+    for name, fn in CHECKS:
+        try:
+            fn()
+            print(f"[通过] {name}", flush=True)
+        except CheckSkipped as e:
+            print(f"[跳过] {name}: {e}", flush=True)
+        except Exception as e:
+            print(f"[失败] {name}: {e}", flush=True)
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+            failed.append(name)
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_checks() else 0)
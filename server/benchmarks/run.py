@@ -0,0 +1,309 @@
+'''
+采集/保存热点路径的基准测试套件
+固定的合成帧(每种 ColorResolution / DepthMode 尺寸), 记录耗时、峰值内存和吞吐量
+峰值内存两列: rss_peak_mb 为单次调用期间进程常驻内存峰值的增量(每个用例在新的 spawn 子进程中测量,
+包含 OpenCV/numpy 在 C 层的分配), py_heap_peak_mb 为 tracemalloc 看到的 Python 堆峰值
+
+在 server 目录下运行:
+python -m benchmarks.run                                  # 全部用例, 打印结果
+python -m benchmarks.run --quick                          # 只测常用尺寸(NFOV_UNBINNED / 1080P)
+python -m benchmarks.run --save benchmarks/baseline.json  # 写入基线
+python -m benchmarks.run --compare benchmarks/baseline.json --threshold 0.2
+    与基线对比, 中位耗时或常驻内存峰值超出阈值的标记为 REGRESSION, 有回退时退出码为 1
+python -m benchmarks.run --no-rss                         # 跳过子进程测量常驻内存, 更快
+python -m benchmarks.run --check                          # 只做编码/解码往返校验(benchmarks/check.py)
+python -m benchmarks.run --filter ply --filter pcd        # 只跑名称包含关键字的用例
+'''
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+import multiprocessing
+import concurrent.futures
+import numpy as np
+import cv2
+import psutil
+
+import modules.log
+from modules.frame_source import synthetic_frame
+from modules.generate_point_cloud import generate_point_cloud
+from modules.jpeg_hub import encode_jpeg
+from modules.save.to_ply import save_point_cloud_ply
+from modules.save.to_pcd import save_point_cloud_pcd
+from modules.save.to_npy import save_point_cloud_npy
+from modules.save.to_json import save_point_cloud_json
+from modules.octree import build_octree
+from modules.point_cloud_filter import remove_depth_outliers, voxel_downsample
+from modules.save.to_png import save_rgb_images, encode_preview
+from benchmarks.check import run_checks
+
+modules.log.DEBUG_MODE = False  # 关闭保存函数的计时打印
+
+# 与 modules/K4A.py 中 pyk4a 的枚举对应, (宽, 高)
+COLOR_RESOLUTIONS = {
+    "RES_720P": (1280, 720),
+    "RES_1080P": (1920, 1080),
+    "RES_1440P": (2560, 1440),
+    "RES_1536P": (2048, 1536),
+    "RES_2160P": (3840, 2160),
+    "RES_3072P": (4096, 3072),
+}
+DEPTH_MODES = {
+    "NFOV_BINNED": (320, 288),
+    "NFOV_UNBINNED": (640, 576),
+    "WFOV_BINNED": (512, 512),
+    "WFOV_UNBINNED": (1024, 1024),
+}
+QUICK_COLOR = ("RES_1080P",)
+QUICK_DEPTH = ("NFOV_UNBINNED",)
+FX, FY = 600.0, 600.0
+MIN_TIME = 0.5  # 每个用例至少运行的秒数
+MIN_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15  # 回退判定阈值(比例)
+
+
+def make_color(size, seed=0):
+    # 合成场景是平滑渐变, 叠加噪声纹理让 JPEG/PNG 的耗时接近真实画面
+    color, _ = synthetic_frame((64, 64), size)
+    noise = np.random.default_rng(seed).integers(0, 24, color.shape[:2], dtype=np.uint8)
+    color[:, :, :3] = cv2.add(color[:, :, :3], cv2.merge([noise, noise, noise]))
+    return color
+
+
+def make_depth(size, seed=0):
+    _, depth = synthetic_frame(size, (16, 16))
+    noise = np.random.default_rng(seed).integers(-3, 4, depth.shape).astype(np.int16)
+    valid = depth > 0
+    depth[valid] = (depth[valid].astype(np.int32) + noise[valid]).astype(np.uint16)
+    return depth
+
+
+def measure(fn, min_time=MIN_TIME, min_repeat=MIN_REPEAT):
+    fn()  # 预热(射线表缓存、首次分配)
+    times = []
+    t_total = time.perf_counter()
+    while len(times) < min_repeat or time.perf_counter() - t_total < min_time:
+        t_start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t_start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times, peak
+
+
+def _reset_peak_rss():
+    # 只有 Linux 能把峰值(VmHWM)重置为当前常驻内存; 其他平台的峰值包含准备数据的部分, 结果偏大
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    '''进程常驻内存峰值(字节)'''
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    info = psutil.Process().memory_info()
+    if hasattr(info, "peak_wset"):  # Windows
+        return info.peak_wset
+    import resource  # Windows 没有 resource 模块
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # macOS 单位为字节
+
+
+def rss_peak_case(color_names, depth_names, key):
+    '''
+    在新的子进程中执行: 只构造该尺寸的数据, 预热一次后测量单次调用期间常驻内存峰值的增量(字节)
+    '''
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, size, fn, _, _ in build_cases(color_names, depth_names, tmp_dir):
+            if f"{name}[{size}]" == key:
+                break
+        else:
+            raise KeyError(key)
+        fn()
+        gc.collect()
+        base = psutil.Process().memory_info().rss
+        _reset_peak_rss()
+        fn()
+        return max(0, _peak_rss() - base)
+
+
+def measure_rss(size, key):
+    # 每个用例一个全新进程, 之前用例留下的堆和高水位不影响结果
+    # glibc 释放大块内存后会动态调高 mmap 阈值, 之后的大数组从已驻留的堆上分配, 增量测不出来;
+    # 子进程固定阈值(启动时读取环境变量), 大于 128KB 的分配总是 mmap, 释放即归还
+    os.environ.setdefault("MALLOC_MMAP_THRESHOLD_", str(128 * 1024))
+    names = ((size,), ()) if size in COLOR_RESOLUTIONS else ((), (size,))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(rss_peak_case, *names, key).result()
+
+
+def build_cases(color_names, depth_names, tmp_dir):
+    '''
+    返回 [(名称, 尺寸标签, 函数, 每次处理的数据量, 单位)]
+    '''
+    cases = []
+    for name in color_names:
+        color = make_color(COLOR_RESOLUTIONS[name])
+        bgr = cv2.cvtColor(color, cv2.COLOR_BGRA2BGR)
+        pixels = color.shape[0] * color.shape[1]
+        png_path = os.path.join(tmp_dir, "bench.png")
+        cases += [
+            ("bgra_to_bgr", name, lambda c=color: cv2.cvtColor(c, cv2.COLOR_BGRA2BGR), pixels, "px"),
+            ("jpeg_encode_q95", name, lambda c=color: encode_jpeg(c), pixels, "px"),
+            ("jpeg_encode_q70_w960", name, lambda c=color: encode_jpeg(c, 70, 960), pixels, "px"),
+            ("save_png", name, lambda b=bgr: save_rgb_images(png_path, b), pixels, "px"),
+            ("encode_thumbnail_w320", name, lambda b=bgr: encode_preview(b, 320), pixels, "px"),
+            ("encode_preview_w1280", name, lambda b=bgr: encode_preview(b, 1280), pixels, "px"),
+        ]
+
+    default_color = make_color(COLOR_RESOLUTIONS["RES_1080P"])
+    default_bgr = cv2.cvtColor(default_color, cv2.COLOR_BGRA2BGR)
+    for name in depth_names:
+        depth = make_depth(DEPTH_MODES[name])
+        height, width = depth.shape
+        cx, cy = width / 2.0, height / 2.0
+        points, colors = generate_point_cloud(depth, FX, FY, cx, cy, default_bgr)
+        n = points.shape[0]
+        path = os.path.join(tmp_dir, "bench")
+        cases += [
+            ("generate_point_cloud", name,
+             lambda d=depth: generate_point_cloud(d, FX, FY, d.shape[1] / 2.0, d.shape[0] / 2.0), n, "pt"),
+            ("generate_point_cloud_color", name,
+             lambda d=depth: generate_point_cloud(d, FX, FY, d.shape[1] / 2.0, d.shape[0] / 2.0, default_bgr),
+             n, "pt"),
+            ("save_npy", name, lambda d=depth: save_point_cloud_npy(tmp_dir, "bench", d, default_bgr), n, "pt"),
+            ("build_octree", name, lambda p=points, c=colors: build_octree(p, c), n, "pt"),
+            ("remove_depth_outliers", name, lambda d=depth: remove_depth_outliers(d, 4), n, "pt"),
+            ("voxel_downsample_5mm", name, lambda p=points, c=colors: voxel_downsample(p, c, 0.005), n, "pt"),
+        ]
+        for fmt in ("binary", "ascii"):
+            cases.append((f"save_ply_{fmt}", name,
+                          lambda p=points, c=colors, f=fmt: save_point_cloud_ply(path + ".ply", p, c, fmt=f), n, "pt"))
+        for fmt in ("binary", "binary_compressed", "ascii"):
+            cases.append((f"save_pcd_{fmt}", name,
+                          lambda p=points, c=colors, f=fmt: save_point_cloud_pcd(path + ".pcd", p, c, fmt=f), n, "pt"))
+        for layout in ("columnar", "rows"):
+            cases.append((f"save_json_{layout}", name,
+                          lambda p=points, c=colors, lo=layout: save_point_cloud_json(path + ".json", p, c, layout=lo),
+                          n, "pt"))
+    return cases
+
+
+def run(color_names, depth_names, filters=None, min_time=MIN_TIME, rss=True):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, size, fn, amount, unit in build_cases(color_names, depth_names, tmp_dir):
+            if filters and not any(f in name for f in filters):
+                continue
+            times, peak = measure(fn, min_time)
+            median = statistics.median(times)
+            key = f"{name}[{size}]"
+            rss_peak = measure_rss(size, key) if rss else None
+            results[key] = {
+                "name": name,
+                "size": size,
+                "repeat": len(times),
+                "median_ms": round(median * 1000, 3),
+                "mean_ms": round(statistics.fmean(times) * 1000, 3),
+                "min_ms": round(min(times) * 1000, 3),
+                "rss_peak_mb": None if rss_peak is None else round(rss_peak / 1024 / 1024, 3),
+                "py_heap_peak_mb": round(peak / 1024 / 1024, 3),
+                "throughput": round(amount / median, 1),
+                "unit": f"{unit}/s",
+            }
+            r = results[key]
+            rss_text = "       -" if rss_peak is None else f"{r['rss_peak_mb']:8.2f}"
+            print(f"{key:<48} {r['median_ms']:9.2f} ms  RSS {rss_text} MB  堆 {r['py_heap_peak_mb']:8.2f} MB  "
+                  f"{r['throughput'] / 1e6:8.2f} M{r['unit']}", flush=True)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    '''
+    返回回退用例列表; 只比较两边都有的用例
+    '''
+    regressions = []
+    print(f"\n对比基线(阈值 {threshold:.0%}, 基线环境 {baseline['environment'].get('platform')})")
+    for key, r in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:<48} 新用例")
+            continue
+        time_ratio = r["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        # 两边都测了常驻内存时按常驻内存比较, 否则(--no-rss)按 Python 堆
+        mem_key = "rss_peak_mb" if r.get("rss_peak_mb") is not None and base.get("rss_peak_mb") is not None \
+            else "py_heap_peak_mb"
+        mem, base_mem = r[mem_key], base.get(mem_key) or 0
+        mem_ratio = mem / base_mem if base_mem else 1.0
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("耗时")
+        if mem_ratio > 1 + threshold and mem - base_mem > 1.0:  # 忽略 1MB 以内的波动
+            flags.append("内存")
+        status = f"REGRESSION({'/'.join(flags)})" if flags else ("faster" if time_ratio < 1 - threshold else "ok")
+        if flags:
+            regressions.append(key)
+        print(f"{key:<48} 耗时 x{time_ratio:5.2f}  内存 x{mem_ratio:5.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集/保存热点路径基准测试")
+    parser.add_argument("--quick", action="store_true", help="只测 NFOV_UNBINNED 和 RES_1080P")
+    parser.add_argument("--color", nargs="*", choices=list(COLOR_RESOLUTIONS), help="彩色分辨率")
+    parser.add_argument("--depth", nargs="*", choices=list(DEPTH_MODES), help="深度模式")
+    parser.add_argument("--filter", action="append", help="只运行名称包含该关键字的用例, 可重复")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="每个用例至少运行的秒数")
+    parser.add_argument("--no-rss", action="store_true", help="不在子进程中测量常驻内存峰值")
+    parser.add_argument("--save", help="把结果写入基线文件(JSON)")
+    parser.add_argument("--compare", help="与基线文件对比")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回退阈值, 0.15 即慢 15%%")
+    parser.add_argument("--check", action="store_true", help="只运行编码/解码往返校验, 有失败时退出码为 1")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if run_checks() else 0)
+
+    color_names = args.color or (QUICK_COLOR if args.quick else tuple(COLOR_RESOLUTIONS))
+    depth_names = args.depth or (QUICK_DEPTH if args.quick else tuple(DEPTH_MODES))
+    results = run(color_names, depth_names, args.filter, args.min_time, rss=not args.no_rss)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"基线已保存: {args.save}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
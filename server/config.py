@@ -1,6 +1,49 @@
+import os
+
 DEBUG_MODE = True  # 是否打印文件操作和Http请求日志
 LOCAL_IP = "127.0.0.1"
-OUTPUT_DIR = 'E:\DeskTop\python_intelligent_computed\collect\data'
-STATIC_PORT = 3001  # 图片预览地址 默认为 Node.js静态端口为3001 Py端口3000 !!! 4K下 Node.js响应为120ms左右  Python为4.5s左右
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", 'E:\DeskTop\python_intelligent_computed\collect\data')
+SERVER_PORT = 3000
+# /data 文件服务: python 由本服务直接提供(sendfile/Range/ETag/内存缓存); node 为旧方式, 另启 static-server.cjs
+STATIC_SERVER = os.environ.get("STATIC_SERVER", "python")
+STATIC_PORT = 3001  # STATIC_SERVER=node 时的图片预览端口, 旧版 StaticFiles 4K下 Node.js响应为120ms左右  Python为4.5s左右
+DATA_CACHE_SIZE_MB = 128  # /data 小文件内存缓存总大小
+DATA_CACHE_MAX_FILE_MB = 8  # 超过该大小的文件不缓存, 直接分块发送
+
+PLY_FORMAT = "binary"  # 点云PLY保存格式: binary(binary_little_endian) / ascii
+PCD_FORMAT = "binary"  # 点云PCD保存格式: binary / binary_compressed(LZF, 建议安装python-lzf) / ascii
+PNG_COMPRESSION = None  # 无损 PNG 压缩级别 0-9(越大越小越慢), None 为 OpenCV 默认(实测最快); 在后台保存进程中编码
+PREVIEW_FORMAT = "jpg"  # 缩略图/预览图格式: jpg / webp
+THUMBNAIL_WIDTH = 320  # 缩略图最大宽度, /capture 返回前写入
+PREVIEW_WIDTH = 1280  # 中等预览图最大宽度, 后台保存任务最先写入
+PREVIEW_QUALITY = 85
+# 点云滤波(modules/point_cloud_filter.py), 按消费者分别配置:
+# min_neighbors 3x3 邻域内深度相近的邻居少于该数时视为离群点(0 关闭), tolerance/min_diff 为相对/最小(毫米)深度容差
+# voxel_size 体素降采样边长(米, 0 关闭); capture 只影响 PLY/PCD/八叉树, NPY 始终为原始深度
+# 默认全部关闭; 需要时按消费者开启, 例如 merge.py 重建网格前去飞点并降采样: "offline": {"min_neighbors": 4, "voxel_size": 0.005}
+POINT_FILTERS = {
+    "stream": {"min_neighbors": 0, "voxel_size": 0.0},
+    "capture": {"min_neighbors": 0, "voxel_size": 0.0},
+    "offline": {"min_neighbors": 0, "voxel_size": 0.0},
+}
+OCTREE_MAX_POINTS = 20000  # 八叉树 LOD 每个节点最多点数
+OCTREE_ON_SAVE = False  # True 时保存任务顺带构建八叉树, 否则第一次查看时构建
+SAVE_WORKERS = 2  # 后台保存进程数
+SAVE_QUEUE_SIZE = 4  # 保存队列上限(含正在执行), 超出时 /capture 返回 busy
+CATALOG_PATH = os.path.join(OUTPUT_DIR, ".capture_catalog.sqlite3")  # 采集索引, 重建: python script/rebuild_catalog.py
+RESOURCE_SAMPLE_INTERVAL = 1.0  # 资源采样间隔(秒)
+RESOURCE_HISTORY = 300  # 保留最近多少个资源样本
+
+VIDEO_SAVE_PATH = os.environ.get("VIDEO_SAVE_PATH", r"E:\DeskTop\python_intelligent_computed\collect\video")
+RECORD_FPS = 15  # 录制输出帧率, 按相机时间戳挑帧
+RECORD_QUEUE_SIZE = 30  # 彩色录制编码缓冲区(帧), 满时丢弃最旧的帧
+DEPTH_RECORD_QUEUE_MB = 512  # 无损深度录制缓冲区(只存深度图, 640x576 每帧约 0.7MB), 溢出时停止深度录制
 
-VIDEO_SAVE_PATH = r"E:\DeskTop\python_intelligent_computed\collect\video"
+# 帧来源: k4a 真实相机 / replay 回放采集目录或 .kdepth 深度录制 / synthetic 合成场景
+# 没有相机的机器上做性能测试: CAMERA_SOURCE=synthetic python main.py
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "k4a")
+REPLAY_PATH = os.environ.get("REPLAY_PATH")  # CAMERA_SOURCE=replay 时必须设置: 采集目录或 .kdepth 文件
+REPLAY_PACING = os.environ.get("REPLAY_PACING", "realtime")  # realtime 按时间戳节奏 / max 尽可能快
+REPLAY_LOOP = os.environ.get("REPLAY_LOOP", "1") != "0"
+REPLAY_FPS = 30  # 回放原始采集目录和合成场景时的帧率
+REPLAY_CACHE_MB = 512  # 回放解码帧的内存缓存上限, 1080p BGRA 每帧约 8MB; 0 为不缓存
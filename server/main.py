@@ -1,5 +1,6 @@
 import time
 import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -7,49 +8,106 @@ import uvicorn
 import os
 import webbrowser
 import subprocess
-import cv2
 
 import global_vars
-from modules.K4A import K4A
+from modules.frame_source import open_frame_source, SourceExhausted
 from modules.log import log as debug_log
-from config import OUTPUT_DIR
-from routers import stats, resource, video_stream, close_stream, capture, websocket_depth, video, video_ws
+from modules.save_pipeline import get_save_pipeline
+from modules.recorder import recorder, depth_recorder
+from modules.resource_sampler import get_resource_sampler
+from modules.catalog import get_capture_catalog
+from modules.file_server import get_data_file_server
+from modules.metrics import FRAMES_CAPTURED, FRAMES_DROPPED, CAPTURE_LOOP_SECONDS
+from config import SERVER_PORT, STATIC_SERVER
+from routers import stats, resource, video_stream, close_stream, capture, websocket_depth, video, video_ws, metrics, octree
 
-k4a = K4A()
-k4a.start()
-debug_log("Azure Kinect已启动")
+k4a = None
+
+
+def count_missed_frames(ts, last_ts, interval):
+    '''
+    根据设备时间戳间隔估算相机漏掉的帧, 帧间隔取见过的最小间隔, 返回新的帧间隔
+    '''
+    if ts is None or last_ts is None or ts <= last_ts:
+        return interval
+    delta = ts - last_ts
+    interval = delta if interval is None else min(interval, delta)
+    missed = round(delta / interval) - 1
+    if missed > 0:
+        FRAMES_DROPPED.inc(missed, reason="camera")
+    return interval
 
 
 def background_capture():
-    frame_count = 0
+    last_ts = interval = None
+    loop_start = time.perf_counter()
     while True:
         try:
-            frame = k4a.get_capture()
+            frame = k4a.get_capture()  # 阻塞直到相机出下一帧
             if frame.color is not None and frame.depth is not None:
-                with global_vars.frame_lock:
-                    global_vars.latest_frame = frame
-                    if global_vars.recording_flag and global_vars.recording_writer is not None:
-                        frame_count += 1
-                        if frame_count % 3 == 0:
-                            rgb_image = cv2.cvtColor(
-                                frame.color, cv2.COLOR_BGRA2BGR)
-                            global_vars.recording_writer.write(rgb_image)
+                packet = global_vars.frame_bus.publish(frame)
+                FRAMES_CAPTURED.inc()
+                interval = count_missed_frames(packet.device_timestamp_usec, last_ts, interval)
+                last_ts = packet.device_timestamp_usec
+                # 录制只在这里挑帧入队, 编码在录制线程中进行
+                recorder.offer(packet)
+                depth_recorder.offer(packet)
+            else:
+                FRAMES_DROPPED.inc(reason="incomplete")
+            now = time.perf_counter()
+            CAPTURE_LOOP_SECONDS.observe(now - loop_start)
+            loop_start = now
+        except SourceExhausted as e:
+            debug_log(f"帧来源已结束: {e}")
+            if recorder.recording or depth_recorder.recording:
+                video.stop_record()
+            return
         except Exception as e:
             debug_log(f"后台采集失败: {e}")
+            FRAMES_DROPPED.inc(reason="error")
             # 这里判断是否在录制，如果是，主动stop_record
-            if global_vars.recording_flag:
+            if recorder.recording or depth_recorder.recording:
                 debug_log("检测到相机断开，自动停止录制")
                 try:
                     video.stop_record()  # 调用接口函数即可
                 except Exception as ex:
                     debug_log(f"自动停止录制失败: {ex}")
-        time.sleep(0.01)
+            time.sleep(0.01)  # 出错时避免空转
+            loop_start = time.perf_counter()
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(BASE_DIR, 'public')
+index_path = os.path.join(PUBLIC_DIR, 'index.html')
+node_server_path = os.path.join(PUBLIC_DIR, 'static-server.cjs')
 
 
-threading.Thread(target=background_capture, daemon=True).start()
-debug_log("后台线程已启动")
+# 相机、后台线程和子进程只在服务进程启动时创建
+# 保存进程池的子进程(spawn)会重新导入本模块, 不能在导入时打开相机
+@asynccontextmanager
+async def lifespan(app):
+    global k4a
+    k4a = open_frame_source()  # 默认为 Azure Kinect, 也可以是回放/合成帧源
+    k4a.start()
+    debug_log(f"帧来源已启动: {type(k4a).__name__}")
+    threading.Thread(target=background_capture, name="capture", daemon=True).start()
+    debug_log("后台线程已启动")
+    get_save_pipeline().start()
+    get_resource_sampler().start()
+    get_capture_catalog().rebuild_if_empty()  # 首次启用索引时为已有目录建索引
 
-app = FastAPI()
+    if os.path.exists(index_path):
+        # 打开默认浏览器
+        webbrowser.open(f"http://localhost:{SERVER_PORT}")
+        if STATIC_SERVER == "node":
+            subprocess.Popen(['node', node_server_path], cwd=PUBLIC_DIR)
+    yield
+    get_resource_sampler().stop()
+    get_save_pipeline().shutdown()
+    k4a.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(resource.router)
 app.include_router(stats.router)
 app.include_router(video_stream.router)
@@ -58,21 +116,14 @@ app.include_router(capture.router)
 app.include_router(websocket_depth.router)
 app.include_router(video.router)
 app.include_router(video_ws.router)
+app.include_router(metrics.router)
+app.include_router(octree.router)
 
 
-app.mount("/data", StaticFiles(directory=OUTPUT_DIR), name="data")
+app.mount("/data", get_data_file_server(), name="data")  # 采集文件, 默认不再需要 Node 静态服务
 # 挂载静态文件目录
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PUBLIC_DIR = os.path.join(BASE_DIR, 'public')
-index_path = os.path.join(PUBLIC_DIR, 'index.html')
-node_server_path = os.path.join(PUBLIC_DIR, 'static-server.cjs')
 app.mount("/", StaticFiles(directory=PUBLIC_DIR, html=True), name="html")
 
-if os.path.exists(index_path):
-    # 打开默认浏览器
-    webbrowser.open("http://localhost:3000")
-    subprocess.Popen(['node', node_server_path], cwd=PUBLIC_DIR)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -83,4 +134,4 @@ app.add_middleware(
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=3000)
+    uvicorn.run(app, host="0.0.0.0", port=SERVER_PORT)
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import multiprocessing
+import concurrent.futures
+
+from modules.log import log as debug_log
+
+'''
+采集目录索引(SQLite, 路径见 config.CATALOG_PATH)
+/capture 投递保存任务时先写入一行(save_total 为空表示仍在保存或保存失败), 任务完成时补全:
+时间戳、文件及大小、点数、深度范围、各阶段耗时
+每日数量单独维护在 daily_counts 表, /stats 只查一行
+已有目录可通过 script/rebuild_catalog.py 并行重建索引; 服务启动时索引为空也会在后台自动重建
+
+目录结构: OUTPUT_DIR/YYYY-MM-DD/{timestamp}/{timestamp}.png|.ply|.pcd|_depth.npy ...
+'''
+
+CATALOG_FILENAME = ".capture_catalog.sqlite3"
+RECENT_MARGIN = 120  # 秒; 重建开始前这段时间内的采集可能仍在保存, 以 record_capture 写入的行为准
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS captures (
+    timestamp   TEXT PRIMARY KEY,
+    date        TEXT NOT NULL,
+    captured_at REAL,
+    dir         TEXT NOT NULL,
+    files       TEXT NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    point_count INTEGER,
+    depth_min   INTEGER,
+    depth_max   INTEGER,
+    width       INTEGER,
+    height      INTEGER,
+    save_stages TEXT,
+    save_total  REAL,
+    job_id      TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_date ON captures (date, timestamp);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    date  TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+'''
+COLUMNS = ("timestamp", "date", "captured_at", "dir", "files", "total_bytes", "point_count",
+           "depth_min", "depth_max", "width", "height", "save_stages", "save_total", "job_id")
+
+
+def list_files(capture_dir):
+    files = {}
+    with os.scandir(capture_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith("."):
+                files[entry.name] = entry.stat().st_size
+    return files
+
+
+def depth_range(depth_image):
+    valid = depth_image[depth_image > 0]
+    if valid.size == 0:
+        return None, None
+    return int(valid.min()), int(valid.max())
+
+
+def read_ply_count(path):
+    # 只读文件头里的 element vertex
+    with open(path, "rb") as f:
+        for _ in range(20):
+            line = f.readline()
+            if line.startswith(b"element vertex"):
+                return int(line.split()[2])
+            if not line or line.startswith(b"end_header"):
+                break
+    return None
+
+
+def scan_capture_dir(capture_dir, output_dir):
+    '''
+    从已有采集目录还原一行索引(保存耗时未知), 供重建使用, 可在子进程中运行
+    '''
+    from modules.save.to_npy import load_capture_npy, DEPTH_SUFFIX
+    timestamp = os.path.basename(capture_dir)
+    date = os.path.basename(os.path.dirname(capture_dir))
+    files = list_files(capture_dir)
+    row = {
+        "timestamp": timestamp, "date": date,
+        "captured_at": int(timestamp) / 1000.0 if timestamp.isdigit() else None,
+        "dir": os.path.relpath(capture_dir, output_dir).replace("\\", "/"),
+        "files": files, "total_bytes": sum(files.values()),
+        "point_count": None, "depth_min": None, "depth_max": None, "width": None, "height": None,
+        "save_stages": None, "save_total": None, "job_id": None,
+    }
+    ply_name = f"{timestamp}.ply"
+    if ply_name in files:
+        row["point_count"] = read_ply_count(os.path.join(capture_dir, ply_name))
+    depth_name = timestamp + DEPTH_SUFFIX
+    if depth_name in files:
+        depth, _, _ = load_capture_npy(os.path.join(capture_dir, depth_name), with_color=False)
+        row["height"], row["width"] = depth.shape[:2]
+        row["depth_min"], row["depth_max"] = depth_range(depth)
+    return row
+
+
+def find_capture_dirs(output_dir):
+    for date in sorted(os.listdir(output_dir)):
+        date_dir = os.path.join(output_dir, date)
+        if not DATE_PATTERN.match(date) or not os.path.isdir(date_dir):
+            continue
+        for name in sorted(os.listdir(date_dir)):
+            path = os.path.join(date_dir, name)
+            if os.path.isdir(path):
+                yield path
+
+
+def _row_to_item(row):
+    item = dict(row)
+    item["files"] = json.loads(item["files"])
+    item["save_stages"] = json.loads(item["save_stages"]) if item["save_stages"] else None
+    return item
+
+
+class CaptureCatalog:
+    def __init__(self, output_dir, db_path=None):
+        self.output_dir = output_dir
+        self.db_path = db_path or os.path.join(output_dir, CATALOG_FILENAME)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _upsert(self, row, replace=True):
+        # 调用方持有锁并在事务中; 新行才给当天计数加一; replace=False 时已有行保持不变
+        exists = self._conn.execute("SELECT 1 FROM captures WHERE timestamp = ?", (row["timestamp"],)).fetchone()
+        if exists and not replace:
+            return
+        values = dict(row)
+        values["files"] = json.dumps(row["files"])
+        values["save_stages"] = None if row.get("save_stages") is None else json.dumps(row["save_stages"])
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO captures ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [values.get(c) for c in COLUMNS])
+        if not exists:
+            self._conn.execute(
+                "INSERT INTO daily_counts (date, count) VALUES (?, 1) "
+                "ON CONFLICT(date) DO UPDATE SET count = count + 1", (row["date"],))
+
+    def _capture_row(self, capture_dir, timestamp, **fields):
+        files = list_files(capture_dir)
+        date = os.path.basename(os.path.dirname(capture_dir))
+        row = {
+            "timestamp": str(timestamp), "date": date,
+            "captured_at": int(timestamp) / 1000.0 if str(timestamp).isdigit() else time.time(),
+            "dir": os.path.relpath(capture_dir, self.output_dir).replace("\\", "/"),
+            "files": files, "total_bytes": sum(files.values()),
+        }
+        row.update(fields)
+        return row
+
+    def record_pending(self, capture_dir, timestamp, job_id=None):
+        '''
+        保存任务投递后立即调用, /stats 的计数与 /capture 请求同步(与按目录计数时一致, 保存失败的采集也计入)
+        任务已先完成、行已存在时不覆盖
+        '''
+        row = self._capture_row(capture_dir, timestamp, job_id=job_id)
+        with self._lock, self._conn:
+            self._upsert(row, replace=False)
+
+    def record_capture(self, capture_dir, timestamp, point_count=None, depth_min=None, depth_max=None,
+                       width=None, height=None, save_stages=None, save_total=None, job_id=None):
+        '''
+        保存任务完成时调用; 文件大小以此刻目录中的文件为准
+        '''
+        row = self._capture_row(
+            capture_dir, timestamp, point_count=point_count, depth_min=depth_min, depth_max=depth_max,
+            width=width, height=height, save_stages=save_stages, save_total=save_total, job_id=job_id)
+        with self._lock, self._conn:
+            self._upsert(row)
+
+    def add_file(self, timestamp, path):
+        '''
+        补记保存任务之外写入的文件(如 /capture 请求里保存的缩略图), 行还不存在时忽略, 之后 record_capture 会扫描到
+        '''
+        with self._lock, self._conn:
+            current = self._conn.execute("SELECT files FROM captures WHERE timestamp = ?", (str(timestamp),)).fetchone()
+            if current is None or not os.path.exists(path):
+                return
+            files = json.loads(current["files"])
+            files[os.path.basename(path)] = os.path.getsize(path)
+            self._conn.execute("UPDATE captures SET files = ?, total_bytes = ? WHERE timestamp = ?",
+                               (json.dumps(files), sum(files.values()), str(timestamp)))
+
+    def get(self, timestamp):
+        '''
+        单条记录, 不存在时返回 None; dir 为相对 output_dir 的路径
+        '''
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM captures WHERE timestamp = ?", (str(timestamp),)).fetchone()
+        return None if row is None else _row_to_item(row)
+
+    def count_for_date(self, date):
+        with self._lock:
+            row = self._conn.execute("SELECT count FROM daily_counts WHERE date = ?", (date,)).fetchone()
+        return row["count"] if row else 0
+
+    def total_count(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(count), 0) AS total FROM daily_counts").fetchone()
+        return row["total"]
+
+    def query(self, start=None, end=None, page=1, page_size=50):
+        '''
+        按日期范围(含两端, YYYY-MM-DD)分页查询, 最新的在前
+        '''
+        where, params = [], []
+        if start:
+            where.append("date >= ?")
+            params.append(start)
+        if end:
+            where.append("date <= ?")
+            params.append(end)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) AS n FROM captures {clause}", params).fetchone()["n"]
+            rows = self._conn.execute(
+                f"SELECT * FROM captures {clause} ORDER BY date DESC, timestamp DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]).fetchall()
+        items = [_row_to_item(row) for row in rows]
+        return {"total": total, "page": page, "page_size": page_size, "items": items}
+
+    def rebuild(self, workers=None):
+        '''
+        并行扫描 OUTPUT_DIR 下全部采集目录重建索引, 已有的保存耗时保留
+        扫描期间服务仍可能写入新采集(也可能是另一个进程), 因此不清空表:
+        采集时间晚于 扫描开始 - RECENT_MARGIN 的已有行不删除也不覆盖, 其余行以扫描结果为准,
+        最后按 captures 重新统计 daily_counts
+        '''
+        t_start = time.time()
+        recent = t_start - RECENT_MARGIN
+        dirs = list(find_capture_dirs(self.output_dir))
+        rows = []
+        # 同 save_pipeline: 服务进程中有其他线程, 用 spawn 而不是 fork 创建扫描进程
+        spawn = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=spawn) as executor:
+            futures = {executor.submit(scan_capture_dir, d, self.output_dir): d for d in dirs}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    debug_log(f"[错误] 索引 {futures[future]} 失败: {e}")
+        with self._lock, self._conn:
+            known = {row["timestamp"]: row for row in self._conn.execute(
+                "SELECT timestamp, captured_at, save_stages, save_total, job_id FROM captures")}
+            protected = {ts for ts, row in known.items() if (row["captured_at"] or 0) >= recent}
+            scanned = {row["timestamp"] for row in rows}
+            self._conn.executemany("DELETE FROM captures WHERE timestamp = ?",
+                                   [(ts,) for ts in known if ts not in scanned and ts not in protected])
+            for row in rows:
+                if row["timestamp"] in protected:
+                    continue
+                old = known.get(row["timestamp"])
+                if old is not None:
+                    row["save_stages"] = json.loads(old["save_stages"]) if old["save_stages"] else None
+                    row["save_total"] = old["save_total"]
+                    row["job_id"] = old["job_id"]
+                self._upsert(row)
+            self._conn.execute("DELETE FROM daily_counts")
+            self._conn.execute("INSERT INTO daily_counts (date, count) SELECT date, COUNT(*) FROM captures GROUP BY date")
+        debug_log(f"采集索引重建完成，{len(rows)} 个目录，用时 {time.time() - t_start:.2f} 秒")
+        return len(rows)
+
+    def rebuild_if_empty(self, workers=2):
+        # 首次启用索引时在后台为已有数据建索引, 不阻塞启动
+        with self._lock:
+            empty = self._conn.execute("SELECT 1 FROM captures LIMIT 1").fetchone() is None
+        if empty and os.path.isdir(self.output_dir) and any(find_capture_dirs(self.output_dir)):
+            threading.Thread(target=self.rebuild, args=(workers,), name="catalog-rebuild", daemon=True).start()
+
+
+capture_catalog = None
+
+
+def get_capture_catalog():
+    global capture_catalog
+    if capture_catalog is None:
+        from config import OUTPUT_DIR, CATALOG_PATH
+        capture_catalog = CaptureCatalog(OUTPUT_DIR, CATALOG_PATH)
+    return capture_catalog
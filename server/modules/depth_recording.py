@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import zlib
+import struct
+import threading
+import numpy as np
+
+try:
+    import lzf  # python-lzf, 可选依赖
+except ImportError:
+    lzf = None
+
+'''
+无损深度录制容器(.kdepth), 只追加写入, 每帧一个独立压缩块, 可按帧号随机读取
+
+文件头(小端):
+  0  6s  magic b"KDEPTH"
+  6  u16 version = 1
+  8  u32 JSON 长度, 之后是 UTF-8 JSON: width, height, codec, intrinsics, created, dropped, error
+     JSON 后预留空格, 结束录制时原位改写 dropped(缓冲区溢出丢弃的帧数)和 error, 长度不变
+帧块: 2s b"FR" + u32 帧号 + u64 设备时间戳(微秒) + f64 主机时间 + u32 压缩后字节数 + 载荷
+载荷: 行内差分(uint16 回绕) -> 高低字节分离 -> lzf(未安装时 zlib level 1)
+
+帧索引(.kdepth.idx): 每帧一条 u64 帧块偏移 + u64 设备时间戳 + f64 主机时间 + u32 载荷字节数
+索引与数据文件同步追加; 索引缺失或比数据短(异常退出)时, 读取端扫描帧块重建
+'''
+
+MAGIC = b"KDEPTH"
+VERSION = 1
+FILE_HEADER = struct.Struct("<6sHI")
+FRAME_HEADER = struct.Struct("<2sIQdI")
+FRAME_MAGIC = b"FR"
+INDEX_ENTRY = struct.Struct("<QQdI")
+DEPTH_RECORDING_SUFFIX = ".kdepth"
+INDEX_SUFFIX = ".idx"
+CODECS = ("lzf", "zlib")
+ZLIB_LEVEL = 1  # 只追求速度
+HEADER_RESERVE = 256  # 文件头 JSON 预留字节, 结束时写入丢帧数和错误信息
+
+
+def default_codec():
+    return "lzf" if lzf is not None else "zlib"
+
+
+def encode_depth(depth_image, codec):
+    '''
+    行内差分让平滑的深度变成小数值, 高低字节分离后高字节几乎全为 0, 压缩率和速度都更好
+    '''
+    depth_image = np.ascontiguousarray(depth_image, dtype="<u2")
+    delta = np.empty_like(depth_image)
+    delta[:, 0] = depth_image[:, 0]
+    np.subtract(depth_image[:, 1:], depth_image[:, :-1], out=delta[:, 1:])
+    planes = delta.view(np.uint8).reshape(-1, 2).T.tobytes()
+    if codec == "lzf":
+        compressed = lzf.compress(planes, len(planes) + len(planes) // 32 + 64)
+        if compressed is None:
+            raise RuntimeError("LZF压缩失败")
+        return compressed
+    return zlib.compress(planes, ZLIB_LEVEL)
+
+
+def decode_depth(payload, width, height, codec):
+    size = width * height * 2
+    if codec == "lzf":
+        if lzf is None:
+            raise RuntimeError("读取LZF深度录制需要安装 python-lzf")
+        planes = lzf.decompress(payload, size)
+    else:
+        planes = zlib.decompress(payload)
+    planes = np.frombuffer(planes, dtype=np.uint8).reshape(2, -1)
+    delta = np.empty((height, width), dtype="<u2")
+    delta.view(np.uint8).reshape(-1, 2)[:] = planes.T
+    # 差分的逆运算: 按行累加(uint16 回绕)
+    return np.cumsum(delta, axis=1, dtype=np.uint16)
+
+
+class DepthRecordingWriter:
+    '''
+    录制线程中使用; write 写入一帧, release 关闭文件
+    '''
+
+    def __init__(self, path, width, height, intrinsics=None, codec=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.codec = codec or default_codec()
+        if self.codec not in CODECS:
+            raise ValueError(f"不支持的深度压缩方式: {self.codec}")
+        self.frames = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.dropped = 0
+        self.error = None
+        self._lock = threading.Lock()
+        self._meta = {
+            "width": width, "height": height, "codec": self.codec,
+            "intrinsics": intrinsics, "created": time.time(), "dropped": 0, "error": None,
+        }
+        header = json.dumps(self._meta).encode("utf-8")
+        self._header_len = len(header) + HEADER_RESERVE
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, self._header_len) + header.ljust(self._header_len))
+        self._index = open(path + INDEX_SUFFIX, "wb")
+
+    def set_dropped(self, dropped, error=None):
+        '''
+        录制线程结束前调用, release 时写入文件头, 读取端据此判断录制是否有缺帧
+        '''
+        self.dropped = dropped
+        self.error = error
+
+    def write_packet(self, packet, repeat=1):
+        # 深度按原始时间戳逐帧保存, 不需要为补帧重复写入
+        depth_image = packet.frame.depth
+        if depth_image is None:
+            return
+        if depth_image.shape != (self.height, self.width):
+            raise ValueError(f"深度分辨率变化: {depth_image.shape}")
+        payload = encode_depth(depth_image, self.codec)
+        device_ts = packet.device_timestamp_usec or 0
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(FRAME_HEADER.pack(FRAME_MAGIC, self.frames, device_ts, packet.host_time, len(payload)))
+            self._file.write(payload)
+            self._index.write(INDEX_ENTRY.pack(offset, device_ts, packet.host_time, len(payload)))
+            self.frames += 1
+            self.raw_bytes += depth_image.nbytes
+            self.compressed_bytes += len(payload)
+
+    def release(self):
+        with self._lock:
+            if self.dropped or self.error:
+                self._rewrite_header()
+            self._file.close()
+            self._index.close()
+
+    def _rewrite_header(self):
+        # 错误信息截断到 32 字(中文转义后每字 6 字节), 保证不超过预留长度
+        error = self.error[:32] if self.error else None
+        header = json.dumps(dict(self._meta, dropped=self.dropped, error=error)).encode("utf-8")
+        self._file.seek(FILE_HEADER.size)
+        self._file.write(header.ljust(self._header_len))
+        self._file.seek(0, os.SEEK_END)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "codec": self.codec,
+            "ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+        }
+
+
+class DepthRecordingReader:
+    '''
+    with DepthRecordingReader("xxx.kdepth") as reader:
+        depth, device_ts, host_time = reader.frame(100)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, header_len = FILE_HEADER.unpack(self._file.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"不是深度录制文件: {path}")
+        self.meta = json.loads(self._file.read(header_len).decode("utf-8"))
+        self.width = self.meta["width"]
+        self.height = self.meta["height"]
+        self.codec = self.meta["codec"]
+        self.dropped = self.meta.get("dropped", 0)  # 旧文件没有此字段
+        self._data_start = FILE_HEADER.size + header_len
+        self.index = self._load_index()
+
+    def _load_index(self):
+        index_path = self.path + INDEX_SUFFIX
+        entries = np.empty(0, dtype=[("offset", "<u8"), ("device_ts", "<u8"), ("host_time", "<f8"), ("size", "<u4")])
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                raw = f.read()
+            count = len(raw) // INDEX_ENTRY.size
+            entries = np.frombuffer(raw[:count * INDEX_ENTRY.size], dtype=entries.dtype)
+        # 索引之后还有完整帧块(索引没来得及写)时, 从索引末尾继续扫描补齐
+        scan_from = self._data_start
+        if entries.shape[0]:
+            last = entries[-1]
+            scan_from = int(last["offset"]) + FRAME_HEADER.size + int(last["size"])
+        extra = self._scan(scan_from)
+        if extra:
+            entries = np.concatenate((entries, np.array(extra, dtype=entries.dtype)))
+        return entries
+
+    def _scan(self, offset):
+        entries = []
+        file_size = os.fstat(self._file.fileno()).st_size
+        while offset + FRAME_HEADER.size <= file_size:
+            self._file.seek(offset)
+            magic, _, device_ts, host_time, size = FRAME_HEADER.unpack(self._file.read(FRAME_HEADER.size))
+            if magic != FRAME_MAGIC or offset + FRAME_HEADER.size + size > file_size:
+                break  # 末尾不完整的帧块
+            entries.append((offset, device_ts, host_time, size))
+            offset += FRAME_HEADER.size + size
+        return entries
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    @property
+    def timestamps(self):
+        '''设备时间戳(微秒)数组'''
+        return self.index["device_ts"]
+
+    def frame(self, n):
+        '''
+        第 n 帧, 返回 (depth uint16, 设备时间戳, 主机时间)
+        '''
+        entry = self.index[n]
+        self._file.seek(int(entry["offset"]) + FRAME_HEADER.size)
+        payload = self._file.read(int(entry["size"]))
+        depth_image = decode_depth(payload, self.width, self.height, self.codec)
+        return depth_image, int(entry["device_ts"]), float(entry["host_time"])
+
+    def frame_at(self, device_ts):
+        '''时间戳不晚于 device_ts 的最后一帧的帧号'''
+        return max(0, int(np.searchsorted(self.timestamps, device_ts, side="right")) - 1)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,266 @@
+import os
+import stat
+import threading
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate
+import anyio
+from starlette.datastructures import Headers
+
+from modules.log import log as debug_log
+
+'''
+/data 下采集文件的静态服务(替代 StaticFiles 和 Node 静态服务), 本身是 ASGI 应用, 在 main 中 mount
+- 服务器支持 ASGI zerocopysend 扩展时用 sendfile 零拷贝发送, 否则在线程中按 1MB 分块读取
+- 支持单段 Range(206/416)、强 ETag、If-None-Match(304)、If-Range
+- 小文件(刚保存的 PNG、JSON 等)放进有上限的 LRU 内存缓存, 按 mtime/大小校验, 文件变化后自动失效
+- 拒绝路径穿越和点开头的文件(如采集索引)
+'''
+
+CHUNK_SIZE = 1024 * 1024
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def make_etag(st):
+    # 采集文件写入后不再修改, inode + mtime(ns) + 大小足以区分内容
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def etag_matches(header, etag):
+    '''
+    If-None-Match 使用弱比较: 忽略 W/ 前缀, 支持 * 和逗号分隔的多个值
+    '''
+    values = [v.strip() for v in header.split(",")]
+    return "*" in values or any(v.removeprefix("W/") == etag for v in values)
+
+
+def parse_range(header, size):
+    '''
+    解析 Range, 返回 (start, end) 闭区间; 格式不支持或多段时返回 None(按整文件返回)
+    '''
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # bytes=-N 最后 N 字节
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class FileCache:
+    '''
+    小文件 LRU 缓存, 总大小不超过 max_bytes, 单个文件不超过 max_file
+    '''
+
+    def __init__(self, max_bytes, max_file):
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {path: (etag, bytes)}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, size):
+        return 0 < size <= self.max_file and self.max_bytes > 0
+
+    def get(self, path, etag):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, etag, data):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[path] = (etag, data)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+def _read_file(path, size):
+    with open(path, "rb") as f:
+        return f.read(size)
+
+
+def _read_at(f, offset, size):
+    # Windows 没有 os.pread; 每个响应独占一个文件对象, seek + read 即可
+    f.seek(offset)
+    return f.read(size)
+
+
+class FileResponse:
+    '''
+    单个文件的 ASGI 响应, 由 DataFileServer.response 构造
+    '''
+
+    def __init__(self, path, st, cache, status_code=200, byte_range=None, headers=None):
+        self.path = path
+        self.st = st
+        self.cache = cache
+        self.status_code = status_code
+        self.byte_range = byte_range or (0, st.st_size - 1)
+        self.headers = headers or {}
+
+    async def __call__(self, scope, receive, send):
+        start, end = self.byte_range
+        length = max(0, end - start + 1)
+        headers = dict(self.headers, **{"content-length": str(length)})
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        etag = self.headers["etag"]
+        size = self.st.st_size
+        if self.cache.cacheable(size):
+            data = self.cache.get(self.path, etag)
+            if data is None:
+                data = await anyio.to_thread.run_sync(_read_file, self.path, size)
+                if len(data) == size:  # 读取期间文件被改写时不缓存
+                    self.cache.put(self.path, etag, data)
+            await send({"type": "http.response.body", "body": data[start:end + 1]})
+            return
+
+        with open(self.path, "rb") as f:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({"type": ZEROCOPY_EXTENSION, "file": f, "offset": start, "count": length})
+                return
+            offset, remaining = start, length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(_read_at, f, offset, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+class PlainResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(self.headers, **{"content-length": str(len(self.body))})
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else self.body})
+
+
+class DataFileServer:
+    def __init__(self, root, cache_bytes=128 * 1024 * 1024, cache_max_file=8 * 1024 * 1024):
+        self.root = os.path.realpath(root)
+        self.cache = FileCache(cache_bytes, cache_max_file)
+
+    def resolve(self, rel_path):
+        '''
+        URL 路径转为 root 下的真实路径, 越界或点开头的文件返回 None
+        '''
+        parts = [p for p in rel_path.replace("\\", "/").split("/") if p]
+        if any(p.startswith(".") for p in parts):
+            return None
+        path = os.path.realpath(os.path.join(self.root, *parts))
+        if os.path.commonpath([self.root, path]) != self.root:
+            return None
+        return path
+
+    def response(self, rel_path, request_headers):
+        path = self.resolve(rel_path)
+        if path is None:
+            return PlainResponse(404, b"Not Found")
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return PlainResponse(404, b"Not Found")
+        if not stat.S_ISREG(st.st_mode):
+            return PlainResponse(404, b"Not Found")
+
+        etag = make_etag(st)
+        headers = {
+            "etag": etag,
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+            "cache-control": "no-cache",  # 每次用 ETag 校验, 命中时只回 304
+            "content-type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+        }
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return PlainResponse(304, headers={k: headers[k] for k in ("etag", "last-modified", "cache-control")})
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == etag):
+            try:
+                byte_range = parse_range(range_header, st.st_size)
+            except RangeNotSatisfiable:
+                return PlainResponse(416, headers={"content-range": f"bytes */{st.st_size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                headers["content-range"] = f"bytes {start}-{end}/{st.st_size}"
+                return FileResponse(path, st, self.cache, 206, byte_range, headers)
+        return FileResponse(path, st, self.cache, 200, None, headers)
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainResponse(405, b"Method Not Allowed", {"allow": "GET, HEAD"})
+        else:
+            # mount 后 path 仍带 /data 前缀, 去掉 root_path 得到相对路径
+            path, root_path = scope["path"], scope.get("root_path", "")
+            rel_path = path[len(root_path):] if path.startswith(root_path) else path
+            response = await anyio.to_thread.run_sync(self.response, rel_path, Headers(scope=scope))
+        await response(scope, receive, send)
+
+
+data_file_server = None
+
+
+def get_data_file_server():
+    global data_file_server
+    if data_file_server is None:
+        from config import OUTPUT_DIR, DATA_CACHE_SIZE_MB, DATA_CACHE_MAX_FILE_MB
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        data_file_server = DataFileServer(OUTPUT_DIR, int(DATA_CACHE_SIZE_MB * 1024 * 1024),
+                                          int(DATA_CACHE_MAX_FILE_MB * 1024 * 1024))
+        debug_log(f"/data 文件服务: {data_file_server.root}，缓存 {DATA_CACHE_SIZE_MB}MB")
+    return data_file_server
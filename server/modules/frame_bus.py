@@ -0,0 +1,86 @@
+import time
+import asyncio
+import threading
+
+'''
+相机帧总线
+采集线程 publish 每一帧, 分配递增序号并记录设备时间戳
+同步消费者用 wait_next 阻塞等待, 异步消费者用 await wait_next_async, 都不需要轮询
+消费者记住上次处理的序号, 通过 packet.skipped(last_seq) 得知中间跳过了几帧
+'''
+
+
+class FramePacket:
+    __slots__ = ("seq", "frame", "device_timestamp_usec", "host_time")
+
+    def __init__(self, seq, frame, device_timestamp_usec, host_time):
+        self.seq = seq
+        self.frame = frame
+        self.device_timestamp_usec = device_timestamp_usec
+        self.host_time = host_time
+
+    def skipped(self, last_seq):
+        # 从 last_seq 到本帧之间没有被处理的帧数
+        return max(0, self.seq - last_seq - 1) if last_seq else 0
+
+
+def _resolve(future, packet):
+    if not future.done():
+        future.set_result(packet)
+
+
+class FrameBus:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = None
+        self._seq = 0
+        self._async_waiters = set()  # {(loop, future)}
+
+    def publish(self, frame):
+        device_ts = getattr(frame, "depth_timestamp_usec", None)
+        with self._cond:
+            self._seq += 1
+            packet = FramePacket(self._seq, frame, device_ts, time.time())
+            self._latest = packet
+            self._cond.notify_all()
+            waiters = self._async_waiters
+            self._async_waiters = set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, packet)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+        return packet
+
+    def latest(self):
+        '''最新一帧的 FramePacket, 还没有帧时为 None'''
+        return self._latest
+
+    def latest_frame(self):
+        packet = self._latest
+        return None if packet is None else packet.frame
+
+    def wait_next(self, after_seq=0, timeout=None):
+        '''
+        阻塞直到出现序号大于 after_seq 的帧, 超时返回 None
+        '''
+        with self._cond:
+            ready = self._cond.wait_for(
+                lambda: self._latest is not None and self._latest.seq > after_seq, timeout)
+            return self._latest if ready else None
+
+    async def wait_next_async(self, after_seq=0, timeout=None):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._latest is not None and self._latest.seq > after_seq:
+                return self._latest
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._async_waiters.add(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
@@ -0,0 +1,171 @@
+import time
+import threading
+import numpy as np
+
+from modules.generate_point_cloud import get_ray_table, unproject_points, gather_colors
+from modules.point_cloud_filter import filter_profile, filter_depth, voxel_groups, group_mean
+from modules.metrics import POINT_CLOUD_SECONDS, POINT_FILTER_SECONDS
+
+'''
+按帧共享的派生数据缓存
+同一帧(frame_bus 序号)的点云只在第一个消费者请求时计算一次, 之后所有 /ws/depth 连接和 /capture 共用
+format=delta 的连接发送的是深度图, 不反投影, 只共用离群点过滤后的深度图(filtered_depth);
+因此只有 delta 客户端时缓存中没有点云, /capture 在保存进程中自行计算
+缓存的数组都是只读的, 消费者需要修改时自行 copy
+按 config.POINT_FILTERS["stream"] 做离群点过滤和体素降采样, 缓存的是滤波后的结果
+出现更新的帧后, 旧帧的结果全部淘汰
+'''
+
+DEFAULT_FX = 600.0
+DEFAULT_FY = 600.0
+
+
+class FramePointCloud:
+    '''
+    某一帧在某个抽样步长下的点云, 颜色按需计算
+    '''
+
+    def __init__(self, seq, frame, step, fx, fy, profile=None):
+        t_start = time.perf_counter()
+        self.seq = seq
+        self.step = step
+        self._frame = frame
+        self._lock = threading.Lock()
+        self._colors = None
+        self._groups = None  # 体素降采样的 (inverse, counts), 取色时按同样分组平均
+
+        depth_image = frame.depth
+        height, width = depth_image.shape
+        cx, cy = width / 2.0, height / 2.0
+        if step > 1:
+            # 抽样后像素 u' 对应原图 u = u' * step
+            depth_image = depth_image[::step, ::step]
+            fx, fy, cx, cy = fx / step, fy / step, cx / step, cy / step
+        self._height, self._width = height, width
+        if profile is not None and profile["min_neighbors"]:
+            t = time.perf_counter()
+            depth_image = filter_depth(depth_image, profile)
+            POINT_FILTER_SECONDS.observe(time.perf_counter() - t, profile="stream", filter="outlier")
+        rays = get_ray_table(depth_image.shape[0], depth_image.shape[1], fx, fy, cx, cy)
+        self.points, self._idx = unproject_points(depth_image, rays)
+        if profile is not None and profile["voxel_size"] > 0 and self.points.shape[0]:
+            t = time.perf_counter()
+            self._groups = voxel_groups(self.points, profile["voxel_size"])
+            self.points = group_mean(self.points, *self._groups)
+            POINT_FILTER_SECONDS.observe(time.perf_counter() - t, profile="stream", filter="voxel")
+        self.points.setflags(write=False)
+        POINT_CLOUD_SECONDS.observe(time.perf_counter() - t_start, source="stream")
+
+    @property
+    def colors(self):
+        '''
+        BGR 颜色(N, 3), 第一次访问时取色; 帧没有彩色图时为 None
+        '''
+        with self._lock:
+            if self._colors is None and self._frame.color is not None:
+                color_image = self._frame.color
+                if self.step > 1:
+                    color_image = color_image[:self._height:self.step, :self._width:self.step]
+                width = (self._width + self.step - 1) // self.step
+                # 直接从 BGRA 取色再丢掉 alpha, 避免整张彩色图 reshape 时拷贝
+                colors = gather_colors(color_image, self._idx, width)[:, :3]
+                if self._groups is not None:
+                    colors = group_mean(colors, *self._groups)
+                colors.setflags(write=False)
+                self._colors = colors
+            return self._colors
+
+
+class FrameCache:
+    def __init__(self, fx=DEFAULT_FX, fy=DEFAULT_FY, profile=None):
+        self.fx = fx
+        self.fy = fy
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._seq = 0  # 当前缓存所属的帧序号
+        self._entries = {}  # {step: FramePointCloud}
+        self._depth = None  # 离群点过滤后的深度图
+        self._building = {}  # {step 或 "depth": Lock}, 保证同一份结果只算一次
+        self.hits = 0
+        self.misses = 0
+
+    def point_cloud(self, packet, step=1):
+        '''
+        取 packet 对应帧的点云, 没有时计算并缓存
+        packet 比当前缓存的帧旧时直接计算, 不写入缓存
+        '''
+        with self._lock:
+            if not self._advance(packet.seq):
+                self.misses += 1
+                return FramePointCloud(packet.seq, packet.frame, step, self.fx, self.fy, self.profile)
+            entry = self._entries.get(step)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            building = self._building.setdefault(step, threading.Lock())
+
+        with building:
+            with self._lock:
+                entry = self._entries.get(step) if self._seq == packet.seq else None
+                if entry is not None:
+                    self.hits += 1
+                    return entry
+            entry = FramePointCloud(packet.seq, packet.frame, step, self.fx, self.fy, self.profile)
+            with self._lock:
+                self.misses += 1
+                if self._seq == packet.seq:
+                    self._entries[step] = entry
+        return entry
+
+    def _advance(self, seq):
+        # 调用方持有锁; 新帧到来时淘汰旧帧的全部结果, seq 比当前帧旧时返回 False(不缓存)
+        if seq > self._seq:
+            self._seq = seq
+            self._entries = {}
+            self._depth = None
+            self._building = {}
+        return seq == self._seq
+
+    def filtered_depth(self, packet):
+        '''
+        按 stream 配置做离群点过滤后的深度图, 所有 format=delta 连接共用; 没有启用离群点过滤时返回原深度图
+        '''
+        if not (self.profile and self.profile["min_neighbors"]):
+            return packet.frame.depth
+        with self._lock:
+            cacheable = self._advance(packet.seq)
+            if cacheable and self._depth is not None:
+                self.hits += 1
+                return self._depth
+            building = self._building.setdefault("depth", threading.Lock()) if cacheable else threading.Lock()
+
+        with building:
+            with self._lock:
+                if cacheable and self._seq == packet.seq and self._depth is not None:
+                    self.hits += 1
+                    return self._depth
+            t = time.perf_counter()
+            depth = filter_depth(packet.frame.depth, self.profile)
+            depth.setflags(write=False)
+            POINT_FILTER_SECONDS.observe(time.perf_counter() - t, profile="stream", filter="outlier")
+            with self._lock:
+                self.misses += 1
+                if cacheable and self._seq == packet.seq:
+                    self._depth = depth
+        return depth
+
+    def peek(self, seq, step=1):
+        '''
+        只查询不计算, 该帧结果不在缓存中时返回 None
+        '''
+        with self._lock:
+            if seq != self._seq:
+                return None
+            return self._entries.get(step)
+
+    def stats(self):
+        with self._lock:
+            return {"seq": self._seq, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+frame_cache = FrameCache(profile=filter_profile("stream"))
@@ -0,0 +1,241 @@
+import os
+import time
+import numpy as np
+import cv2
+
+from modules.log import log as debug_log
+
+'''
+可替换的相机帧来源, 与 PyK4A 保持相同的接口: start() / stop() / get_capture()
+get_capture 返回的对象带 color(BGRA uint8)、depth(uint16 毫米)、depth_timestamp_usec、color_timestamp_usec
+main.background_capture 不区分来源, 没有 Azure Kinect 的机器也能跑通所有接口做性能测试
+
+k4a:       真实相机(需要 pyk4a)
+replay:    回放 /capture 保存的原始采集目录(*_depth.npy) 或深度录制文件(.kdepth)
+synthetic: 程序生成的运动场景, 不依赖任何数据
+
+pacing: realtime 按帧时间戳/帧率节奏出帧; max 不等待, 尽可能快
+'''
+
+SOURCE_KINDS = ("k4a", "replay", "synthetic")
+PACINGS = ("realtime", "max")
+
+
+class SourceExhausted(Exception):
+    '''不循环的回放已经播放完'''
+
+
+class SourceCapture:
+    __slots__ = ("color", "depth", "depth_timestamp_usec", "color_timestamp_usec")
+
+    def __init__(self, color, depth, timestamp_usec):
+        self.color = color
+        self.depth = depth
+        self.depth_timestamp_usec = timestamp_usec
+        self.color_timestamp_usec = timestamp_usec
+
+
+def depth_preview_bgra(depth_image):
+    # 没有彩色图时用深度灰度图代替, 保证下游(JPEG推流/录制)照常工作
+    gray = cv2.convertScaleAbs(depth_image, alpha=255.0 / 4000.0)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGRA)
+
+
+def to_bgra(color_image):
+    if color_image.ndim == 3 and color_image.shape[2] == 3:
+        return cv2.cvtColor(color_image, cv2.COLOR_BGR2BGRA)
+    return np.ascontiguousarray(color_image)
+
+
+class _PacedSource:
+    '''
+    按节奏出帧的公共逻辑; 子类实现 _count() 和 _load(i) -> (color, depth, 相对时间戳微秒)
+    输出的时间戳跨循环单调递增, 与真实相机一样可用于按时间戳挑帧
+    '''
+
+    def __init__(self, fps=30, pacing="realtime", loop=True):
+        if pacing not in PACINGS:
+            raise ValueError(f"不支持的节奏: {pacing}")
+        self.fps = fps
+        self.pacing = pacing
+        self.loop = loop
+        self._index = 0
+        self._loop_offset = 0
+        self._last_ts = None
+        self._next_time = None
+
+    def start(self):
+        self._index = 0
+        self._loop_offset = 0
+        self._last_ts = None
+        self._next_time = None
+
+    def stop(self):
+        pass
+
+    def get_capture(self, timeout=-1):
+        count = self._count()
+        if count == 0:
+            raise SourceExhausted("没有可回放的帧")
+        if self._index >= count:
+            if not self.loop:
+                raise SourceExhausted("回放结束")
+            self._index = 0
+            # 下一轮的时间戳接在上一轮之后
+            self._loop_offset = self._last_ts + int(1_000_000 / self.fps)
+        color, depth, rel_ts = self._load(self._index)
+        ts = self._loop_offset + rel_ts
+        if self.pacing == "realtime":
+            self._wait(ts)
+        self._last_ts = ts
+        self._index += 1
+        return SourceCapture(color, depth, ts)
+
+    def _wait(self, ts):
+        now = time.monotonic()
+        if self._next_time is None or self._last_ts is None:
+            self._next_time = now
+        else:
+            # 帧间隔取时间戳差, 异常时(如不同采集之间相隔很久)退回固定帧率
+            gap = (ts - self._last_ts) / 1_000_000
+            if not 0 < gap <= 1.0:
+                gap = 1.0 / self.fps
+            self._next_time += gap
+            if self._next_time < now - 1.0:
+                self._next_time = now  # 落后太多时不追帧
+        delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplaySource(_PacedSource):
+    '''
+    path 可以是 .kdepth 文件, 也可以是包含 *_depth.npy 的目录(递归, 按文件名排序)
+    解码后的帧缓存在内存中(总大小不超过 cache_bytes), 循环回放时缓存中的帧不再读盘
+    '''
+
+    def __init__(self, path, fps=30, pacing="realtime", loop=True, cache_bytes=512 * 1024 * 1024):
+        super().__init__(fps, pacing, loop)
+        self.path = path
+        self.cache_bytes = cache_bytes
+        self._cache = {}
+        self._cache_size = 0
+        self._reader = None
+        self._files = []
+
+    def start(self):
+        super().start()
+        self.stop()
+        # 重新启动时重新扫描, 文件可能已经变化
+        self._files = []
+        self._cache = {}
+        self._cache_size = 0
+        if self.path.endswith(".kdepth"):
+            from modules.depth_recording import DepthRecordingReader
+            self._reader = DepthRecordingReader(self.path)
+        else:
+            from modules.save.to_npy import DEPTH_SUFFIX
+            for dirpath, _, filenames in os.walk(self.path):
+                self._files += [os.path.join(dirpath, name) for name in filenames if name.endswith(DEPTH_SUFFIX)]
+            self._files.sort()
+        debug_log(f"回放 {self.path}，共 {self._count()} 帧，节奏 {self.pacing}，循环 {self.loop}")
+
+    def stop(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _count(self):
+        return len(self._reader) if self._reader is not None else len(self._files)
+
+    def _load(self, i):
+        frame = self._cache.get(i)
+        if frame is not None:
+            return frame
+        if self._reader is not None:
+            depth, device_ts, _ = self._reader.frame(i)
+            rel_ts = device_ts - int(self._reader.timestamps[0])
+            color = depth_preview_bgra(depth)
+        else:
+            from modules.save.to_npy import load_capture_npy
+            depth, color, meta = load_capture_npy(self._files[i], mmap_mode=None)
+            depth = np.ascontiguousarray(depth, dtype=np.uint16)
+            color = depth_preview_bgra(depth) if color is None else to_bgra(color)
+            # 原始采集之间时间间隔不固定, 按固定帧率排时间戳
+            rel_ts = int(i * 1_000_000 / self.fps)
+        frame = (color, depth, rel_ts)
+        size = color.nbytes + depth.nbytes
+        if self._cache_size + size <= self.cache_bytes:
+            self._cache[i] = frame
+            self._cache_size += size
+        return frame
+
+
+class SyntheticSource(_PacedSource):
+    '''
+    平面背景前一个来回移动的球, 预先生成 frames 帧循环使用, 生成开销不影响测试结果
+    '''
+
+    def __init__(self, depth_size=(640, 576), color_size=(1920, 1080), fps=30, pacing="realtime", frames=30):
+        super().__init__(fps, pacing, loop=True)
+        self.depth_size = depth_size
+        self.color_size = color_size
+        self.frames = frames
+        self._frames = []
+
+    def start(self):
+        super().start()
+        if not self._frames:
+            self._frames = [self._generate(i) for i in range(self.frames)]
+        debug_log(f"合成帧源 深度{self.depth_size} 彩色{self.color_size}，{self.fps}fps，节奏 {self.pacing}")
+
+    def _count(self):
+        return len(self._frames)
+
+    def _load(self, i):
+        return self._frames[i]
+
+    def _generate(self, i):
+        color, depth = synthetic_frame(self.depth_size, self.color_size, 2 * np.pi * i / self.frames)
+        return color, depth, int(i * 1_000_000 / self.fps)
+
+
+def synthetic_frame(depth_size=(640, 576), color_size=(1920, 1080), phase=0.0):
+    '''
+    生成一帧合成场景, 返回 (BGRA 彩色, uint16 深度); 尺寸均为 (宽, 高)
+    '''
+    width, height = depth_size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    depth = 1500 + 0.5 * y  # 倾斜的背景平面
+    cx, cy, r = width * (0.5 + 0.3 * np.sin(phase)), height * 0.5, min(width, height) * 0.2
+    d2 = (x - cx) ** 2 + (y - cy) ** 2
+    inside = d2 < r * r
+    depth[inside] = 900 - np.sqrt(r * r - d2[inside]) * 2
+    depth = depth.astype(np.uint16)
+    depth[:, :width // 20] = 0  # 左侧一条无效区域
+    color_w, color_h = color_size
+    color = np.empty((color_h, color_w, 4), dtype=np.uint8)
+    color[:, :, 0] = np.linspace(0, 255, color_w, dtype=np.uint8)[None, :]
+    color[:, :, 1] = np.linspace(0, 255, color_h, dtype=np.uint8)[:, None]
+    color[:, :, 2] = int(127 + 127 * np.sin(phase))
+    color[:, :, 3] = 255
+    return color, depth
+
+
+def open_frame_source(kind=None):
+    '''
+    按 config 创建帧来源, 真实相机只在 kind=k4a 时才导入 pyk4a
+    '''
+    import config
+    kind = kind or config.CAMERA_SOURCE
+    if kind not in SOURCE_KINDS:
+        raise ValueError(f"不支持的帧来源: {kind}")
+    if kind == "k4a":
+        from modules.K4A import K4A
+        return K4A()
+    if kind == "replay":
+        if not config.REPLAY_PATH or not os.path.exists(config.REPLAY_PATH):
+            raise ValueError(f"CAMERA_SOURCE=replay 需要设置 REPLAY_PATH 为采集目录或 .kdepth 文件: {config.REPLAY_PATH}")
+        return ReplaySource(config.REPLAY_PATH, config.REPLAY_FPS, config.REPLAY_PACING, config.REPLAY_LOOP,
+                            int(config.REPLAY_CACHE_MB * 1024 * 1024))
+    return SyntheticSource(fps=config.REPLAY_FPS, pacing=config.REPLAY_PACING)
@@ -1,21 +1,101 @@
 import time
+import threading
+from collections import OrderedDict
 import numpy as np
 from modules.log import log as debug_log
 
+'''
+点云生成
+每个 (分辨率, 内参) 组合的逐像素射线表只计算一次并缓存(LRU淘汰)
+反投影: x = ray_x * z, y = ray_y * z, 全程 float32
+'''
 
-def generate_point_cloud(depth_image, fx, fy, cx, cy, color_image=None):
-    t_start = time.time()
+RAY_CACHE_SIZE = 4  # 最多缓存几组射线表(分辨率 x 内参)
+
+_ray_cache = OrderedDict()  # {(h, w, fx, fy, cx, cy): rays}
+_ray_cache_lock = threading.Lock()
+
+
+def get_ray_table(height, width, fx, fy, cx, cy):
+    """
+    返回形状为 (height*width, 2) 的 float32 射线表, 第0列 (u-cx)/fx, 第1列 (v-cy)/fy
+    结果只读, 多个调用方共享
+    """
+    key = (int(height), int(width), float(fx), float(fy), float(cx), float(cy))
+    with _ray_cache_lock:
+        rays = _ray_cache.get(key)
+        if rays is not None:
+            _ray_cache.move_to_end(key)
+            return rays
+
+    rays = np.empty((height, width, 2), dtype=np.float32)
+    rays[:, :, 0] = ((np.arange(width, dtype=np.float64) - cx) / fx)[None, :]
+    rays[:, :, 1] = ((np.arange(height, dtype=np.float64) - cy) / fy)[:, None]
+    rays = rays.reshape(-1, 2)
+    rays.setflags(write=False)
+
+    with _ray_cache_lock:
+        _ray_cache[key] = rays
+        _ray_cache.move_to_end(key)
+        while len(_ray_cache) > RAY_CACHE_SIZE:
+            _ray_cache.popitem(last=False)
+    return rays
+
+
+def clear_ray_cache():
+    with _ray_cache_lock:
+        _ray_cache.clear()
+
+
+def _unproject(depth_image, rays, color_image, points_buf, colors_buf):
     height, width = depth_image.shape
-    xx, yy = np.meshgrid(np.arange(width), np.arange(height))
-    valid = (depth_image > 0)
-    z = depth_image[valid] / 1000.0
-    x = (xx[valid] - cx) * z / fx
-    y = (yy[valid] - cy) * z / fy
-    points = np.vstack((x, y, z)).T
+    points, idx = unproject_points(depth_image, rays, points_buf)
+    colors = colors_buf[:idx.shape[0]]
     if color_image is not None:
-        colors = color_image[yy[valid], xx[valid], :]
+        gather_colors(color_image, idx, width, colors)
     else:
-        colors = np.zeros((points.shape[0], 3), dtype=np.uint8)
+        colors[:] = 0
+    return points, colors
+
+
+def unproject_points(depth_image, rays, points_buf=None):
+    '''
+    只反投影坐标, 返回 (points, idx), idx 为有效深度像素的行主序下标, 可用于之后按需取色
+    '''
+    depth_flat = depth_image.reshape(-1)
+    idx = np.flatnonzero(depth_flat)
+    n = idx.shape[0]
+    if points_buf is None:
+        points_buf = np.empty((n, 3), dtype=np.float32)
+
+    points = points_buf[:n]
+    # z(米) 直接写入输出缓冲区第2列, x/y 在原位乘射线
+    np.multiply(depth_flat[idx], np.float32(0.001), out=points[:, 2], casting="unsafe")
+    np.take(rays[:, 0], idx, out=points[:, 0])
+    np.take(rays[:, 1], idx, out=points[:, 1])
+    points[:, 0] *= points[:, 2]
+    points[:, 1] *= points[:, 2]
+    return points, idx
+
+
+def gather_colors(color_image, idx, width, out=None):
+    # 与深度同坐标取色(颜色图左上角 height x width 区域), 换算成颜色图的行主序下标
+    color_width = color_image.shape[1]
+    if color_width != width:
+        idx = idx + (idx // width) * (color_width - width)
+    color_flat = color_image.reshape(-1, color_image.shape[2])
+    return np.take(color_flat, idx, axis=0, out=out)
+
+
+def generate_point_cloud(depth_image, fx, fy, cx, cy, color_image=None):
+    t_start = time.time()
+    height, width = depth_image.shape
+    rays = get_ray_table(height, width, fx, fy, cx, cy)
+    size = int(np.count_nonzero(depth_image))
+    channels = 3 if color_image is None else color_image.shape[2]
+    points, colors = _unproject(depth_image, rays, color_image,
+                                np.empty((size, 3), dtype=np.float32),
+                                np.empty((size, channels), dtype=np.uint8))
     t_end = time.time()
     debug_log(f"生成点云完成，用时 {t_end - t_start:.3f} 秒")
     return points, colors
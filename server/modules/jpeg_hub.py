@@ -0,0 +1,188 @@
+import time
+import asyncio
+import threading
+from collections import deque
+import cv2
+
+import global_vars
+from modules.log import log as debug_log
+from modules.metrics import JPEG_ENCODE_SECONDS, STREAM_CLIENTS
+
+'''
+MJPEG 广播中心
+每个 (质量, 最大宽度) 组合一个编码线程, 每个新相机帧只编码一次, 同一份字节分发给所有订阅者
+订阅者各自限制帧率, 队列满时丢弃最旧的帧
+'''
+
+DEFAULT_QUALITY = 95  # 与 cv2.imencode 默认一致
+WAIT_TIMEOUT = 0.5  # 等待新帧的超时, 超时后检查是否还有订阅者
+
+
+def encode_jpeg(color_image, quality=DEFAULT_QUALITY, max_width=None):
+    if color_image.ndim == 3 and color_image.shape[2] == 4:
+        color_image = cv2.cvtColor(color_image, cv2.COLOR_BGRA2BGR)
+    height, width = color_image.shape[:2]
+    if max_width and width > max_width:
+        color_image = cv2.resize(color_image, (max_width, round(height * max_width / width)),
+                                 interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", color_image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise RuntimeError("JPEG编码失败")
+    return encoded.tobytes()
+
+
+def profile_name(profile):
+    quality, max_width = profile
+    return f"q{quality}_w{max_width or 'full'}"
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Subscriber:
+    def __init__(self, profile, fps=None, queue_size=1):
+        self.profile = profile
+        self.min_interval = 1.0 / fps if fps else 0.0
+        self._queue = deque(maxlen=max(1, queue_size))  # 满了自动丢最旧的
+        self._cond = threading.Condition()
+        self._async_waiter = None  # (loop, future), 异步消费者等待时登记
+        self._last_accept = 0.0
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, data, now):
+        # 帧率限制: 距离上次接收不足最小间隔直接跳过
+        if now - self._last_accept < self.min_interval:
+            return
+        self._last_accept = now
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(data)
+            self._cond.notify()
+            waiter, self._async_waiter = self._async_waiter, None
+        if waiter is not None:
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    def get(self, timeout=None):
+        '''
+        取下一帧 JPEG 字节, 超时或已关闭返回 None
+        '''
+        with self._cond:
+            if not self._queue and not self.closed:
+                self._cond.wait(timeout)
+            if not self._queue:
+                return None
+            self.sent += 1
+            return self._queue.popleft()
+
+    async def get_async(self, timeout=None):
+        '''
+        get 的异步版本, 不占用线程池
+        '''
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if not self._queue and not self.closed:
+                future = loop.create_future()
+                self._async_waiter = (loop, future)
+            else:
+                future = None
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        with self._cond:
+            self._async_waiter = None
+            if not self._queue:
+                return None
+            self.sent += 1
+            return self._queue.popleft()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            waiter, self._async_waiter = self._async_waiter, None
+        if waiter is not None:
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass
+
+
+class JpegHub:
+    def __init__(self, frame_bus=None):
+        self._frame_bus = frame_bus or global_vars.frame_bus
+        self._lock = threading.Lock()
+        self._subscribers = {}  # {profile: set(Subscriber)}
+        self._threads = {}  # {profile: Thread}
+        self.encoded_frames = 0
+
+    def subscribe(self, quality=DEFAULT_QUALITY, max_width=None, fps=None, queue_size=1):
+        profile = (int(quality), int(max_width) if max_width else None)
+        sub = Subscriber(profile, fps, queue_size)
+        with self._lock:
+            self._subscribers.setdefault(profile, set()).add(sub)
+            if profile not in self._threads:
+                thread = threading.Thread(target=self._encode_loop, args=(profile,),
+                                          name=f"jpeg-{profile_name(profile)}", daemon=True)
+                self._threads[profile] = thread
+                thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        with self._lock:
+            subs = self._subscribers.get(sub.profile)
+            if subs is not None:
+                subs.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "profiles": {profile_name(profile): len(subs) for profile, subs in self._subscribers.items()},
+                "encoded_frames": self.encoded_frames,
+            }
+
+    def _encode_loop(self, profile):
+        quality, max_width = profile
+        last_seq = 0
+        while True:
+            with self._lock:
+                if not self._subscribers.get(profile):
+                    # 没有订阅者时退出, 下次订阅再启动
+                    self._subscribers.pop(profile, None)
+                    self._threads.pop(profile, None)
+                    return
+            packet = self._frame_bus.wait_next(last_seq, timeout=WAIT_TIMEOUT)
+            if packet is None:
+                continue
+            last_seq = packet.seq
+            if packet.frame.color is None:
+                continue
+            t_start = time.perf_counter()
+            try:
+                data = encode_jpeg(packet.frame.color, quality, max_width)
+            except Exception as e:
+                debug_log(f"JPEG编码失败: {e}")
+                continue
+            JPEG_ENCODE_SECONDS.observe(time.perf_counter() - t_start, profile=profile_name(profile))
+            self.encoded_frames += 1
+            now = time.monotonic()
+            with self._lock:
+                subs = list(self._subscribers.get(profile, ()))
+            for sub in subs:
+                sub.offer(data, now)
+
+
+jpeg_hub = JpegHub()
+STREAM_CLIENTS.set_function(lambda: {(name,): n for name, n in jpeg_hub.stats()["profiles"].items()})
@@ -0,0 +1,218 @@
+import time
+import bisect
+import threading
+
+'''
+进程内轻量指标注册表, /metrics 以 Prometheus 文本格式输出
+Counter 只增不减, Gauge 可设置或在导出时回调取值, Histogram 固定分桶
+记录一次只是一次加锁和几次加法, 可以在生产环境常开
+保存进程池子进程中的计时不会进入这里, 由主进程在任务完成时统一记录
+
+用法:
+FRAMES = counter("frames_captured_total", "采集到的帧数")
+FRAMES.inc()
+SAVE_SECONDS = histogram("save_seconds", "保存耗时", ["format"])
+SAVE_SECONDS.observe(0.12, format="ply")
+with SAVE_SECONDS.time(format="pcd"):
+    ...
+'''
+
+PREFIX = "kinect_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._samples()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        '''
+        导出时才调用 function 取值, 平时零开销
+        无标签时返回数值, 有标签时返回 {标签值元组: 数值}
+        '''
+        self._function = function
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+        value = self._function()
+        if not self.labelnames:
+            return [((), value)]
+        return [(tuple(str(v) for v in key), v) for key, v in value.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数(非累计, 最后一个为 +Inf), 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            samples = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in sorted(samples):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, documentation, labelnames=(), **kwargs):
+    # 同名指标只注册一次, 模块被重复导入时返回已有实例
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        try:
+            lines += metric.render()
+        except Exception as e:
+            lines.append(f"# {metric.name} 导出失败: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+# 各模块共用的指标在这里集中定义, 名称一目了然
+FRAMES_CAPTURED = counter("frames_captured_total", "发布到帧总线的相机帧数")
+FRAMES_DROPPED = counter("frames_dropped_total", "丢弃或相机漏掉的帧数", ["reason"])
+CAPTURE_LOOP_SECONDS = histogram("capture_loop_seconds", "采集线程每次循环耗时(含等待相机)",
+                                 buckets=(0.005, 0.01, 0.02, 0.033, 0.05, 0.066, 0.1, 0.2, 0.5, 1.0))
+JPEG_ENCODE_SECONDS = histogram("jpeg_encode_seconds", "MJPEG 每帧编码耗时", ["profile"])
+POINT_CLOUD_SECONDS = histogram("point_cloud_seconds", "点云生成耗时", ["source"])
+POINT_FILTER_SECONDS = histogram("point_filter_seconds", "点云滤波耗时(离群点/体素)", ["profile", "filter"])
+SAVE_SECONDS = histogram("save_seconds", "后台保存各阶段耗时", ["stage", "format"])
+SAVE_JOBS = counter("save_jobs_total", "后台保存任务数", ["status"])
+CAPTURE_REQUEST_SECONDS = histogram("capture_request_seconds", "/capture 请求处理耗时")
+WEBSOCKET_CLIENTS = gauge("websocket_clients", "当前 WebSocket 连接数", ["endpoint"])
+STREAM_CLIENTS = gauge("stream_clients", "当前 MJPEG 订阅者数", ["profile"])
+RECORDING_ENCODE_SECONDS = histogram("recording_encode_seconds", "录制编码每帧耗时", ["kind"])
+RECORDING_LAG_SECONDS = histogram("recording_lag_seconds", "录制从采集到写入的延迟", ["kind"])
+RECORDING_QUEUE = gauge("recording_queue_frames", "录制缓冲区排队帧数", ["kind"])
+RECORDING_DROPPED = counter("recording_dropped_frames_total", "录制缓冲区满丢弃的帧数", ["kind"])
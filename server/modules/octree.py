@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import struct
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from modules.log import log as debug_log
+
+'''
+保存点云的八叉树 LOD 分块
+每个节点最多 max_points 个点: 先把点随机打乱, 节点取子树中前 max_points 个点作为该层的均匀抽样,
+剩下的点按八分体交给子节点; 因此根节点就是整片点云的粗略版本, 逐层加载子节点即可逐步细化,
+父子节点的点不重复, 全部节点加起来正好是原始点云
+
+文件(与采集文件同目录):
+  {timestamp}.octree.json  索引: 包围盒、各节点在 bin 中的偏移/点数/子节点
+  {timestamp}.octree.bin   各节点数据首尾相接, 每个节点:
+    uint16 xyz[count*3]  相对节点包围盒量化: x = min + q / 65535 * size
+    uint8  rgb[count*3]
+节点 id: 根为 "r", 子节点在父 id 后追加八分体编号 0-7(bit0 x, bit1 y, bit2 z 取上半)
+'''
+
+OCTREE_VERSION = 1
+INDEX_SUFFIX = ".octree.json"
+DATA_SUFFIX = ".octree.bin"
+ROOT_ID = "r"
+DEFAULT_MAX_POINTS = 20000
+MAX_DEPTH = 12  # 到达最大深度时节点保留剩余全部点
+QUANT_MAX = 65535
+TILE_MAGIC = b"OCT1"
+TILE_HEADER = struct.Struct("<4sI4f")
+INDEX_CACHE_SIZE = 32
+
+
+def _cube_bounds(points):
+    # 用立方体包围盒, 子节点也保持立方体, 八分比较简单
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    size = float((hi - lo).max()) or 1e-3
+    center = (lo + hi) / 2
+    return (center - size / 2).astype(np.float64), size
+
+
+def _quantize(points, lo, size):
+    q = (points - lo) * (QUANT_MAX / size)
+    return np.clip(np.rint(q), 0, QUANT_MAX).astype("<u2")
+
+
+def build_octree(points, colors=None, max_points=DEFAULT_MAX_POINTS, seed=0):
+    '''
+    返回 (index, data): index 为可写成 JSON 的字典, data 为节点数据拼接后的 bytes
+    colors 为 (N, 3) RGB uint8, 为 None 时全部为白色
+    '''
+    points = np.asarray(points, dtype=np.float32)
+    if colors is None:
+        colors = np.full(points.shape, 255, dtype=np.uint8)
+    order = np.random.default_rng(seed).permutation(points.shape[0])
+    points = points[order]
+    colors = np.ascontiguousarray(colors[order], dtype=np.uint8)
+
+    nodes = {}
+    chunks = []
+    offset = 0
+    root_lo, root_size = _cube_bounds(points) if points.shape[0] else (np.zeros(3), 1.0)
+    # (节点 id, 点的下标(保持打乱后的顺序), 包围盒最小角, 边长)
+    stack = [(ROOT_ID, np.arange(points.shape[0]), root_lo, root_size)]
+    while stack:
+        node_id, idx, lo, size = stack.pop()
+        depth = len(node_id) - 1
+        keep, rest = (idx, idx[:0]) if idx.shape[0] <= max_points or depth >= MAX_DEPTH \
+            else (idx[:max_points], idx[max_points:])
+
+        payload = _quantize(points[keep], lo, size).tobytes() + colors[keep].tobytes()
+        chunks.append(payload)
+        node = {"offset": offset, "length": len(payload), "count": int(keep.shape[0]),
+                "min": [float(v) for v in lo], "size": size, "children": []}
+        offset += len(payload)
+        nodes[node_id] = node
+
+        if rest.shape[0]:
+            half = size / 2
+            rest_points = points[rest]
+            octant = ((rest_points[:, 0] >= lo[0] + half).astype(np.uint8)
+                      | ((rest_points[:, 1] >= lo[1] + half).astype(np.uint8) << 1)
+                      | ((rest_points[:, 2] >= lo[2] + half).astype(np.uint8) << 2))
+            for child in range(8):
+                child_idx = rest[octant == child]
+                if child_idx.shape[0] == 0:
+                    continue
+                child_lo = lo + half * np.array([child & 1, (child >> 1) & 1, (child >> 2) & 1])
+                node["children"].append(child)
+                stack.append((f"{node_id}{child}", child_idx, child_lo, half))
+
+    index = {
+        "version": OCTREE_VERSION,
+        "point_count": int(points.shape[0]),
+        "max_points": max_points,
+        "min": [float(v) for v in root_lo],
+        "size": root_size,
+        "layout": "uint16 xyz (相对节点包围盒量化到 0-65535) + uint8 rgb",
+        "nodes": nodes,
+    }
+    return index, b"".join(chunks)
+
+
+def octree_paths(capture_dir, timestamp):
+    prefix = os.path.join(capture_dir, str(timestamp))
+    return prefix + INDEX_SUFFIX, prefix + DATA_SUFFIX
+
+
+def save_octree(capture_dir, timestamp, points, colors=None, max_points=DEFAULT_MAX_POINTS):
+    '''
+    生成并写入八叉树文件, 先写 bin 再写索引, 索引存在即表示构建完成
+    '''
+    index, data = build_octree(points, colors, max_points)
+    index_path, data_path = octree_paths(capture_dir, timestamp)
+    with open(data_path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(data_path + ".tmp", data_path)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+def load_capture_points(capture_dir, timestamp, filters=None):
+    '''
+    从采集目录的 _depth.npy(+ _color.npy) 重新生成点云, 比解析 PLY 快; 返回 (points, rgb)
+    取色和滤波与保存任务一致(filters 为 POINT_FILTERS["capture"]), 按需构建和保存时构建的八叉树相同
+    '''
+    from modules.save.to_npy import load_capture_npy, DEPTH_SUFFIX
+    from modules.generate_point_cloud import generate_point_cloud
+    from modules.point_cloud_filter import filter_depth, filter_points
+    depth, color, meta = load_capture_npy(os.path.join(capture_dir, f"{timestamp}{DEPTH_SUFFIX}"))
+    k = meta["intrinsics"]
+    if filters:
+        depth = filter_depth(depth, filters)
+    points, colors = generate_point_cloud(depth, k["fx"], k["fy"], k["cx"], k["cy"], color)
+    if filters:
+        points, colors = filter_points(points, colors, filters)
+    rgb = None if color is None else colors[:, 2::-1]  # 采集保存的是 BGR
+    return points, rgb
+
+
+class OctreeStore:
+    '''
+    按需构建和读取八叉树; 同一采集只构建一次, 并发请求等待同一次构建
+    '''
+
+    def __init__(self, max_points=DEFAULT_MAX_POINTS, filters=None):
+        self.max_points = max_points
+        self.filters = filters
+        self._lock = threading.Lock()
+        self._building = {}  # {timestamp: Lock}
+        self._indices = OrderedDict()  # {索引路径: (mtime, index)}, 最近查看的采集
+
+    def index(self, capture_dir, timestamp):
+        index_path, _ = octree_paths(capture_dir, timestamp)
+        if not os.path.exists(index_path):
+            with self._lock:
+                building = self._building.setdefault(str(timestamp), threading.Lock())
+            with building:
+                if not os.path.exists(index_path):
+                    t_start = time.time()
+                    points, rgb = load_capture_points(capture_dir, timestamp, self.filters)
+                    index = save_octree(capture_dir, timestamp, points, rgb, self.max_points)
+                    debug_log(f"八叉树构建完成[{timestamp}]，{index['point_count']} 点 "
+                              f"{len(index['nodes'])} 个节点，用时 {time.time() - t_start:.3f} 秒")
+            with self._lock:
+                self._building.pop(str(timestamp), None)
+        mtime = os.stat(index_path).st_mtime_ns
+        with self._lock:
+            cached = self._indices.get(index_path)
+            if cached is not None and cached[0] == mtime:
+                self._indices.move_to_end(index_path)
+                return cached[1]
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        with self._lock:
+            self._indices[index_path] = (mtime, index)
+            while len(self._indices) > INDEX_CACHE_SIZE:
+                self._indices.popitem(last=False)
+        return index
+
+    def tile(self, capture_dir, timestamp, node_id):
+        '''
+        返回 (节点数据 bytes, 节点信息), 节点不存在时返回 (None, None); 还没有八叉树时先构建
+        '''
+        index = self.index(capture_dir, timestamp)
+        node = index["nodes"].get(node_id)
+        if node is None:
+            return None, None
+        _, data_path = octree_paths(capture_dir, timestamp)
+        with open(data_path, "rb") as f:
+            f.seek(node["offset"])
+            return f.read(node["length"]), node
+
+
+def pack_tile(node, payload):
+    '''
+    单独请求节点时在数据前加 24 字节头, 客户端不必先拿索引也能解码:
+    4s magic b"OCT1", u32 count, f32 min[3], f32 size
+    '''
+    return TILE_HEADER.pack(TILE_MAGIC, node["count"], *node["min"], node["size"]) + payload
+
+
+octree_store = None
+
+
+def get_octree_store():
+    global octree_store
+    if octree_store is None:
+        from config import OCTREE_MAX_POINTS
+        from modules.point_cloud_filter import filter_profile
+        octree_store = OctreeStore(OCTREE_MAX_POINTS, filter_profile("capture"))
+    return octree_store
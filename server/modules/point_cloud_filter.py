@@ -0,0 +1,131 @@
+import numpy as np
+
+'''
+点云滤波(纯 NumPy), 各消费者按 config.POINT_FILTERS 中自己的配置启用:
+  stream  实时推流(/ws/depth)
+  capture 保存(/capture 的 PLY/PCD/八叉树, NPY 始终保存原始深度)
+  offline 离线脚本(script/merge.py)
+
+离群点: 在有序深度图上做, 反投影之前把孤立像素(飞点)置 0;
+        3x3 邻域内与中心深度差不超过 max(min_diff, tolerance * 深度) 的有效邻居少于 min_neighbors 即为离群;
+        图像边缘像素的邻居不足 8 个, 阈值按实际邻居数等比例降低
+体素降采样: 点坐标按 voxel_size 取整后编码为一个整数键, 排序分组, 同一体素内的坐标和颜色取平均
+'''
+
+DEFAULT_PROFILE = {"min_neighbors": 0, "tolerance": 0.02, "min_diff": 10, "voxel_size": 0.0}
+NEIGHBOR_OFFSETS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def filter_profile(name):
+    '''
+    取某个消费者的滤波配置, 缺省项用 DEFAULT_PROFILE 补全
+    '''
+    from config import POINT_FILTERS
+    return dict(DEFAULT_PROFILE, **POINT_FILTERS.get(name, {}))
+
+
+def is_enabled(profile):
+    return bool(profile["min_neighbors"]) or profile["voxel_size"] > 0
+
+
+def remove_depth_outliers(depth_image, min_neighbors, tolerance=0.02, min_diff=10):
+    '''
+    返回新的深度图(uint16), 离群像素置 0; min_neighbors 为 0 时原样返回
+    tolerance 为相对深度的比例, min_diff 为最小容差(毫米)
+    '''
+    if not min_neighbors:
+        return depth_image
+    depth = depth_image.astype(np.int32)
+    height, width = depth.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.int32)
+    padded[1:-1, 1:-1] = depth
+    limit = np.maximum(min_diff, (depth * tolerance).astype(np.int32))
+    count = np.zeros((height, width), dtype=np.uint8)
+    diff = np.empty((height, width), dtype=np.int32)
+    for dy, dx in NEIGHBOR_OFFSETS:
+        neighbor = padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+        np.subtract(depth, neighbor, out=diff)
+        np.abs(diff, out=diff)
+        # 无效邻居(0)与中心差值等于中心深度, 远大于容差, 不会被计入
+        count += (diff <= limit) & (neighbor > 0)
+    result = depth_image.copy()
+    result[count < _neighbor_threshold(height, width, min_neighbors)] = 0
+    return result
+
+
+def _neighbor_threshold(height, width, min_neighbors):
+    '''
+    每个像素需要的最少邻居数: 内部为 min_neighbors, 边缘(5 个邻居)和角点(3 个邻居)按比例向上取整
+    '''
+    rows = np.full(height, 3, dtype=np.int32)
+    cols = np.full(width, 3, dtype=np.int32)
+    rows[[0, -1]] -= 1
+    cols[[0, -1]] -= 1
+    if height == 1:
+        rows[0] = 1
+    if width == 1:
+        cols[0] = 1
+    available = rows[:, None] * cols[None, :] - 1
+    return ((min_neighbors * available + 7) // 8).astype(np.uint8)
+
+
+def voxel_groups(points, voxel_size):
+    '''
+    返回 (inverse, counts): 每个点所属体素的编号, 以及每个体素的点数
+    '''
+    # 按列计算: (N, 3) 数组沿 axis=0 的 min/max 比逐列慢得多
+    scale = np.float32(1.0 / voxel_size)
+    flat = None
+    size = 1
+    for axis in range(3):
+        column = np.floor(points[:, axis] * scale).astype(np.int64)
+        column -= column.min()
+        flat = column if flat is None else flat + column * size
+        size *= int(column.max()) + 1
+    if size < 2 ** 31:
+        flat = flat.astype(np.int32)  # 排序 int32 比 int64 快
+    # 等价于 np.unique(return_inverse, return_counts), 但不做稳定排序, 快约一倍
+    order = np.argsort(flat)
+    sorted_keys = flat[order]
+    first = np.empty(sorted_keys.shape[0], dtype=bool)
+    first[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=first[1:])
+    group = np.cumsum(first) - 1
+    inverse = np.empty_like(group)
+    inverse[order] = group
+    counts = np.diff(np.append(np.flatnonzero(first), sorted_keys.shape[0]))
+    return inverse, counts
+
+
+def group_mean(values, inverse, counts):
+    '''
+    按 voxel_groups 的分组对 (N, C) 数组求平均, 保持原 dtype(整数四舍五入)
+    '''
+    out = np.empty((counts.shape[0], values.shape[1]), dtype=np.float64)
+    for c in range(values.shape[1]):
+        out[:, c] = np.bincount(inverse, weights=values[:, c], minlength=counts.shape[0])
+    out /= counts[:, None]
+    if np.issubdtype(values.dtype, np.integer):
+        np.rint(out, out=out)
+    return out.astype(values.dtype)
+
+
+def voxel_downsample(points, colors=None, voxel_size=0.005):
+    '''
+    体素降采样, 返回 (points, colors); voxel_size 为米, 不大于 0 时原样返回
+    '''
+    if voxel_size <= 0 or points.shape[0] == 0:
+        return points, colors
+    inverse, counts = voxel_groups(points, voxel_size)
+    points = group_mean(points, inverse, counts)
+    if colors is not None:
+        colors = group_mean(colors, inverse, counts)
+    return points, colors
+
+
+def filter_depth(depth_image, profile):
+    return remove_depth_outliers(depth_image, profile["min_neighbors"], profile["tolerance"], profile["min_diff"])
+
+
+def filter_points(points, colors, profile):
+    return voxel_downsample(points, colors, profile["voxel_size"])
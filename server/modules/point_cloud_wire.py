@@ -0,0 +1,214 @@
+import math
+import struct
+import zlib
+import numpy as np
+
+'''
+/ws/depth 点云传输格式
+f32:   旧格式, 无头部, 直接发送 float32 xyz (N*12 字节)
+q16:   16字节头 + int16 xyz(毫米), 可选 deflate(zlib) 压缩
+delta: 关键帧发送整张(抽样后的)深度图, 之后只发送变化超过阈值的深度像素, 客户端自行反投影
+
+公共头部(小端, 16字节):
+  0  2s  magic b"PC"
+  2  u8  version = 1
+  3  u8  flags   bit0: 载荷经过 zlib 压缩; bit1-2: 消息类型(0 点云, 1 深度关键帧, 2 深度增量)
+  4  u32 seq     帧序号(frame_bus)
+  8  u32 count   点数 / 关键帧像素数 / 增量中变化的像素数
+  12 f32 scale   每个整数单位对应的米数(0.001)
+
+深度关键帧在公共头部后追加: u16 width, u16 height, f32 fx, f32 fy, f32 cx, f32 cy
+  载荷: uint16 深度(毫米) width*height
+深度增量在公共头部后追加: u32 base_seq(基于哪一帧), u32 run_count
+  载荷: u32 starts[run_count], u32 lengths[run_count], uint16 values[count]
+  客户端发现 base_seq 与自己最后应用的帧不一致时发送文本 "resync", 服务端下一帧发送关键帧
+'''
+
+WIRE_FORMATS = ("f32", "q16", "delta")
+COMPRESSIONS = ("none", "deflate")
+MAGIC = b"PC"
+VERSION = 1
+FLAG_DEFLATE = 0x01
+KIND_POINTS, KIND_KEYFRAME, KIND_DELTA = 0, 1, 2
+KIND_SHIFT = 1
+HEADER = struct.Struct("<2sBBIIf")
+KEYFRAME_HEADER = struct.Struct("<HHffff")
+DELTA_HEADER = struct.Struct("<II")
+Q16_SCALE = 0.001  # 毫米
+DEFLATE_LEVEL = 1  # 只追求速度
+
+
+def decimation_step(valid_count, max_points):
+    '''
+    按点数预算计算深度图的行列抽样步长, 在反投影之前抽样, 省掉多余的计算
+    '''
+    if not max_points or valid_count <= max_points:
+        return 1
+    return int(math.ceil(math.sqrt(valid_count / max_points)))
+
+
+def limit_points(points, max_points):
+    # 步长抽样后仍超预算时, 再按固定间隔取点
+    if max_points and points.shape[0] > max_points:
+        stride = int(math.ceil(points.shape[0] / max_points))
+        points = points[::stride]
+    return points
+
+
+def quantize_points(points, scale=Q16_SCALE):
+    scaled = np.multiply(points, np.float32(1.0 / scale), dtype=np.float32)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype("<i2")
+
+
+def encode_points(points, seq, fmt="q16", compress="none"):
+    if fmt == "f32":
+        return np.ascontiguousarray(points, dtype="<f4").tobytes()
+    payload = quantize_points(points).tobytes()
+    flags = 0
+    if compress == "deflate":
+        payload = zlib.compress(payload, DEFLATE_LEVEL)
+        flags |= FLAG_DEFLATE
+    return HEADER.pack(MAGIC, VERSION, flags, seq & 0xFFFFFFFF, points.shape[0], Q16_SCALE) + payload
+
+
+def _pack(kind, seq, count, extra, payload, compress):
+    flags = kind << KIND_SHIFT
+    if compress == "deflate":
+        payload = zlib.compress(payload, DEFLATE_LEVEL)
+        flags |= FLAG_DEFLATE
+    return HEADER.pack(MAGIC, VERSION, flags, seq & 0xFFFFFFFF, count, Q16_SCALE) + extra + payload
+
+
+def changed_runs(mask):
+    '''
+    把一维布尔掩码中连续为 True 的区间编码为 (starts, lengths)
+    '''
+    idx = np.flatnonzero(mask)
+    if idx.shape[0] == 0:
+        empty = np.empty(0, dtype="<u4")
+        return idx, empty, empty
+    breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+    starts = np.concatenate(([idx[0]], idx[breaks])).astype("<u4")
+    ends = np.concatenate((idx[breaks - 1], [idx[-1]])) + 1
+    return idx, starts, (ends - starts).astype("<u4")
+
+
+class DepthDeltaEncoder:
+    '''
+    每个连接一个实例, 记录客户端当前持有的深度图
+    关键帧: 首帧、每 keyframe_interval 帧或客户端请求 resync 时
+    增量: 与参考图相差超过 threshold 毫米(或有效性变化)的像素, 按连续区间编码
+    '''
+
+    def __init__(self, fx, fy, threshold=10, keyframe_interval=30, compress="none"):
+        self.fx = fx
+        self.fy = fy
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.compress = compress
+        self._reference = None
+        self._step = None
+        self._last_seq = 0
+        self._since_keyframe = 0
+        self.resync_requested = False
+
+    def request_resync(self):
+        self.resync_requested = True
+
+    def encode(self, depth_image, seq, max_points=0):
+        height, width = depth_image.shape
+        need_keyframe = (self._reference is None or self.resync_requested
+                         or self._since_keyframe >= self.keyframe_interval)
+        # 抽样步长只在关键帧时确定, 两个关键帧之间保持网格不变
+        step = decimation_step(np.count_nonzero(depth_image), max_points) if need_keyframe else self._step
+        grid = np.ascontiguousarray(depth_image[::step, ::step], dtype="<u2")
+        if need_keyframe:
+            message = self._keyframe(grid, seq, step, width, height)
+        else:
+            message = self._delta(grid, seq)
+        self._last_seq = seq
+        return message
+
+    def _keyframe(self, grid, seq, step, width, height):
+        self._reference = grid.copy()
+        self._step = step
+        self._since_keyframe = 0
+        self.resync_requested = False
+        h, w = grid.shape
+        # 抽样后像素 u' 对应原图 u = u' * step, 内参随之缩放
+        extra = KEYFRAME_HEADER.pack(w, h, self.fx / step, self.fy / step, width / 2.0 / step, height / 2.0 / step)
+        return _pack(KIND_KEYFRAME, seq, grid.size, extra, grid.tobytes(), self.compress)
+
+    def _delta(self, grid, seq):
+        self._since_keyframe += 1
+        ref = self._reference.reshape(-1)
+        cur = grid.reshape(-1)
+        diff = np.abs(cur.astype(np.int32) - ref)
+        mask = (diff > self.threshold) | ((cur == 0) != (ref == 0))
+        idx, starts, lengths = changed_runs(mask)
+        values = cur[idx]
+        ref[idx] = values  # 参考图与客户端保持一致
+        extra = DELTA_HEADER.pack(self._last_seq & 0xFFFFFFFF, starts.shape[0])
+        payload = starts.tobytes() + lengths.tobytes() + values.astype("<u2").tobytes()
+        return _pack(KIND_DELTA, seq, idx.shape[0], extra, payload, self.compress)
+
+
+class DepthDeltaDecoder:
+    '''
+    Python 端解码器, 与前端 DepthViewer/decode.ts 逻辑一致, 供调试和脚本使用
+    '''
+
+    def __init__(self):
+        self.depth = None
+        self.intrinsics = None
+        self.seq = 0
+
+    def apply(self, message):
+        '''
+        应用一条消息, 返回 True; 增量的 base_seq 对不上时返回 False, 需要发送 resync
+        '''
+        magic, version, flags, seq, count, scale = HEADER.unpack_from(message)
+        kind = (flags >> KIND_SHIFT) & 0x03
+        if kind == KIND_KEYFRAME:
+            w, h, fx, fy, cx, cy = KEYFRAME_HEADER.unpack_from(message, HEADER.size)
+            payload = message[HEADER.size + KEYFRAME_HEADER.size:]
+            if flags & FLAG_DEFLATE:
+                payload = zlib.decompress(payload)
+            self.depth = np.frombuffer(payload, dtype="<u2").reshape(h, w).copy()
+            self.intrinsics = (fx, fy, cx, cy)
+            self.seq = seq
+            return True
+        if kind != KIND_DELTA:
+            raise ValueError("不是深度关键帧/增量消息")
+        base_seq, run_count = DELTA_HEADER.unpack_from(message, HEADER.size)
+        if self.depth is None or base_seq != self.seq:
+            return False
+        payload = message[HEADER.size + DELTA_HEADER.size:]
+        if flags & FLAG_DEFLATE:
+            payload = zlib.decompress(payload)
+        starts = np.frombuffer(payload, dtype="<u4", count=run_count)
+        lengths = np.frombuffer(payload, dtype="<u4", count=run_count, offset=4 * run_count)
+        values = np.frombuffer(payload, dtype="<u2", count=count, offset=8 * run_count)
+        flat = self.depth.reshape(-1)
+        offset = 0
+        for start, length in zip(starts.tolist(), lengths.tolist()):
+            flat[start:start + length] = values[offset:offset + length]
+            offset += length
+        self.seq = seq
+        return True
+
+
+def decode_points(message):
+    '''
+    解码 q16 消息, 返回 (seq, float32 xyz), 供调试和脚本使用
+    '''
+    magic, version, flags, seq, count, scale = HEADER.unpack_from(message)
+    if magic != MAGIC:
+        raise ValueError("不是q16点云消息")
+    payload = message[HEADER.size:]
+    if flags & FLAG_DEFLATE:
+        payload = zlib.decompress(payload)
+    q = np.frombuffer(payload, dtype="<i2").reshape(count, 3)
+    return seq, q.astype(np.float32) * np.float32(scale)
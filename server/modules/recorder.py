@@ -0,0 +1,252 @@
+import time
+import threading
+from collections import deque
+import cv2
+
+from modules.log import log as debug_log
+from modules.frame_bus import FramePacket
+from modules.metrics import RECORDING_ENCODE_SECONDS, RECORDING_LAG_SECONDS, RECORDING_QUEUE, RECORDING_DROPPED
+
+'''
+录制编码器
+采集线程只调用 offer: 按时间戳挑帧后放入有上限的环形缓冲区, 不做任何编码, 不会被慢编码拖住
+独立的编码线程从缓冲区取帧交给输出端(sink)写入: 彩色 MP4 或无损深度录制(modules/depth_recording)
+缓冲区满时的策略:
+  drop_oldest(彩色): 丢弃最旧的帧并计数
+  fail(无损深度): 缓冲区按字节计上限, 只保留深度图; 仍然溢出时停止录制并记录错误, 丢帧数写入输出端(.kdepth 文件头)
+挑帧规则: 按设备时间戳(没有时用主机时间)为输出帧率划分时间槽, 一帧覆盖几个槽就写几次,
+相机掉帧时重复上一帧补齐, 保证视频时长与实际时长一致; fps 为 None 时保留每一帧
+'''
+
+WAIT_TIMEOUT = 0.5  # 编码线程等待新帧的超时
+MAX_REPEAT_SECONDS = 1.0  # 相机长时间无帧时最多补多少秒的重复帧
+OVERFLOW_POLICIES = ("drop_oldest", "fail")
+
+
+class DepthOnlyFrame:
+    __slots__ = ("color", "depth")
+
+    def __init__(self, depth):
+        self.color = None
+        self.depth = depth
+
+
+def depth_only(packet):
+    # 缓冲区中只保留深度图, 不让排队的帧拖住整张彩色图
+    return FramePacket(packet.seq, DepthOnlyFrame(packet.frame.depth), packet.device_timestamp_usec, packet.host_time)
+
+
+def packet_nbytes(packet):
+    frame = packet.frame
+    return sum(image.nbytes for image in (frame.color, frame.depth) if image is not None)
+
+
+class ColorVideoSink:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write_packet(self, packet, repeat=1):
+        bgr_image = cv2.cvtColor(packet.frame.color, cv2.COLOR_BGRA2BGR)
+        for _ in range(repeat):
+            self.writer.write(bgr_image)
+
+    def release(self):
+        self.writer.release()
+
+
+class VideoRecorder:
+    def __init__(self, kind="color", overflow="drop_oldest", prepare=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的溢出策略: {overflow}")
+        self.kind = kind  # 指标标签
+        self.overflow = overflow
+        self.prepare = prepare  # 入队前转换帧, 如只保留深度图
+        self._cond = threading.Condition()
+        self._queue = None
+        self._thread = None
+        self._writer = None
+        self.recording = False
+        self.path = None
+        self.fps = None
+        self._interval_usec = None
+        self._next_due = None
+        self._max_frames = None
+        self._max_bytes = None
+        self._queued_bytes = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.started_at = None
+        self.stopped_at = None
+        self.selected = 0  # 选入缓冲区的帧
+        self.written = 0  # 写入文件的帧(含重复帧)
+        self.repeated = 0  # 为补齐时间槽重复写入的帧
+        self.dropped = 0  # 缓冲区满被丢弃的帧
+        self.error = None  # fail 策略下溢出等导致录制中止的原因
+        self.encode_total = 0.0
+        self.encode_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.encoded = 0
+
+    def start(self, writer, path, fps, queue_size=None, max_bytes=None):
+        '''
+        writer 为输出端, 需要实现 write_packet(packet, repeat) 和 release(), 可选 set_dropped(dropped, error)
+        queue_size 为缓冲区帧数上限, max_bytes 为字节上限, 都为 None 时不限
+        '''
+        if not self.recording and self._thread is not None:
+            self.stop()  # 上一次录制已中止, 等编码线程写完
+        with self._cond:
+            if self.recording:
+                return False
+            self._writer = writer
+            self.path = path
+            self.fps = fps
+            self._interval_usec = 1_000_000.0 / fps if fps else None
+            self._next_due = None
+            self._queue = deque()
+            self._max_frames = max(1, queue_size) if queue_size else None
+            self._max_bytes = max_bytes
+            self._queued_bytes = 0
+            self._reset_stats()
+            self.started_at = time.time()
+            self.recording = True
+            self._thread = threading.Thread(target=self._encode_loop, name=f"recorder-{self.kind}", daemon=True)
+            self._thread.start()
+        limit = f"{queue_size} 帧" if queue_size else f"{(max_bytes or 0) / 1024 / 1024:.0f}MB"
+        debug_log(f"开始录制 {path}，输出帧率 {fps}，缓冲区 {limit}，溢出策略 {self.overflow}")
+        return True
+
+    @property
+    def active(self):
+        '''正在录制, 或已中止但还没有 stop(编码线程未回收)'''
+        return self.recording or self._thread is not None
+
+    def offer(self, packet):
+        '''
+        采集线程调用, 只做挑帧和入队
+        '''
+        if not self.recording:
+            return
+        ts = packet.device_timestamp_usec
+        if ts is None:
+            ts = packet.host_time * 1_000_000
+        with self._cond:
+            if not self.recording:
+                return
+            repeat = 1
+            if self._interval_usec is not None:
+                if self._next_due is None:
+                    self._next_due = ts
+                if ts < self._next_due:
+                    return  # 还没到下一个输出时间槽
+                slots = int((ts - self._next_due) // self._interval_usec) + 1
+                self._next_due += slots * self._interval_usec
+                repeat = min(slots, max(1, int(self.fps * MAX_REPEAT_SECONDS)))
+            if self.prepare is not None:
+                packet = self.prepare(packet)
+            size = packet_nbytes(packet)
+            while self._queue and self._overflows(size):
+                self.dropped += 1
+                RECORDING_DROPPED.inc(kind=self.kind)
+                if self.overflow == "fail":
+                    # 无损录制不能悄悄跳帧: 停止录制, 已入队的帧照常写完
+                    self.error = f"录制缓冲区溢出, 已停止录制(丢弃 {self.dropped} 帧)"
+                    self.recording = False
+                    self.stopped_at = time.time()
+                    self._cond.notify_all()
+                    debug_log(f"[错误] {self.path}: {self.error}")
+                    return
+                _, _, old_size = self._queue.popleft()
+                self._queued_bytes -= old_size
+            self._queue.append((packet, repeat, size))
+            self._queued_bytes += size
+            self.selected += 1
+            self._cond.notify()
+
+    def _overflows(self, size):
+        if self._max_frames is not None and len(self._queue) >= self._max_frames:
+            return True
+        return self._max_bytes is not None and self._queued_bytes + size > self._max_bytes
+
+    def _encode_loop(self):
+        while True:
+            with self._cond:
+                if not self._queue:
+                    if not self.recording:
+                        break  # 停止后把缓冲区写完再退出
+                    self._cond.wait(WAIT_TIMEOUT)
+                    continue
+                packet, repeat, size = self._queue.popleft()
+                self._queued_bytes -= size
+                writer = self._writer
+            t_start = time.time()
+            try:
+                writer.write_packet(packet, repeat)
+            except Exception as e:
+                debug_log(f"录制编码失败: {e}")
+                continue
+            t_end = time.time()
+            encode = t_end - t_start
+            latency = t_end - packet.host_time
+            RECORDING_ENCODE_SECONDS.observe(encode, kind=self.kind)
+            RECORDING_LAG_SECONDS.observe(latency, kind=self.kind)
+            with self._cond:
+                self.encoded += 1
+                self.written += repeat
+                self.repeated += repeat - 1
+                self.encode_total += encode
+                self.encode_max = max(self.encode_max, encode)
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+        if self._writer is not None:
+            if hasattr(self._writer, "set_dropped"):
+                self._writer.set_dropped(self.dropped, self.error)
+            self._writer.release()
+
+    def stop(self):
+        '''
+        停止录制, 等待缓冲区中的帧全部写入后释放文件, 返回文件路径
+        '''
+        with self._cond:
+            thread, path = self._thread, self.path
+            if thread is None:
+                return None
+            if self.recording:
+                self.recording = False
+                self.stopped_at = time.time()
+                self._cond.notify_all()
+            # 已因溢出中止时编码线程可能还在写剩余的帧, 同样等待
+        thread.join()
+        with self._cond:
+            self._thread = None
+        debug_log(f"录制结束 {path}，写入 {self.written} 帧，丢弃 {self.dropped} 帧")
+        return path
+
+    def status(self):
+        with self._cond:
+            encoded = self.encoded
+            status = {
+                "recording": self.recording,
+                "path": self.path,
+                "fps": self.fps,
+                "duration": round((self.stopped_at or time.time()) - self.started_at, 2) if self.started_at else 0,
+                "selected": self.selected,
+                "written": self.written,
+                "repeated": self.repeated,
+                "dropped": self.dropped,
+                "error": self.error,
+                "queued": len(self._queue) if self._queue is not None else 0,
+                "encode_ms_avg": round(self.encode_total / encoded * 1000, 2) if encoded else None,
+                "encode_ms_max": round(self.encode_max * 1000, 2),
+                "latency_ms_avg": round(self.latency_total / encoded * 1000, 2) if encoded else None,
+                "latency_ms_max": round(self.latency_max * 1000, 2),
+            }
+            if hasattr(self._writer, "stats"):
+                status.update(self._writer.stats())  # 输出端自己的统计, 如深度压缩率
+            return status
+
+
+recorder = VideoRecorder("color")  # 彩色 MP4
+depth_recorder = VideoRecorder("depth", overflow="fail", prepare=depth_only)  # 无损深度, 不允许丢帧
+RECORDING_QUEUE.set_function(lambda: {(r.kind,): r.status()["queued"] for r in (recorder, depth_recorder)})
@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from collections import deque
+import psutil
+
+from modules.log import log as debug_log
+
+'''
+后台资源采样
+固定间隔采集本进程 CPU/内存、各命名线程的 CPU(采集、JPEG编码、录制编码)、
+子进程(保存进程池、Node 静态服务)的 CPU/内存, 以及 OUTPUT_DIR 所在磁盘的写入速度, 存入环形缓冲区
+/resource 直接返回最新样本或时间序列, 不在请求里阻塞等待
+
+线程/子进程的 CPU 为单核百分比(100 表示占满一个核心), 进程整体另给出按核心数平均后的 cpu_percent
+'''
+
+
+def _disk_for_path(path):
+    '''
+    找到 path 所在分区对应的 disk_io_counters(perdisk=True) 键, 找不到时返回 None
+    '''
+    try:
+        path = os.path.realpath(path)
+        best = None
+        for part in psutil.disk_partitions(all=False):
+            mount = part.mountpoint
+            if path.startswith(mount) and (best is None or len(mount) > len(best.mountpoint)):
+                best = part
+        if best is None:
+            return None
+        name = os.path.basename(best.device)
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        return name if name in counters else None
+    except Exception:
+        return None
+
+
+class ResourceSampler:
+    def __init__(self, output_dir, interval=1.0, history=300):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process(os.getpid())
+        self._cpu_count = psutil.cpu_count(logical=True) or 1
+        self._disk = _disk_for_path(output_dir)
+        self._last_disk_bytes = None
+        self._last_io_bytes = None
+        self._last_thread_times = {}  # {native_id: cpu 秒}
+        self._children = {}  # {pid: psutil.Process}, 复用对象才能得到 cpu_percent 的增量
+        self._last_time = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._process.cpu_percent(None)  # 第一次调用只建立基准
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        debug_log(f"资源采样已启动，间隔 {self.interval} 秒，磁盘 {self._disk or '未识别'}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sample = self.sample()
+            except Exception as e:
+                debug_log(f"资源采样失败: {e}")
+                continue
+            with self._lock:
+                self._samples.append(sample)
+
+    def sample(self):
+        now = time.time()
+        elapsed = now - self._last_time if self._last_time else None
+        self._last_time = now
+        p = self._process
+        with p.oneshot():
+            cpu_percent = p.cpu_percent(None)
+            rss = p.memory_info().rss
+            thread_times = {t.id: t.user_time + t.system_time for t in p.threads()}
+            io_bytes = self._io_write_bytes(p)
+
+        sample = {
+            "time": round(now, 3),
+            "cpu_percent": round(cpu_percent / self._cpu_count, 2),  # 按核心数平均, 最大 100
+            "cpu_percent_raw": round(cpu_percent, 2),
+            "memory_mb": round(rss / 1024 / 1024, 2),
+            "threads": self._thread_cpu(thread_times, elapsed),
+            "children": self._children_usage(),
+        }
+        children_io = sum(c.pop("write_bytes", 0) for c in sample["children"])
+        sample["process_write_mbps"] = self._rate("_last_io_bytes", io_bytes + children_io, elapsed)
+        sample["disk_write_mbps"] = self._rate("_last_disk_bytes", self._disk_write_bytes(), elapsed)
+        try:
+            sample["disk_free_gb"] = round(psutil.disk_usage(self.output_dir).free / 1024 ** 3, 2)
+        except OSError:
+            sample["disk_free_gb"] = None
+        return sample
+
+    @staticmethod
+    def _io_write_bytes(p):
+        try:
+            return p.io_counters().write_bytes
+        except (AttributeError, psutil.Error):
+            return 0  # macOS 等平台没有进程 IO 计数
+
+    def _disk_write_bytes(self):
+        if self._disk is None:
+            return None
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        disk = counters.get(self._disk)
+        return None if disk is None else disk.write_bytes
+
+    def _rate(self, attr, value, elapsed):
+        last = getattr(self, attr)
+        setattr(self, attr, value)
+        if value is None or last is None or not elapsed:
+            return None
+        return round(max(0, value - last) / elapsed / 1024 / 1024, 3)
+
+    def _thread_cpu(self, thread_times, elapsed):
+        '''
+        命名线程按名称汇总(同名前缀如 jpeg-* 各自列出), 其余线程合并为 other
+        '''
+        names = {t.native_id: t.name for t in threading.enumerate() if t.native_id is not None}
+        usage = {}
+        for tid, cpu in thread_times.items():
+            last = self._last_thread_times.get(tid)
+            if last is None or not elapsed:
+                continue
+            name = names.get(tid, "other")
+            if name.startswith(("Thread-", "AnyIO", "ThreadPoolExecutor")):
+                name = "other"  # 未命名线程和线程池合并统计
+            usage[name] = usage.get(name, 0.0) + (cpu - last) / elapsed * 100
+        self._last_thread_times = thread_times
+        return {name: round(value, 2) for name, value in sorted(usage.items())}
+
+    def _children_usage(self):
+        from modules.save_pipeline import get_save_pipeline
+        worker_pids = get_save_pipeline().worker_pids()
+        result = []
+        current = {}
+        for child in self._process.children(recursive=True):
+            child = self._children.get(child.pid, child)
+            current[child.pid] = child
+            try:
+                with child.oneshot():
+                    result.append({
+                        "pid": child.pid,
+                        "role": "save_worker" if child.pid in worker_pids else self._child_role(child),
+                        "cpu_percent": round(child.cpu_percent(None), 2),  # 新子进程第一次为 0
+                        "memory_mb": round(child.memory_info().rss / 1024 / 1024, 2),
+                        "write_bytes": self._io_write_bytes(child),
+                    })
+            except psutil.Error:
+                current.pop(child.pid, None)  # 子进程已退出
+        self._children = current
+        return result
+
+    @staticmethod
+    def _child_role(child):
+        if "resource_tracker" in " ".join(child.cmdline()):
+            return "resource_tracker"
+        return child.name()
+
+    def latest(self):
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, count=None):
+        with self._lock:
+            samples = list(self._samples)
+        return samples[-count:] if count else samples
+
+
+resource_sampler = None
+
+
+def get_resource_sampler():
+    global resource_sampler
+    if resource_sampler is None:
+        from config import OUTPUT_DIR, RESOURCE_SAMPLE_INTERVAL, RESOURCE_HISTORY
+        resource_sampler = ResourceSampler(OUTPUT_DIR, RESOURCE_SAMPLE_INTERVAL, RESOURCE_HISTORY)
+    return resource_sampler
@@ -1,14 +1,99 @@
-def save_point_cloud_json(points, colors):
-    data = []
-    for i in range(points.shape[0]):
-        x, y, z = points[i]
-        r, g, b = colors[i]
-        data.append({
-            "x": float(x),
-            "y": float(y),
-            "z": float(z),
-            "r": int(r),
-            "g": int(g),
-            "b": int(b)
-        })
-    return data
+import math
+import numpy as np
+
+'''
+点云JSON流式导出
+columnar(默认): {"layout": "columnar", "count": N, "x": [...], "y": [...], "z": [...], "r": [...], "g": [...], "b": [...]}
+rows(旧版):     [{"x": .., "y": .., "z": .., "r": .., "g": .., "b": ..}, ...]
+按固定块大小直接从NumPy数组格式化写出, 内存占用只与块大小有关
+坐标含 NaN/inf 的点不写出(nan/inf 不是合法 JSON)
+'''
+
+JSON_LAYOUTS = ("columnar", "rows")
+CHUNK_SIZE = 65536  # 每次格式化的点数
+FLOAT_DECIMALS = 6  # 坐标单位为米, 保留到微米
+
+
+def _format_floats(values):
+    values = np.round(values.astype(np.float64), FLOAT_DECIMALS)
+    if np.isfinite(values).all():
+        return ",".join(map(repr, values.tolist()))
+    # 不能丢弃的值(如网格顶点, 面片按下标引用)写为 null
+    return ",".join(repr(v) if math.isfinite(v) else "null" for v in values.tolist())
+
+
+def _format_ints(values):
+    return ",".join(map(str, values.tolist()))
+
+
+def _iter_chunks(parts, chunk_size):
+    for points, colors in parts:
+        for start in range(0, points.shape[0], chunk_size):
+            yield points[start:start + chunk_size], colors[start:start + chunk_size]
+
+
+def _write_columnar(f, parts, chunk_size):
+    count = sum(points.shape[0] for points, _ in parts)
+    f.write(f'{{"layout": "columnar", "count": {count}')
+    columns = [("x", 0, True), ("y", 1, True), ("z", 2, True),
+               ("r", 0, False), ("g", 1, False), ("b", 2, False)]
+    for name, index, is_point in columns:
+        f.write(f', "{name}": [')
+        first = True
+        for points, colors in _iter_chunks(parts, chunk_size):
+            if points.shape[0] == 0:
+                continue
+            if not first:
+                f.write(",")
+            first = False
+            if is_point:
+                f.write(_format_floats(points[:, index]))
+            else:
+                f.write(_format_ints(colors[:, index]))
+        f.write("]")
+    f.write("}")
+
+
+def _write_rows(f, parts, chunk_size):
+    f.write("[")
+    first = True
+    for points, colors in _iter_chunks(parts, chunk_size):
+        if points.shape[0] == 0:
+            continue
+        xyz = np.round(points[:, :3].astype(np.float64), FLOAT_DECIMALS).tolist()
+        rgb = colors[:, :3].tolist()
+        rows = ",".join(
+            f'{{"x": {p[0]!r}, "y": {p[1]!r}, "z": {p[2]!r}, "r": {c[0]}, "g": {c[1]}, "b": {c[2]}}}'
+            for p, c in zip(xyz, rgb))
+        if not first:
+            f.write(",")
+        first = False
+        f.write(rows)
+    f.write("]")
+
+
+def _finite_points(points, colors):
+    valid = np.isfinite(points[:, :3]).all(axis=1)
+    if valid.all():
+        return points, colors
+    return points[valid], colors[valid]
+
+
+def write_point_cloud_json(f, parts, layout="columnar", chunk_size=CHUNK_SIZE):
+    '''
+    f: 文本模式打开的文件对象
+    parts: [(points, colors), ...], 多个点云按顺序合并写入同一个JSON
+    '''
+    if layout not in JSON_LAYOUTS:
+        raise ValueError(f"不支持的JSON布局: {layout}")
+    parts = [_finite_points(points, colors) for points, colors in parts]
+    if layout == "columnar":
+        _write_columnar(f, parts, chunk_size)
+    else:
+        _write_rows(f, parts, chunk_size)
+
+
+def save_point_cloud_json(filename, points, colors, layout="columnar", chunk_size=CHUNK_SIZE):
+    with open(filename, "w") as f:
+        write_point_cloud_json(f, [(points, colors)], layout, chunk_size)
+    return filename
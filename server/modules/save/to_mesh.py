@@ -0,0 +1,128 @@
+import json
+import struct
+import numpy as np
+
+from modules.save.to_json import _format_floats, _format_ints
+
+'''
+三角网格导出(script/merge.py 使用)
+ply:  binary_little_endian, 顶点 xyz + 法向量 + RGB, 面为 uchar 计数 + int 索引
+glb:  glTF 2.0 二进制, POSITION / NORMAL / COLOR_0(RGBA uint8 归一化) + uint32 索引, 可直接拖进 three.js / Blender
+json: 列式 {"layout": "columnar", "vertex_count", "face_count", "x".., "nx".., "r".., "faces": [i0, i1, i2, ...]}
+vertices/normals 为 (N, 3) float, colors 为 (N, 3) uint8 RGB, faces 为 (M, 3) 整数
+'''
+
+MESH_FORMATS = ("ply", "glb", "json")
+MESH_SUFFIX = "_mesh"  # 输出为 {timestamp}_mesh.{格式}, convert_to_json.py 据此排除
+
+PLY_MESH_VERTEX_DTYPE = np.dtype([
+    ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+    ("nx", "<f4"), ("ny", "<f4"), ("nz", "<f4"),
+    ("red", "u1"), ("green", "u1"), ("blue", "u1"),
+])
+PLY_FACE_DTYPE = np.dtype([("count", "u1"), ("indices", "<i4", (3,))])
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+GL_FLOAT, GL_UNSIGNED_BYTE, GL_UNSIGNED_INT = 5126, 5121, 5125
+GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+
+def save_mesh_ply(filename, vertices, normals, colors, faces):
+    vertex_data = np.empty(vertices.shape[0], dtype=PLY_MESH_VERTEX_DTYPE)
+    for i, name in enumerate(("x", "y", "z")):
+        vertex_data[name] = vertices[:, i]
+    for i, name in enumerate(("nx", "ny", "nz")):
+        vertex_data[name] = normals[:, i]
+    for i, name in enumerate(("red", "green", "blue")):
+        vertex_data[name] = colors[:, i]
+    face_data = np.empty(faces.shape[0], dtype=PLY_FACE_DTYPE)
+    face_data["count"] = 3
+    face_data["indices"] = faces
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {vertices.shape[0]}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        "property float nx\nproperty float ny\nproperty float nz\n"
+        "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+        f"element face {faces.shape[0]}\n"
+        "property list uchar int vertex_indices\n"
+        "end_header\n"
+    )
+    with open(filename, "wb") as f:
+        f.write(header.encode("ascii"))
+        vertex_data.tofile(f)
+        face_data.tofile(f)
+    return filename
+
+
+def _pad4(data, fill=b"\x00"):
+    return data + fill * (-len(data) % 4)
+
+
+def save_mesh_glb(filename, vertices, normals, colors, faces):
+    vertices = np.ascontiguousarray(vertices, dtype="<f4")
+    normals = np.ascontiguousarray(normals, dtype="<f4")
+    rgba = np.full((colors.shape[0], 4), 255, dtype=np.uint8)  # 顶点属性需 4 字节对齐, 用 RGBA
+    rgba[:, :3] = colors
+    indices = np.ascontiguousarray(faces, dtype="<u4").ravel()
+
+    # 各 bufferView 依次排列, 长度都是 4 的倍数
+    blobs = [vertices.tobytes(), normals.tobytes(), rgba.tobytes(), indices.tobytes()]
+    views, offset = [], 0
+    for blob, target in zip(blobs, (GL_ARRAY_BUFFER,) * 3 + (GL_ELEMENT_ARRAY_BUFFER,)):
+        views.append({"buffer": 0, "byteOffset": offset, "byteLength": len(blob), "target": target})
+        offset += len(blob)
+    count = int(vertices.shape[0])
+    accessors = [
+        {"bufferView": 0, "componentType": GL_FLOAT, "count": count, "type": "VEC3",
+         "min": vertices.min(axis=0).tolist() if count else [0, 0, 0],
+         "max": vertices.max(axis=0).tolist() if count else [0, 0, 0]},
+        {"bufferView": 1, "componentType": GL_FLOAT, "count": count, "type": "VEC3"},
+        {"bufferView": 2, "componentType": GL_UNSIGNED_BYTE, "normalized": True, "count": count, "type": "VEC4"},
+        {"bufferView": 3, "componentType": GL_UNSIGNED_INT, "count": int(indices.shape[0]), "type": "SCALAR"},
+    ]
+    gltf = {
+        "asset": {"version": "2.0", "generator": "py_azure_kinect_viewer merge.py"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1, "COLOR_0": 2},
+                                    "indices": 3, "mode": 4}]}],
+        "buffers": [{"byteLength": offset}],
+        "bufferViews": views,
+        "accessors": accessors,
+    }
+    json_chunk = _pad4(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+    total = 12 + 8 + len(json_chunk) + 8 + offset
+    with open(filename, "wb") as f:
+        f.write(struct.pack("<III", GLB_MAGIC, 2, total))
+        f.write(struct.pack("<II", len(json_chunk), GLB_CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack("<II", offset, GLB_CHUNK_BIN))
+        for blob in blobs:
+            f.write(blob)
+    return filename
+
+
+def save_mesh_json(filename, vertices, normals, colors, faces):
+    with open(filename, "w") as f:
+        f.write(f'{{"layout": "columnar", "vertex_count": {vertices.shape[0]}, "face_count": {faces.shape[0]}')
+        for name, values in (("x", vertices[:, 0]), ("y", vertices[:, 1]), ("z", vertices[:, 2]),
+                             ("nx", normals[:, 0]), ("ny", normals[:, 1]), ("nz", normals[:, 2])):
+            f.write(f', "{name}": [{_format_floats(values)}]')
+        for name, values in (("r", colors[:, 0]), ("g", colors[:, 1]), ("b", colors[:, 2])):
+            f.write(f', "{name}": [{_format_ints(values)}]')
+        f.write(f', "faces": [{_format_ints(np.asarray(faces).ravel())}]}}')
+    return filename
+
+
+MESH_SAVERS = {"ply": save_mesh_ply, "glb": save_mesh_glb, "json": save_mesh_json}
+
+
+def save_mesh(filename, fmt, vertices, normals, colors, faces):
+    if fmt not in MESH_SAVERS:
+        raise ValueError(f"不支持的网格格式: {fmt}")
+    return MESH_SAVERS[fmt](filename, vertices, normals, colors, faces)
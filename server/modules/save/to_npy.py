@@ -1,15 +1,124 @@
 import time
+import json
 import numpy as np
 from modules.log import log as debug_log
 import os
 
+'''
+原始采集格式(version 1), 均为普通类型数组, 可 np.load(mmap_mode='r') 只映射深度平面:
+{timestamp}_depth.npy    uint16 (H, W)
+{timestamp}_color.npy    uint8  (H, W, C)
+{timestamp}_capture.json 内参、时间戳等元数据
+旧版为 np.save({"depth":..., "color":...}) 的 pickle 对象数组, 读取时自动兼容
+'''
 
-def save_point_cloud_npy(base_dir, timestamp, depth_image, color_image):
+CAPTURE_FORMAT_VERSION = 1
+DEPTH_SUFFIX = "_depth.npy"
+COLOR_SUFFIX = "_color.npy"
+META_SUFFIX = "_capture.json"
+DEFAULT_FX, DEFAULT_FY = 600.0, 600.0
+
+
+def capture_prefix(depth_npy_path):
+    if depth_npy_path.endswith(DEPTH_SUFFIX):
+        return depth_npy_path[:-len(DEPTH_SUFFIX)]
+    return os.path.splitext(depth_npy_path)[0]
+
+
+def default_intrinsics(depth_shape):
+    height, width = depth_shape[:2]
+    return {"fx": DEFAULT_FX, "fy": DEFAULT_FY, "cx": width / 2.0, "cy": height / 2.0}
+
+
+def save_point_cloud_npy(base_dir, timestamp, depth_image, color_image, intrinsics=None, device_timestamp_usec=None):
     t_start = time.time()
-    # 保存npy文件
-    depth_npy_path = os.path.join(base_dir, f"{timestamp}_depth.npy")
-    np.save(depth_npy_path, {"depth": depth_image, "color": color_image})
+    prefix = os.path.join(base_dir, str(timestamp))
+    depth_npy_path = prefix + DEPTH_SUFFIX
+    np.save(depth_npy_path, np.ascontiguousarray(depth_image), allow_pickle=False)
+    color_file = None
+    if color_image is not None:
+        np.save(prefix + COLOR_SUFFIX, np.ascontiguousarray(color_image), allow_pickle=False)
+        color_file = os.path.basename(prefix + COLOR_SUFFIX)
+    meta = {
+        "version": CAPTURE_FORMAT_VERSION,
+        "timestamp": int(timestamp) if str(timestamp).isdigit() else None,
+        "device_timestamp_usec": device_timestamp_usec,
+        "depth": {"file": os.path.basename(depth_npy_path), "shape": list(depth_image.shape), "dtype": str(depth_image.dtype)},
+        "color": None if color_file is None else {
+            "file": color_file, "shape": list(color_image.shape), "dtype": str(color_image.dtype)},
+        "intrinsics": intrinsics or default_intrinsics(depth_image.shape),
+    }
+    with open(prefix + META_SUFFIX, "w") as f:
+        json.dump(meta, f, indent=2)
     t_end = time.time()
     debug_log(f"保存NPY完成，用时 {t_end - t_start:.3f} 秒")
 
     return depth_npy_path
+
+
+def is_legacy_npy(path):
+    # 只读文件头判断是否为 pickle 对象数组
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            _, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            _, _, dtype = np.lib.format.read_array_header_2_0(f)
+    return dtype.hasobject
+
+
+def load_capture_npy(depth_npy_path, mmap_mode="r", with_color=True):
+    '''
+    返回 (depth, color, meta); 新格式下 depth/color 为内存映射数组
+    color 不存在或 with_color=False 时为 None
+    '''
+    if is_legacy_npy(depth_npy_path):
+        data = np.load(depth_npy_path, allow_pickle=True).item()
+        depth = data.get("depth")
+        if depth is None:
+            raise ValueError(f"{depth_npy_path} 中未找到depth数据")
+        color = data.get("color") if with_color else None
+        meta = {"version": 0, "timestamp": None, "device_timestamp_usec": None,
+                "intrinsics": default_intrinsics(depth.shape)}
+        return depth, color, meta
+
+    depth = np.load(depth_npy_path, mmap_mode=mmap_mode)
+    prefix = capture_prefix(depth_npy_path)
+    meta_path = prefix + META_SUFFIX
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    else:
+        meta = {"version": CAPTURE_FORMAT_VERSION, "timestamp": None, "device_timestamp_usec": None}
+    meta.setdefault("intrinsics", default_intrinsics(depth.shape))
+    color = None
+    if with_color:
+        color_path = prefix + COLOR_SUFFIX
+        if meta.get("color"):
+            color_path = os.path.join(os.path.dirname(depth_npy_path), meta["color"]["file"])
+        if os.path.exists(color_path):
+            color = np.load(color_path, mmap_mode=mmap_mode)
+    return depth, color, meta
+
+
+def migrate_legacy_npy(depth_npy_path):
+    '''
+    将旧版 pickle 文件就地转换为新格式, 已是新格式时返回 False
+    '''
+    if not is_legacy_npy(depth_npy_path):
+        return False
+    depth, color, _ = load_capture_npy(depth_npy_path)
+    base_dir = os.path.dirname(depth_npy_path)
+    timestamp = os.path.basename(capture_prefix(depth_npy_path))
+    # 先写临时文件再替换, 中途失败不会损坏原数据
+    tmp_dir = os.path.join(base_dir, f".migrate_{timestamp}")
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        save_point_cloud_npy(tmp_dir, timestamp, depth, color)
+        for name in os.listdir(tmp_dir):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(base_dir, name))
+    finally:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+    return True
@@ -1,23 +1,98 @@
 import time
+import struct
+import numpy as np
 from modules.log import log as debug_log
 
-def save_point_cloud_pcd(filename, points, colors):
+try:
+    import lzf  # python-lzf, 可选依赖
+except ImportError:
+    lzf = None
+
+PCD_FORMATS = ("binary", "binary_compressed", "ascii")
+
+
+def pack_rgb(colors):
+    # (r << 16) | (g << 8) | b, 整列一次算完
+    colors = colors.astype(np.uint32, copy=False)
+    return (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+
+
+def pcd_header(count, fmt="binary"):
+    return (
+        "VERSION .7\n"
+        "FIELDS x y z rgb\n"
+        "SIZE 4 4 4 4\n"
+        "TYPE F F F U\n"
+        "COUNT 1 1 1 1\n"
+        f"WIDTH {count}\n"
+        "HEIGHT 1\n"
+        "VIEWPOINT 0 0 0 1 0 0 0\n"
+        f"POINTS {count}\n"
+        f"DATA {fmt}\n"
+    )
+
+
+def lzf_literal_compress(data):
+    '''
+    未安装 python-lzf 时的兜底: 只用字面量块(每块最多32字节)组成合法的LZF流
+    不做压缩, 体积约增加 1/32, 但任何 PCD 读取器都能解
+    '''
+    n = len(data)
+    if n == 0:
+        return b""
+    full, rest = divmod(n, 32)
+    src = np.frombuffer(data, dtype=np.uint8)
+    out = np.empty(full * 33 + (rest + 1 if rest else 0), dtype=np.uint8)
+    if full:
+        blocks = out[:full * 33].reshape(full, 33)
+        blocks[:, 0] = 31
+        blocks[:, 1:] = src[:full * 32].reshape(full, 32)
+    if rest:
+        out[full * 33] = rest - 1
+        out[full * 33 + 1:] = src[full * 32:]
+    return out.tobytes()
+
+
+def lzf_compress(data):
+    if lzf is not None:
+        # 数据不可压缩时 lzf.compress 返回 None, 退回字面量编码
+        compressed = lzf.compress(data, len(data) + len(data) // 32 + 64)
+        if compressed is not None:
+            return compressed
+    return lzf_literal_compress(data)
+
+
+def save_point_cloud_pcd(filename, points, colors, fmt="binary"):
+    '''
+    fmt: "binary"(默认) / "binary_compressed"(LZF) / "ascii"
+    '''
+    if fmt not in PCD_FORMATS:
+        raise ValueError(f"不支持的PCD格式: {fmt}")
     t_start = time.time()
-    with open(filename, 'w') as f:
-        f.write("VERSION .7\n")
-        f.write("FIELDS x y z rgb\n")
-        f.write("SIZE 4 4 4 4\n")
-        f.write("TYPE F F F U\n")
-        f.write("COUNT 1 1 1 1\n")
-        f.write(f"WIDTH {points.shape[0]}\n")
-        f.write("HEIGHT 1\n")
-        f.write("VIEWPOINT 0 0 0 1 0 0 0\n")
-        f.write(f"POINTS {points.shape[0]}\n")
-        f.write("DATA ascii\n")
-        for i in range(points.shape[0]):
-            x, y, z = points[i]
-            r, g, b = colors[i]
-            rgb = (int(r) << 16) | (int(g) << 8) | int(b)
-            f.write(f"{x} {y} {z} {rgb}\n")
+    count = points.shape[0]
+    xyz = np.ascontiguousarray(points, dtype=np.float32)
+    rgb = pack_rgb(colors)
+    with open(filename, 'wb') as f:
+        f.write(pcd_header(count, fmt).encode("ascii"))
+        if fmt == "binary":
+            # 按点交错存储 x y z rgb
+            body = np.empty((count, 4), dtype="<u4")
+            body[:, :3] = xyz.view(np.uint32)
+            body[:, 3] = rgb
+            f.write(body.tobytes())
+        elif fmt == "binary_compressed":
+            # 按字段分块存储: 所有x, 所有y, 所有z, 所有rgb
+            body = np.empty((4, count), dtype="<u4")
+            body[:3] = xyz.view(np.uint32).T
+            body[3] = rgb
+            raw = body.tobytes()
+            compressed = lzf_compress(raw)
+            f.write(struct.pack("<II", len(compressed), len(raw)))
+            f.write(compressed)
+        else:
+            body = np.empty(count, dtype=[("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("rgb", "<u4")])
+            body["x"], body["y"], body["z"] = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+            body["rgb"] = rgb
+            np.savetxt(f, body, fmt="%.7g %.7g %.7g %d")
     t_end = time.time()
-    debug_log(f"保存PCD完成，用时 {t_end - t_start:.3f} 秒")
+    debug_log(f"保存PCD({fmt})完成，用时 {t_end - t_start:.3f} 秒")
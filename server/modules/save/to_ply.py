@@ -1,22 +1,58 @@
 import time
+import numpy as np
 from modules.log import log as debug_log
 
-def save_point_cloud_ply(filename, points, colors):
+PLY_FORMATS = ("binary", "ascii")
+
+# 与 header 中 property 顺序一致
+PLY_VERTEX_DTYPE = np.dtype([
+    ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+    ("red", "u1"), ("green", "u1"), ("blue", "u1"),
+])
+
+
+def build_ply_vertices(points, colors):
+    vertices = np.empty(points.shape[0], dtype=PLY_VERTEX_DTYPE)
+    vertices["x"] = points[:, 0]
+    vertices["y"] = points[:, 1]
+    vertices["z"] = points[:, 2]
+    vertices["red"] = colors[:, 0]
+    vertices["green"] = colors[:, 1]
+    vertices["blue"] = colors[:, 2]
+    return vertices
+
+
+def ply_header(count, fmt="binary"):
+    format_line = "binary_little_endian 1.0" if fmt == "binary" else "ascii 1.0"
+    return (
+        "ply\n"
+        f"format {format_line}\n"
+        f"element vertex {count}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        "property uchar red\n"
+        "property uchar green\n"
+        "property uchar blue\n"
+        "end_header\n"
+    )
+
+
+def save_point_cloud_ply(filename, points, colors, fmt="binary"):
+    '''
+    fmt: "binary"(binary_little_endian, 默认) 或 "ascii"
+    '''
+    if fmt not in PLY_FORMATS:
+        raise ValueError(f"不支持的PLY格式: {fmt}")
     t_start = time.time()
-    with open(filename, 'w') as f:
-        f.write("ply\n")
-        f.write("format ascii 1.0\n")
-        f.write(f"element vertex {points.shape[0]}\n")
-        f.write("property float x\n")
-        f.write("property float y\n")
-        f.write("property float z\n")
-        f.write("property uchar red\n")
-        f.write("property uchar green\n")
-        f.write("property uchar blue\n")
-        f.write("end_header\n")
-        for i in range(points.shape[0]):
-            x, y, z = points[i]
-            r, g, b = colors[i]
-            f.write(f"{x} {y} {z} {r} {g} {b}\n")
+    vertices = build_ply_vertices(points, colors)
+    if fmt == "binary":
+        with open(filename, 'wb') as f:
+            f.write(ply_header(vertices.shape[0], fmt).encode("ascii"))
+            f.write(vertices.tobytes())
+    else:
+        with open(filename, 'w') as f:
+            f.write(ply_header(vertices.shape[0], fmt))
+            np.savetxt(f, vertices, fmt="%.7g %.7g %.7g %d %d %d")
     t_end = time.time()
-    debug_log(f"保存PLY完成，用时 {t_end - t_start:.3f} 秒")
+    debug_log(f"保存PLY({fmt})完成，用时 {t_end - t_start:.3f} 秒")
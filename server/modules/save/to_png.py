@@ -3,6 +3,10 @@ import cv2
 import imageio
 import re
 
+PREVIEW_FORMATS = ("jpg", "webp")
+THUMBNAIL_SUFFIX = "_thumb"  # {timestamp}_thumb.jpg, /capture 返回前写入
+PREVIEW_SUFFIX = "_preview"  # {timestamp}_preview.jpg, 后台保存任务最先写入
+
 
 def contains_chinese(string):
     # 检查是否包含中文或其他非ASCII字符
@@ -14,22 +18,60 @@ def contains_chinese(string):
 '''
 
 
-def save_rgb_images(path, image):
+def save_rgb_images(path, image, compression=None):
+    '''
+    compression 为 PNG 压缩级别 0-9(越大越小越慢), None 时使用 OpenCV 默认
+    先写 {name}.tmp.png(保留扩展名, 编码器据此选择格式)再改名, /data 不会提供写了一半的图片
+    '''
+    params = [] if compression is None else [cv2.IMWRITE_PNG_COMPRESSION, int(compression)]
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
     try:
-        if contains_chinese(path):
-            imageio.imwrite(path, image)
-            if os.path.exists(path):
-                return True
-            else:
-                print(f"[警告] imageio 保存失败: {path}")
-                return False
+        if contains_chinese(path) and params:
+            # cv2.imwrite 不支持中文路径, 需要指定压缩级别时编码后自行写入
+            ok, encoded = cv2.imencode(ext, image, params)
+            if ok:
+                encoded.tofile(tmp_path)
+            writer = "cv2.imencode"
+        elif contains_chinese(path):
+            imageio.imwrite(tmp_path, image)
+            ok = True
+            writer = "imageio"
         else:
-            result = cv2.imwrite(path, image)
-            if result and os.path.exists(path):
-                return True
-            else:
-                print(f"[警告] cv2.imwrite 保存失败: {path}")
-                return False
+            ok = cv2.imwrite(tmp_path, image, params)
+            writer = "cv2.imwrite"
+        if ok and os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+            return True
+        print(f"[警告] {writer} 保存失败: {path}")
+        return False
     except Exception as e:
         print(f"[错误] 保存图片时发生异常: {e}")
         return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def encode_preview(image, max_width, quality=85, fmt="jpg"):
+    '''
+    缩放到不超过 max_width 后编码为 JPEG/WebP, 返回字节
+    '''
+    height, width = image.shape[:2]
+    if max_width and width > max_width:
+        image = cv2.resize(image, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+    flag = cv2.IMWRITE_WEBP_QUALITY if fmt == "webp" else cv2.IMWRITE_JPEG_QUALITY
+    ok, encoded = cv2.imencode(f".{fmt}", image, [flag, int(quality)])
+    if not ok:
+        raise RuntimeError(f"{fmt} 预览图编码失败")
+    return encoded.tobytes()
+
+
+def save_preview_image(path, image, max_width, quality=85):
+    # 格式取自扩展名; 先写临时文件再改名, 界面轮询时不会读到写了一半的图片
+    data = encode_preview(image, max_width, quality, os.path.splitext(path)[1].lstrip(".").lower())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
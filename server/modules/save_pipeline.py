@@ -0,0 +1,314 @@
+import os
+import time
+import threading
+import itertools
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+
+from modules.log import log as debug_log
+from modules.metrics import SAVE_SECONDS, SAVE_JOBS, POINT_CLOUD_SECONDS
+
+'''
+后台保存流水线
+/capture 把深度、彩色平面拷入共享内存后投递到进程池, 队列有上限, 满了直接返回忙
+每个任务有 job_id, 记录排队等待和各阶段耗时
+'''
+
+JOB_HISTORY_SIZE = 100  # 保留最近多少个任务的状态
+
+
+def _share_array(array):
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, {"name": shm.name, "shape": array.shape, "dtype": array.dtype.str}
+
+
+def _attach_array(spec):
+    # 由主进程负责 unlink; 进程池子进程与主进程共用同一个 resource_tracker, 重复登记无影响
+    try:
+        shm = shared_memory.SharedMemory(name=spec["name"], track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=spec["name"])
+    return shm, np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+
+
+def _save_job(job):
+    '''
+    在子进程中执行, 返回各阶段耗时(秒)
+    '''
+    from modules.save.to_ply import save_point_cloud_ply
+    from modules.save.to_pcd import save_point_cloud_pcd
+    from modules.save.to_npy import save_point_cloud_npy
+    from modules.generate_point_cloud import generate_point_cloud
+    from modules.save.to_png import save_rgb_images, save_preview_image, PREVIEW_SUFFIX
+    from modules.catalog import depth_range
+    from modules.octree import save_octree
+    from modules.point_cloud_filter import filter_depth, filter_points
+
+    started = time.time()
+    stages = {}
+    handles = []
+    try:
+        depth_shm, depth_image = _attach_array(job["depth"])
+        handles.append(depth_shm)
+        color_image = None
+        if job["color"] is not None:
+            color_shm, color_image = _attach_array(job["color"])
+            handles.append(color_shm)
+        points = colors = None
+        if job.get("points") is not None:
+            # 实时推流已经算好的同一帧点云, 不再重复计算
+            points_shm, points = _attach_array(job["points"])
+            colors_shm, colors = _attach_array(job["colors"])
+            handles += [points_shm, colors_shm]
+
+        base_dir, timestamp = job["base_dir"], job["timestamp"]
+        os.makedirs(base_dir, exist_ok=True)
+        k = job["intrinsics"]
+        depth_min, depth_max = depth_range(depth_image)
+
+        if color_image is not None and job.get("preview") is not None:
+            # 中等尺寸预览图最先写, 界面不必等无损 PNG
+            preview = job["preview"]
+            t = time.time()
+            save_preview_image(os.path.join(base_dir, f"{timestamp}{PREVIEW_SUFFIX}.{preview['format']}"),
+                               color_image, preview["max_width"], preview["quality"])
+            stages["preview"] = time.time() - t
+
+        if color_image is not None and job.get("png") is not None:
+            t = time.time()
+            save_rgb_images(os.path.join(base_dir, f"{timestamp}.png"), color_image, job["png"]["compression"])
+            stages["png"] = time.time() - t
+
+        t = time.time()
+        save_point_cloud_npy(base_dir, timestamp, depth_image, color_image,
+                             intrinsics=k, device_timestamp_usec=job["device_timestamp_usec"])
+        stages["npy"] = time.time() - t
+
+        if points is None:
+            filters = job.get("filters")
+            source_depth = depth_image
+            if filters and filters["min_neighbors"]:
+                t = time.time()
+                source_depth = filter_depth(depth_image, filters)
+                stages["outlier"] = time.time() - t
+            t = time.time()
+            points, colors = generate_point_cloud(source_depth, k["fx"], k["fy"], k["cx"], k["cy"], color_image)
+            stages["point_cloud"] = time.time() - t
+            if filters and filters["voxel_size"] > 0:
+                t = time.time()
+                points, colors = filter_points(points, colors, filters)
+                stages["voxel"] = time.time() - t
+            source_depth = None
+
+        t = time.time()
+        save_point_cloud_ply(os.path.join(base_dir, f"{timestamp}.ply"), points, colors, fmt=job["ply_format"])
+        stages["ply"] = time.time() - t
+
+        t = time.time()
+        save_point_cloud_pcd(os.path.join(base_dir, f"{timestamp}.pcd"), points, colors, fmt=job["pcd_format"])
+        stages["pcd"] = time.time() - t
+
+        if job.get("octree") is not None:
+            t = time.time()
+            rgb = None if color_image is None else colors[:, 2::-1]  # BGR 转 RGB
+            save_octree(base_dir, timestamp, points, rgb, job["octree"]["max_points"])
+            stages["octree"] = time.time() - t
+    finally:
+        point_count = 0 if points is None else int(points.shape[0])
+        # 先释放引用共享内存的数组再关闭
+        depth_image = color_image = points = colors = None
+        for shm in handles:
+            shm.close()
+    return {"started": started, "stages": stages, "point_count": point_count,
+            "depth_min": depth_min, "depth_max": depth_max, "shape": job["depth"]["shape"]}
+
+
+class SavePipeline:
+    def __init__(self, workers=2, max_pending=4):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}  # {job_id: (future, [SharedMemory])}
+        self._jobs = OrderedDict()  # {job_id: 状态}
+        self._stage_totals = {}  # {阶段: [总耗时, 次数]}
+
+    def start(self):
+        if self._executor is None:
+            self._executor = self._new_executor()
+            debug_log(f"保存进程池已启动，进程数 {self.workers}，队列上限 {self.max_pending}")
+
+    def _new_executor(self):
+        # 服务进程持有相机句柄、录制线程和事件循环, fork 会把这些连同可能被占用的锁一起复制到子进程
+        # 显式使用 spawn, 子进程只导入 _save_job 所需模块, 各平台行为一致
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=False)
+            self._executor = None
+
+    def submit(self, base_dir, timestamp, depth_image, color_image, intrinsics,
+               ply_format, pcd_format, device_timestamp_usec=None, points=None, colors=None, on_done=None,
+               png=None, preview=None, octree=None, filters=None):
+        '''
+        投递保存任务, 队列已满时返回 None
+        points/colors 为同一帧已经生成好的点云(可选), 传入时子进程跳过点云生成
+        png 为 {"compression"} 时在子进程中保存无损 PNG; preview 为 {"max_width", "quality", "format"} 时先写中等预览图
+        octree 为 {"max_points"} 时保存点云后构建八叉树 LOD 分块
+        filters 为点云滤波配置(point_cloud_filter.filter_profile), 只作用于子进程中生成的点云
+        on_done(info) 在任务成功后调用(不持有流水线锁), info 为任务状态副本
+        '''
+        self.start()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                SAVE_JOBS.inc(status="busy")
+                return None
+            job_id = f"{timestamp}-{next(self._ids)}"
+            handles = []
+            try:
+                depth_shm, depth_spec = _share_array(depth_image)
+                handles.append(depth_shm)
+                color_spec = None
+                if color_image is not None:
+                    color_shm, color_spec = _share_array(color_image)
+                    handles.append(color_shm)
+                points_spec = colors_spec = None
+                if points is not None and colors is not None:
+                    points_shm, points_spec = _share_array(points)
+                    handles.append(points_shm)
+                    colors_shm, colors_spec = _share_array(colors)
+                    handles.append(colors_shm)
+                job = {
+                    "base_dir": base_dir, "timestamp": timestamp,
+                    "depth": depth_spec, "color": color_spec,
+                    "intrinsics": intrinsics, "device_timestamp_usec": device_timestamp_usec,
+                    "ply_format": ply_format, "pcd_format": pcd_format,
+                    "points": points_spec, "colors": colors_spec,
+                    "png": png, "preview": preview, "octree": octree, "filters": filters,
+                }
+                submitted = time.time()
+                try:
+                    future = self._executor.submit(_save_job, job)
+                except BrokenProcessPool:
+                    # 子进程异常退出后进程池不可再用, 重建一次
+                    debug_log("保存进程池已损坏，重新创建")
+                    self._executor = self._new_executor()
+                    future = self._executor.submit(_save_job, job)
+            except Exception:
+                self._release(handles)
+                raise
+            self._pending[job_id] = (future, handles)
+            compression = (png or {}).get("compression")
+            self._jobs[job_id] = {"job_id": job_id, "status": "queued", "submitted": submitted,
+                                  "queue_wait": None, "stages": {}, "total": None, "error": None,
+                                  "formats": {"npy": "npy", "ply": ply_format, "pcd": pcd_format,
+                                              "png": "png" if compression is None else f"png{compression}",
+                                              "preview": (preview or {}).get("format", "")}}
+            while len(self._jobs) > JOB_HISTORY_SIZE:
+                self._jobs.popitem(last=False)
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f, on_done))
+        return job_id
+
+    @staticmethod
+    def _release(handles):
+        for shm in handles:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _on_done(self, job_id, future, callback=None):
+        with self._lock:
+            _, handles = self._pending.pop(job_id, (None, []))
+            self._release(handles)
+            info = self._jobs.get(job_id)
+            if info is None:
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                info["status"] = "failed"
+                info["error"] = str(e)
+                SAVE_JOBS.inc(status="failed")
+                debug_log(f"后台保存失败[{job_id}]: {e}")
+                return
+            info["status"] = "done"
+            info["queue_wait"] = round(result["started"] - info["submitted"], 4)
+            info["stages"] = {k: round(v, 4) for k, v in result["stages"].items()}
+            info["total"] = round(time.time() - info["submitted"], 4)
+            info["point_count"] = result["point_count"]
+            info["depth_min"], info["depth_max"] = result["depth_min"], result["depth_max"]
+            info["height"], info["width"] = result["shape"][:2]
+            SAVE_JOBS.inc(status="done")
+            for stage, seconds in result["stages"].items():
+                if stage == "point_cloud":
+                    POINT_CLOUD_SECONDS.observe(seconds, source="capture")
+                else:
+                    SAVE_SECONDS.observe(seconds, stage=stage, format=info["formats"].get(stage, ""))
+            SAVE_SECONDS.observe(info["queue_wait"], stage="queue_wait", format="")
+            SAVE_SECONDS.observe(info["total"], stage="total", format="")
+            for stage, seconds in list(result["stages"].items()) + [("queue_wait", info["queue_wait"])]:
+                total = self._stage_totals.setdefault(stage, [0.0, 0])
+                total[0] += seconds
+                total[1] += 1
+            info = dict(info)
+        debug_log(f"后台保存完毕[{job_id}]，用时 {info['total']:.3f} 秒")
+        if callback is not None:
+            try:
+                callback(info)
+            except Exception as e:
+                debug_log(f"保存完成回调失败[{job_id}]: {e}")
+
+    def worker_pids(self):
+        executor = self._executor
+        if executor is None:
+            return set()
+        return set((getattr(executor, "_processes", None) or {}).keys())
+
+    def job(self, job_id):
+        with self._lock:
+            info = self._jobs.get(job_id)
+            if info is None:
+                return None
+            info = dict(info)
+            future, _ = self._pending.get(job_id, (None, None))
+        if future is not None and future.running():
+            info["status"] = "running"
+        return info
+
+    def status(self):
+        with self._lock:
+            futures = [future for future, _ in self._pending.values()]
+            stage_avg = {stage: round(total / count, 4)
+                         for stage, (total, count) in self._stage_totals.items() if count}
+            recent = [dict(info) for info in list(self._jobs.values())[-10:]]
+        running = sum(1 for f in futures if f.running())
+        return {
+            "workers": self.workers,
+            "capacity": self.max_pending,
+            "pending": len(futures),
+            "running": running,
+            "queued": len(futures) - running,
+            "stage_avg": stage_avg,
+            "recent_jobs": recent,
+        }
+
+
+save_pipeline = None
+
+
+def get_save_pipeline():
+    global save_pipeline
+    if save_pipeline is None:
+        from config import SAVE_WORKERS, SAVE_QUEUE_SIZE
+        save_pipeline = SavePipeline(SAVE_WORKERS, SAVE_QUEUE_SIZE)
+    return save_pipeline
@@ -1,5 +1,4 @@
-from fastapi import APIRouter
-import threading
+from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
 import time
 import datetime
@@ -7,12 +6,17 @@ import os
 import cv2
 
 from modules.log import log as debug_log
-from modules.save.to_ply import save_point_cloud_ply
-from modules.save.to_pcd import save_point_cloud_pcd
-from modules.save.to_npy import save_point_cloud_npy
-from modules.save.to_png import save_rgb_images
-from modules.generate_point_cloud import generate_point_cloud
-from config import OUTPUT_DIR, LOCAL_IP, STATIC_PORT
+from modules.save.to_ply import PLY_FORMATS
+from modules.save.to_pcd import PCD_FORMATS
+from modules.save.to_png import save_preview_image, THUMBNAIL_SUFFIX, PREVIEW_SUFFIX
+from modules.save_pipeline import get_save_pipeline
+from modules.frame_cache import frame_cache
+from modules.point_cloud_filter import filter_profile
+from modules.catalog import get_capture_catalog
+from modules.metrics import CAPTURE_REQUEST_SECONDS
+from config import OUTPUT_DIR, LOCAL_IP, STATIC_SERVER, STATIC_PORT, SERVER_PORT, PLY_FORMAT, PCD_FORMAT
+from config import PNG_COMPRESSION, PREVIEW_FORMAT, THUMBNAIL_WIDTH, PREVIEW_WIDTH, PREVIEW_QUALITY
+from config import OCTREE_ON_SAVE, OCTREE_MAX_POINTS
 import global_vars
 
 
@@ -20,51 +24,93 @@ router = APIRouter()
 
 
 @router.get("/capture")
-def capture():
-    with global_vars.frame_lock:
-        frame = global_vars.latest_frame
-    if frame is None:
+def capture(ply_format: str = Query(PLY_FORMAT), pcd_format: str = Query(PCD_FORMAT),
+            png_compression: int = Query(PNG_COMPRESSION, ge=0, le=9)):
+    with CAPTURE_REQUEST_SECONDS.time():
+        return _capture(ply_format, pcd_format, png_compression)
+
+
+def _capture(ply_format, pcd_format, png_compression):
+    if ply_format not in PLY_FORMATS or pcd_format not in PCD_FORMATS:
+        return JSONResponse(content={"status": "fail", "message": "不支持的点云保存格式"}, status_code=400)
+    packet = global_vars.frame_bus.latest()
+    if packet is None:
         return JSONResponse(content={"status": "fail", "message": "暂无可用帧"}, status_code=500)
 
+    frame = packet.frame
     timestamp = str(int(time.time() * 1000))
     date_str = datetime.datetime.now().strftime("%Y-%m-%d")
     base_dir = os.path.join(OUTPUT_DIR, date_str, timestamp)
+
+    color_image = cv2.cvtColor(frame.color, cv2.COLOR_BGRA2BGR)
+    depth_image = frame.depth
+    fx, fy = 600.0, 600.0
+    cx, cy = depth_image.shape[1] / 2.0, depth_image.shape[0] / 2.0
+    # 实时推流已经为这一帧生成过全分辨率点云、且滤波配置相同时直接复用
+    filters = filter_profile("capture")
+    cached = frame_cache.peek(packet.seq) if filters == frame_cache.profile else None
+    points, colors = (cached.points, cached.colors) if cached is not None else (None, None)
+    catalog = get_capture_catalog()
+
+    def record(info):
+        # 保存完成后写入采集索引, /stats 和 /captures 由此更新
+        catalog.record_capture(
+            base_dir, timestamp, point_count=info["point_count"],
+            depth_min=info["depth_min"], depth_max=info["depth_max"],
+            width=info["width"], height=info["height"],
+            save_stages=dict(info["stages"], queue_wait=info["queue_wait"]),
+            save_total=info["total"], job_id=info["job_id"])
+
+    # 深度/彩色平面拷入共享内存交给保存进程池, 队列满时直接返回忙
+    job_id = get_save_pipeline().submit(
+        base_dir, timestamp, depth_image, color_image,
+        intrinsics={"fx": fx, "fy": fy, "cx": cx, "cy": cy},
+        ply_format=ply_format, pcd_format=pcd_format,
+        device_timestamp_usec=packet.device_timestamp_usec, points=points, colors=colors, on_done=record,
+        png={"compression": png_compression},
+        preview={"max_width": PREVIEW_WIDTH, "quality": PREVIEW_QUALITY, "format": PREVIEW_FORMAT},
+        octree={"max_points": OCTREE_MAX_POINTS} if OCTREE_ON_SAVE else None, filters=filters)
+    if job_id is None:
+        return JSONResponse(content={"status": "busy", "message": "保存队列已满，请稍后再试"}, status_code=503)
     os.makedirs(base_dir, exist_ok=True)
+    # 先占一行, /stats 当天数量随请求更新; 保存完成后 record 补全点数和耗时
+    catalog.record_pending(base_dir, timestamp, job_id=job_id)
 
-    debug_log(f"开始保存数据：{timestamp}")
+    debug_log(f"开始保存数据：{timestamp}，任务 {job_id}")
 
+    # 请求里只写缩略图; 中等预览图和无损 PNG 由后台保存任务写入
     t_start = time.time()
-    color_image = cv2.cvtColor(frame.color, cv2.COLOR_BGRA2BGR)
+    thumbnail_path = os.path.join(base_dir, f"{timestamp}{THUMBNAIL_SUFFIX}.{PREVIEW_FORMAT}")
+    save_preview_image(thumbnail_path, color_image, THUMBNAIL_WIDTH, PREVIEW_QUALITY)
+    debug_log(f"保存缩略图完成，用时 {time.time() - t_start:.3f} 秒")
+    # 后台任务可能先于缩略图写完, 此时补记
+    catalog.add_file(timestamp, thumbnail_path)
     rgb_path = os.path.join(base_dir, f"{timestamp}.png")
-    save_rgb_images(rgb_path, color_image)
-    debug_log(f"保存RGB完成，用时 {time.time() - t_start:.3f} 秒")
+    preview_path = os.path.join(base_dir, f"{timestamp}{PREVIEW_SUFFIX}.{PREVIEW_FORMAT}")
 
-    host_url = f"http://{LOCAL_IP}:{STATIC_PORT}"
+    host_url = f"http://{LOCAL_IP}:{STATIC_PORT if STATIC_SERVER == 'node' else SERVER_PORT}"
 
     def to_url_path(path):
         rel_path = path.replace(OUTPUT_DIR, "/data")
         rel_path = rel_path.replace("\\", "/")
         return f"{host_url}{rel_path}"
 
-    def background_save():
-        try:
-            depth_image = frame.depth
-            save_point_cloud_npy(base_dir, timestamp,
-                                 depth_image, color_image)
-            fx, fy = 600.0, 600.0
-            cx, cy = depth_image.shape[1] / 2.0, depth_image.shape[0] / 2.0
-            points, colors = generate_point_cloud(
-                depth_image, fx, fy, cx, cy, color_image)
-            save_point_cloud_ply(os.path.join(
-                base_dir, f"{timestamp}.ply"), points, colors)
-            save_point_cloud_pcd(os.path.join(
-                base_dir, f"{timestamp}.pcd"), points, colors)
-            debug_log("后台保存完毕")
-        except Exception as e:
-            debug_log(f"后台保存失败: {e}")
-    threading.Thread(target=background_save, daemon=True).start()  # 多线程保存
     return JSONResponse(content={
         "status": "success",
         "timestamp": timestamp,
-        "rgb_image": to_url_path(rgb_path)
+        "job_id": job_id,
+        "thumbnail": to_url_path(thumbnail_path),
+        "preview_image": to_url_path(preview_path),  # 后台任务写入, 可能稍后才可用
+        "rgb_image": to_url_path(rgb_path)  # 无损 PNG, 保存任务完成后可用
     })
+
+
+@router.get("/save_status")
+def save_status(job_id: str = Query(None)):
+    pipeline = get_save_pipeline()
+    if job_id is None:
+        return JSONResponse(content=pipeline.status())
+    info = pipeline.job(job_id)
+    if info is None:
+        return JSONResponse(content={"status": "fail", "message": "任务不存在"}, status_code=404)
+    return JSONResponse(content=info)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from modules import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    # Prometheus 文本格式
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
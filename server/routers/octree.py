@@ -0,0 +1,53 @@
+import os
+import re
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
+
+from modules.catalog import get_capture_catalog
+from modules.octree import get_octree_store, pack_tile
+from config import OUTPUT_DIR
+
+router = APIRouter()
+
+NODE_ID_PATTERN = re.compile(r"^r[0-7]*$")
+
+
+def _capture_dir(timestamp):
+    row = get_capture_catalog().get(timestamp)
+    if row is None:
+        return None
+    return os.path.join(OUTPUT_DIR, *row["dir"].split("/"))
+
+
+@router.get("/captures/{timestamp}/octree")
+def octree_index(timestamp: str):
+    '''
+    采集点云的八叉树索引, 第一次查看时构建(之后直接读文件)
+    '''
+    capture_dir = _capture_dir(timestamp)
+    if capture_dir is None:
+        return JSONResponse(content={"status": "fail", "message": "采集不存在"}, status_code=404)
+    try:
+        index = get_octree_store().index(capture_dir, timestamp)
+    except FileNotFoundError:
+        return JSONResponse(content={"status": "fail", "message": "采集缺少深度数据"}, status_code=404)
+    return JSONResponse(content=index)
+
+
+@router.get("/captures/{timestamp}/octree/{node_id}")
+def octree_tile(timestamp: str, node_id: str):
+    '''
+    单个节点的二进制数据: 24 字节头(b"OCT1", u32 count, f32 min[3], f32 size) + uint16 xyz + uint8 rgb
+    '''
+    capture_dir = _capture_dir(timestamp)
+    if capture_dir is None or not NODE_ID_PATTERN.match(node_id):
+        return JSONResponse(content={"status": "fail", "message": "节点不存在"}, status_code=404)
+    try:
+        payload, node = get_octree_store().tile(capture_dir, timestamp, node_id)
+    except FileNotFoundError:
+        return JSONResponse(content={"status": "fail", "message": "采集缺少深度数据"}, status_code=404)
+    if payload is None:
+        return JSONResponse(content={"status": "fail", "message": "节点不存在"}, status_code=404)
+    # 八叉树构建后不再变化
+    return Response(pack_tile(node, payload), media_type="application/octet-stream",
+                    headers={"Cache-Control": "public, max-age=3600"})
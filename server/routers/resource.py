@@ -1,24 +1,21 @@
-import os
-from fastapi import APIRouter
-import psutil
+from fastapi import APIRouter, Query
+
+from modules.resource_sampler import get_resource_sampler
 
 router = APIRouter()
 
 
 @router.get("/resource")
-def resource():
-    pid = os.getpid()
-    p = psutil.Process(pid)
-    mem_info = p.memory_info()
-    mem_usage_mb = mem_info.rss / 1024 / 1024
-
-    cpu_percent = p.cpu_percent(interval=0.5)  # 获取总占比
-    cpu_count = psutil.cpu_count(logical=True)  # 逻辑核心数
-
-    # 平均到所有核心，最大不会超过 100%
-    cpu_percent_normalized = cpu_percent / cpu_count
-
-    return {
-        "cpu_percent": round(cpu_percent_normalized, 2),
-        "memory_mb": round(mem_usage_mb, 2),
-    }
+def resource(history: int = Query(0, ge=0)):
+    '''
+    默认返回最新一次采样(cpu_percent、memory_mb 与以前一致), history=N 时返回最近 N 个样本
+    采样在后台线程完成, 这里不阻塞
+    '''
+    sampler = get_resource_sampler()
+    if history:
+        return {"interval": sampler.interval, "samples": sampler.history(history)}
+    sample = sampler.latest()
+    if sample is None:
+        # 服务刚启动还没有样本
+        return {"cpu_percent": 0, "memory_mb": 0}
+    return sample
@@ -1,9 +1,8 @@
-import os
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
 import datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
 
-from config import OUTPUT_DIR
+from modules.catalog import get_capture_catalog, DATE_PATTERN
 
 router = APIRouter()
 
@@ -12,18 +11,25 @@ router = APIRouter()
 def stats():
     # 获取今天的日期（格式：yyyy-mm-dd）
     today_str = datetime.datetime.now().strftime("%Y-%m-%d")
-    today_dir = os.path.join(OUTPUT_DIR, today_str)
-
-    # 检查目录是否存在
-    if not os.path.exists(today_dir):
-        folder_count = 0
-    else:
-        # 统计子文件夹数量
-        folder_count = sum(os.path.isdir(os.path.join(today_dir, name))
-                           for name in os.listdir(today_dir))
+    catalog = get_capture_catalog()
 
+    # 数量来自采集索引的每日计数, 不再遍历目录; 包含仍在保存和保存失败的采集(与目录数一致)
     return JSONResponse(content={
         "status": "success",
         "date": today_str,
-        "folder_count": folder_count
+        "folder_count": catalog.count_for_date(today_str),
+        "total_count": catalog.total_count()
     })
+
+
+@router.get("/captures")
+def captures(start: str = Query(None), end: str = Query(None),
+             page: int = Query(1, ge=1), page_size: int = Query(50, ge=1, le=500)):
+    '''
+    按日期范围(YYYY-MM-DD, 含两端)分页查询采集记录, 最新的在前
+    '''
+    for value in (start, end):
+        if value is not None and not DATE_PATTERN.match(value):
+            return JSONResponse(content={"status": "fail", "message": "日期格式应为 YYYY-MM-DD"}, status_code=400)
+    result = get_capture_catalog().query(start, end, page, page_size)
+    return JSONResponse(content=dict(result, status="success"))
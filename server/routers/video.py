@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
 import time
 import os
@@ -6,6 +6,8 @@ import cv2
 from datetime import datetime
 import config
 import global_vars
+from modules.recorder import recorder, depth_recorder, ColorVideoSink
+from modules.depth_recording import DepthRecordingWriter, DEPTH_RECORDING_SUFFIX
 from routers import video_ws
 
 router = APIRouter()
@@ -38,36 +40,62 @@ def get_h264_writer(save_path, width, height, fps=25):
     return None
 
 
+RECORD_MODES = ("color", "depth", "both")
+
+
 @router.post("/start_record")
-def start_record():
-    if global_vars.recording_flag:
+def start_record(fps: float = Query(config.RECORD_FPS, gt=0, le=30), mode: str = Query("color")):
+    '''
+    mode: color 只录彩色MP4; depth 只录无损深度(.kdepth, 保留每一帧); both 同时录制, 文件名相同
+    '''
+    if mode not in RECORD_MODES:
+        return JSONResponse({"success": False, "msg": "不支持的录制模式"}, status_code=400)
+    if video_ws.is_recording():
         return JSONResponse({"success": False, "msg": "已经在录制"}, status_code=400)
-    with global_vars.frame_lock:
-        frame = global_vars.latest_frame
+    frame = global_vars.frame_bus.latest_frame()
     if frame is None:
         return JSONResponse({"success": False, "msg": "没有可用帧"}, status_code=400)
-    rgb_image = cv2.cvtColor(frame.color, cv2.COLOR_BGRA2BGR)
-    height, width, _ = rgb_image.shape
     save_path = get_video_save_path()
-    writer = get_h264_writer(save_path, width, height, fps=25)
-    if writer is None:
-        return JSONResponse({"success": False, "msg": "无法打开VideoWriter，H.264尝试均失败"}, status_code=500)
-    global_vars.recording_flag = True
-    global_vars.recording_writer = writer
-    global_vars.recording_path = save_path
+    result = {"success": True, "msg": "开始录制", "mode": mode}
+    # 先打开全部输出再启动录制, 任一个打开失败时关闭已打开的, 不留下只录了一半的录制
+    color_sink = depth_writer = None
+    if mode in ("color", "both"):
+        height, width = frame.color.shape[:2]
+        # 文件声明的帧率与实际写入帧率一致, 由录制线程按时间戳挑帧
+        writer = get_h264_writer(save_path, width, height, fps=fps)
+        if writer is None:
+            return JSONResponse({"success": False, "msg": "无法打开VideoWriter，H.264尝试均失败"}, status_code=500)
+        color_sink = ColorVideoSink(writer)
+    if mode in ("depth", "both"):
+        depth_path = os.path.splitext(save_path)[0] + DEPTH_RECORDING_SUFFIX
+        height, width = frame.depth.shape
+        intrinsics = {"fx": 600.0, "fy": 600.0, "cx": width / 2.0, "cy": height / 2.0}
+        try:
+            depth_writer = DepthRecordingWriter(depth_path, width, height, intrinsics)
+        except (OSError, ValueError) as e:
+            if color_sink is not None:
+                color_sink.release()
+                if os.path.exists(save_path):
+                    os.remove(save_path)
+            return JSONResponse({"success": False, "msg": f"无法打开深度录制文件: {e}"}, status_code=500)
+    if color_sink is not None:
+        recorder.start(color_sink, save_path, fps, config.RECORD_QUEUE_SIZE)
+        result["path"] = save_path
+    if depth_writer is not None:
+        depth_recorder.start(depth_writer, depth_path, None, max_bytes=int(config.DEPTH_RECORD_QUEUE_MB * 1024 * 1024))
+        result["depth_path"] = depth_path
     video_ws.notify_recording_status_change(True)  # 通知WebSocket客户端
-    return JSONResponse({"success": True, "msg": "开始录制", "path": save_path})
+    return JSONResponse(result)
 
 
 @router.post("/stop_record")
 def stop_record():
-    if not global_vars.recording_flag:
+    # 深度录制溢出中止后 is_recording 可能已为 False, 仍需回收并返回错误信息
+    if not video_ws.is_recording() and not depth_recorder.active:
         return JSONResponse({"success": False, "msg": "当前未录制"}, status_code=400)
-    global_vars.recording_flag = False
-    if global_vars.recording_writer is not None:
-        global_vars.recording_writer.release()
-    path = global_vars.recording_path
-    global_vars.recording_writer = None
-    global_vars.recording_path = None
+    # 等待缓冲区写完
+    path = recorder.stop()
+    depth_path = depth_recorder.stop()
     video_ws.notify_recording_status_change(False)  # 通知WebSocket客户端
-    return JSONResponse({"success": True, "msg": "录制结束", "path": path})
+    return JSONResponse({"success": True, "msg": "录制结束", "path": path, "depth_path": depth_path,
+                         "stats": video_ws.recording_status()})
@@ -1,36 +1,42 @@
 from fastapi import APIRouter
 from fastapi import Query
 from fastapi.responses import StreamingResponse
-import time
-import cv2
 import global_vars
+from modules.jpeg_hub import jpeg_hub, DEFAULT_QUALITY
 
 router = APIRouter()
 
-# 只能是根据变量判断是否断开 前端注销组件没用
+'''
+异步 MJPEG 推流, 不占用线程池
+客户端断开时 Starlette 会取消生成器, 不再需要 /close_stream; 传 stream_id 时仍兼容旧的关闭方式
+max_width/quality 组成编码配置, 相同配置的所有连接共享同一次缩放和编码
+'''
 
 
-def generate_video_stream(stream_id: str):
+async def generate_video_stream(stream_id, quality, max_width, fps):
+    sub = jpeg_hub.subscribe(quality=quality, max_width=max_width, fps=fps)
     try:
         while True:
-            # 检查自己是否需要断开
-            if global_vars.stream_stop_flags.get(stream_id, False):
+            if stream_id is not None and global_vars.stream_stop_flags.get(stream_id, False):
                 break
-            with global_vars.frame_lock:
-                frame = global_vars.latest_frame
-            if frame is None:
-                time.sleep(0.01)
+            frame_bytes = await sub.get_async(timeout=0.5)
+            if frame_bytes is None:
                 continue
-            rgb_image = cv2.cvtColor(frame.color, cv2.COLOR_BGRA2BGR)
-            _, encoded_image = cv2.imencode(".jpg", rgb_image)
-            frame_bytes = encoded_image.tobytes()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n')
     finally:
-        # 流断开后删除标记
-        global_vars.stream_stop_flags.pop(stream_id, None)
+        jpeg_hub.unsubscribe(sub)
+        if stream_id is not None:
+            # 流断开后删除标记
+            global_vars.stream_stop_flags.pop(stream_id, None)
+
 
 @router.get("/video_stream")
-def video_stream(stream_id: str = Query(...)):
-    global_vars.stream_stop_flags[stream_id] = False  # 新连接
-    return StreamingResponse(generate_video_stream(stream_id), media_type="multipart/x-mixed-replace; boundary=frame")
+async def video_stream(stream_id: str = Query(None),
+                       max_width: int = Query(None, ge=16, description="最大宽度, 超过时等比缩小"),
+                       quality: int = Query(DEFAULT_QUALITY, ge=1, le=100, description="JPEG质量"),
+                       fps: float = Query(None, gt=0, description="最高帧率")):
+    if stream_id is not None:
+        global_vars.stream_stop_flags[stream_id] = False  # 新连接
+    return StreamingResponse(generate_video_stream(stream_id, quality, max_width, fps),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
@@ -1,10 +1,30 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import global_vars
+from modules.recorder import recorder, depth_recorder
+from modules.metrics import WEBSOCKET_CLIENTS
 import threading
 import asyncio
 
 router = APIRouter()
 
+STATUS_INTERVAL = 1.0  # 录制中每隔多少秒推送一次统计
+
+'''
+推送内容为彩色录制 recorder.status(): recording、path、fps、已写入/重复/丢弃帧数、
+缓冲区排队数、编码耗时(encode_ms_*)和从采集到写入的延迟(latency_ms_*)
+深度录制的同样统计(含压缩率 ratio)放在 depth 字段
+'''
+
+
+def is_recording():
+    return recorder.recording or depth_recorder.recording
+
+
+def recording_status():
+    status = recorder.status()
+    status["recording"] = is_recording()
+    status["depth"] = depth_recorder.status()
+    return status
+
 ws_clients = set()
 ws_clients_lock = threading.Lock()
 
@@ -14,18 +34,26 @@ async def recording_status_ws(websocket: WebSocket):
     await websocket.accept()
     with ws_clients_lock:
         ws_clients.add(websocket)
+    WEBSOCKET_CLIENTS.inc(endpoint="recording_status")
     try:
         # 连接后立即推送当前状态
-        await websocket.send_json({"recording": global_vars.recording_flag})
+        last_recording = is_recording()
+        await websocket.send_json(recording_status())
         while True:
-            # 接收任意消息，客户端可用作心跳或主动查询
-            await websocket.receive_text()
-            await websocket.send_json({"recording": global_vars.recording_flag})
+            # 接收任意消息，客户端可用作心跳或主动查询; 录制中或状态变化时定时推送
+            try:
+                await asyncio.wait_for(websocket.receive_text(), STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                if not is_recording() and not last_recording:
+                    continue
+            last_recording = is_recording()
+            await websocket.send_json(recording_status())
     except WebSocketDisconnect:
         pass
     finally:
         with ws_clients_lock:
             ws_clients.discard(websocket)
+        WEBSOCKET_CLIENTS.dec(endpoint="recording_status")
 
 
 def notify_recording_status_change(new_status: bool):
@@ -35,7 +63,7 @@ def notify_recording_status_change(new_status: bool):
         remove_set = set()
         for ws in list(ws_clients):
             try:
-                await ws.send_json({"recording": new_status})
+                await ws.send_json(dict(recording_status(), recording=new_status))
             except Exception as e:
                 print("WS推送异常：", e)
                 remove_set.add(ws)
@@ -1,32 +1,89 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 import asyncio
+import time
 import numpy as np
 import global_vars
-from modules.generate_point_cloud import generate_point_cloud
+from modules.frame_cache import frame_cache
+from modules.metrics import WEBSOCKET_CLIENTS
+from modules.point_cloud_wire import (WIRE_FORMATS, COMPRESSIONS, decimation_step,
+                                      limit_points, encode_points, DepthDeltaEncoder)
 
 router = APIRouter()
 
+MIN_INTERVAL = 0.05  # 最高推送频率 20Hz
+
+'''
+传输格式在连接时通过查询参数协商:
+ws://host:3000/ws/depth?format=q16&max_points=60000&compress=deflate
+不带参数时为旧的 float32 格式, 保持兼容
+format=delta 时发送深度关键帧 + 增量, threshold(毫米)和 keyframe_interval(帧)可调,
+客户端发送文本 "resync" 可要求下一帧为关键帧
+'''
+
+
+async def receive_commands(websocket, delta_encoder):
+    # 客户端指令: 目前只有 resync; 二进制消息忽略(receive_text 遇到二进制会抛 KeyError, 导致指令循环退出)
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        text = message.get("text")
+        if text is not None and text.strip() == "resync" and delta_encoder is not None:
+            delta_encoder.request_resync()
+
 
 @router.websocket("/ws/depth")
-async def websocket_pointcloud(websocket: WebSocket):
+async def websocket_pointcloud(websocket: WebSocket,
+                               format: str = Query("f32"),
+                               max_points: int = Query(0, ge=0),
+                               compress: str = Query("none"),
+                               threshold: int = Query(10, ge=0),
+                               keyframe_interval: int = Query(30, ge=1)):
+    if format not in WIRE_FORMATS or compress not in COMPRESSIONS:
+        await websocket.close(code=1003, reason="unsupported format")
+        return
     await websocket.accept()
+    WEBSOCKET_CLIENTS.inc(endpoint="depth")
+    delta_encoder = None
+    if format == "delta":
+        delta_encoder = DepthDeltaEncoder(600.0, 600.0, threshold, keyframe_interval, compress)
+    receiver = asyncio.create_task(receive_commands(websocket, delta_encoder))
+    last_seq = 0
+    last_send = 0.0
     try:
         while True:
-            await asyncio.sleep(0.05)
-            with global_vars.frame_lock:
-                frame = global_vars.latest_frame
-            if frame is None or frame.color is None or frame.depth is None:
+            if receiver.done():
+                receiver.result()  # 客户端断开时抛出 WebSocketDisconnect
+            wait = MIN_INTERVAL - (time.monotonic() - last_send)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # 等待新帧, 不重复发送同一帧
+            packet = await global_vars.frame_bus.wait_next_async(last_seq, timeout=1.0)
+            if packet is None:
+                continue
+            last_seq = packet.seq
+            frame = packet.frame
+            if frame.color is None or frame.depth is None:
                 continue
-            fx, fy = 600.0, 600.0
-            cx, cy = frame.depth.shape[1] / 2.0, frame.depth.shape[0] / 2.0
-            points, _ = generate_point_cloud(
-                frame.depth, fx, fy, cx, cy, frame.color)
-            pc = points.astype(np.float32)
-            await websocket.send_bytes(pc.tobytes())
+            if delta_encoder is not None:
+                # 增量格式发送深度图, 只能做离群点过滤(体素降采样不适用), 过滤结果各连接共用
+                depth = frame_cache.filtered_depth(packet)
+                message = delta_encoder.encode(depth, packet.seq, max_points)
+            else:
+                step = decimation_step(np.count_nonzero(frame.depth), max_points) if max_points else 1
+                # 同一帧同一步长的点云所有连接共用一份
+                points = frame_cache.point_cloud(packet, step).points
+                points = limit_points(points, max_points)
+                message = encode_points(points, packet.seq, format, compress)
+            await websocket.send_bytes(message)
+            last_send = time.monotonic()
     except WebSocketDisconnect:
         # 客户端主动断开，这里静默处理即可
         pass
     except Exception as e:
         # 可选：打印其他异常
         print(f"WebSocket异常: {e}")
+    finally:
+        receiver.cancel()
+        WEBSOCKET_CLIENTS.dec(endpoint="depth")
     # 不需要 finally 里再 close 了，WebSocketDisconnect 时连接已关闭